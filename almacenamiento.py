@@ -0,0 +1,240 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from database import pool
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# ALMACENAMIENTO DIRECCIONADO POR CONTENIDO
+# --------------------------------------------------
+# Cada subida se copia por bloques a un temporal mientras se calcula su
+# SHA-256 y se guarda como <carpeta>/ab/cd/<hash>.<ext>. Los mismos bytes
+# se guardan una sola vez y la URL nunca cambia de contenido.
+# `imagenes.referencias` cuenta cuántos viajes/promociones/galerías usan
+# cada archivo; al llegar a cero el archivo se borra.
+
+TAMANO_BLOQUE = 64 * 1024
+# Las subidas recientes aún no asociadas a un viaje no se recolectan
+GRACIA_RECOLECCION = "-10 minutes"
+
+def guardar_stream(stream, carpeta, extension):
+    # Las subidas del formulario ya están en disco con su huella calculada
+    if isinstance(stream, ArchivoSubido):
+        return stream.mover(carpeta, extension)
+
+    temporales = os.path.join(carpeta, "tmp")
+    os.makedirs(temporales, exist_ok=True)
+
+    h = hashlib.sha256()
+    fd, temporal = tempfile.mkstemp(dir=temporales)
+    try:
+        with os.fdopen(fd, "wb") as salida:
+            for bloque in iter(lambda: stream.read(TAMANO_BLOQUE), b""):
+                h.update(bloque)
+                salida.write(bloque)
+        huella = h.hexdigest()
+        relativa = os.path.join(huella[:2], huella[2:4], f"{huella}.{extension}")
+        destino = os.path.join(carpeta, relativa)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Reemplazar siempre: si ya existía el contenido es idéntico
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return huella, relativa, destino
+
+def registrar_archivo(db, huella, url, ruta):
+    # Si los mismos bytes ya están guardados (aunque con otra extensión) se reutilizan
+    existente = db.execute(
+        "SELECT url, ruta FROM imagenes WHERE hash = ? AND ruta IS NOT NULL LIMIT 1",
+        (huella,)
+    ).fetchone()
+    if existente and existente["url"] != url:
+        if ruta != existente["ruta"] and os.path.exists(ruta):
+            os.remove(ruta)
+        url, ruta = existente["url"], existente["ruta"]
+
+    db.execute("""
+        INSERT INTO imagenes (url, hash, ruta, referencias, subido)
+        VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT(url) DO UPDATE SET subido = CURRENT_TIMESTAMP
+    """, (url, huella, ruta))
+    return url, ruta
+
+# --------------------------------------------------
+# SUBIDAS EN STREAMING
+# --------------------------------------------------
+# Werkzeug escribe cada archivo del multipart por bloques directamente en
+# <uploads>/tmp (ArchivoSubido), calculando el SHA-256 mientras llega y
+# cortando con 413 si pasa LIMITE_ARCHIVO. Guardarlo después es solo un
+# os.replace: la memoria del worker no depende del tamaño de la galería.
+# MAX_CONTENT_LENGTH (app.py) limita el request completo.
+
+LIMITE_ARCHIVO = int(os.environ.get("LIMITE_ARCHIVO_MB", "10")) * 1024 * 1024
+HILOS_GALERIA = 4
+
+# Firmas (magic bytes) de los formatos aceptados; la extensión del nombre no cuenta
+FIRMAS = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+def tipo_por_firma(cabecera):
+    for firma, extension in FIRMAS:
+        if cabecera.startswith(firma):
+            return extension
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def extension_imagen(archivo):
+    # Extensión según el contenido, o None si no es una imagen aceptada
+    stream = archivo.stream
+    if isinstance(stream, ArchivoSubido):
+        cabecera = stream.cabecera
+    else:
+        posicion = stream.tell()
+        cabecera = stream.read(12)
+        stream.seek(posicion)
+    return tipo_por_firma(cabecera)
+
+
+class ArchivoSubido:
+    def __init__(self, carpeta, limite=LIMITE_ARCHIVO):
+        temporales = os.path.join(carpeta, "tmp")
+        os.makedirs(temporales, exist_ok=True)
+        fd, self.ruta = tempfile.mkstemp(dir=temporales)
+        self._archivo = os.fdopen(fd, "w+b")
+        self._hash = hashlib.sha256()
+        self.limite = limite
+        self.tamano = 0
+        self.cabecera = b""
+        self.movido = False
+
+    def write(self, datos):
+        self.tamano += len(datos)
+        if self.tamano > self.limite:
+            raise RequestEntityTooLarge()
+        if len(self.cabecera) < 12:
+            self.cabecera += datos[:12 - len(self.cabecera)]
+        self._hash.update(datos)
+        return self._archivo.write(datos)
+
+    def mover(self, carpeta, extension):
+        self._archivo.close()
+        huella = self._hash.hexdigest()
+        relativa = os.path.join(huella[:2], huella[2:4], f"{huella}.{extension}")
+        destino = os.path.join(carpeta, relativa)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(self.ruta, destino)
+        self.movido = True
+        return huella, relativa, destino
+
+    def close(self):
+        # Lo que no se guardó (error, formulario inválido) no queda en disco
+        self._archivo.close()
+        if not self.movido and os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+
+class PeticionConSubidas(Request):
+    # Una vista puede subir el límite por archivo antes de leer request.files
+    limite_archivo = LIMITE_ARCHIVO
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        archivo = ArchivoSubido(current_app.config["UPLOAD_FOLDER"], self.limite_archivo)
+        self.__dict__.setdefault("_subidas", []).append(archivo)
+        return archivo
+
+    def close(self):
+        # También los temporales de un multipart que se cortó a medias
+        super().close()
+        for archivo in self.__dict__.pop("_subidas", []):
+            archivo.close()
+
+
+_ejecutor = None
+_ejecutor_pid = None
+_ejecutor_lock = threading.Lock()
+
+def guardar_streams(archivos, carpeta):
+    # [(stream, extension), ...] -> resultados de guardar_stream en el mismo orden
+    global _ejecutor, _ejecutor_pid
+    if len(archivos) <= 1:
+        return [guardar_stream(stream, carpeta, extension) for stream, extension in archivos]
+    with _ejecutor_lock:
+        if _ejecutor is None or _ejecutor_pid != os.getpid():
+            _ejecutor = ThreadPoolExecutor(HILOS_GALERIA, thread_name_prefix="subidas")
+            _ejecutor_pid = os.getpid()
+    futuros = [_ejecutor.submit(guardar_stream, stream, carpeta, extension) for stream, extension in archivos]
+    return [futuro.result() for futuro in futuros]
+
+# --------------------------------------------------
+# REFERENCIAS Y RECOLECCIÓN
+# --------------------------------------------------
+def actualizar_referencias(db, antes, despues):
+    # `antes` y `despues` son las URLs que usaba / usa la fila modificada
+    db.executemany(
+        "UPDATE imagenes SET referencias = referencias - 1 WHERE url = ?",
+        [(url,) for url in antes if url]
+    )
+    db.executemany(
+        "UPDATE imagenes SET referencias = referencias + 1 WHERE url = ?",
+        [(url,) for url in despues if url]
+    )
+
+def recolectar_huerfanos():
+    # Transacción propia, después del commit de la ruta que soltó las referencias
+    conn = pool.obtener()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        huerfanos = conn.execute(f"""
+            SELECT url, hash, ruta FROM imagenes
+            WHERE ruta IS NOT NULL AND referencias <= 0
+              AND subido < datetime('now', '{GRACIA_RECOLECCION}')
+        """).fetchall()
+        if not huerfanos:
+            conn.rollback()
+            return 0
+
+        conn.executemany("DELETE FROM imagenes WHERE url = ?", [(f["url"],) for f in huerfanos])
+        # Derivados cuya huella ya no usa ninguna imagen
+        variantes = conn.execute("""
+            SELECT v.hash, v.url FROM imagen_variantes v
+            WHERE NOT EXISTS (SELECT 1 FROM imagenes i WHERE i.hash = v.hash)
+        """).fetchall()
+        conn.execute("""
+            DELETE FROM imagen_variantes
+            WHERE NOT EXISTS (SELECT 1 FROM imagenes i WHERE i.hash = imagen_variantes.hash)
+        """)
+        conn.execute("UPDATE cache_version SET version = version + 1 WHERE nombre = 'imagenes'")
+        conn.commit()
+    finally:
+        pool.devolver(conn)
+
+    for fila in huerfanos:
+        _borrar(fila["ruta"])
+    for variante in variantes:
+        _borrar(variante["url"].lstrip("/"))
+    logger.info("Recolectados %s archivos sin referencias", len(huerfanos))
+    return len(huerfanos)
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,111 @@
+from paginacion import leer_parametros, paginar
+from busqueda import buscar_viajes
+from cache import catalogo_viajes
+from repositorios import Repositorios
+from escrituras import evento_carrito
+
+# --------------------------------------------------
+# LÓGICA DE LAS RUTAS JSON
+# --------------------------------------------------
+# Compartida por las vistas Flask (app.py) y el modo ASGI (asgi.py). Cada
+# función recibe la conexión y datos ya leídos del request, y devuelve
+# (payload, código de estado) sin depender del framework.
+
+# Máximo de paquetes por llamada a /agregar_carrito
+MAX_ITEMS_CARRITO = 50
+
+def url_detalle(viaje_id):
+    return f"/paquete/{viaje_id}"
+
+def pagina_viajes(db, args):
+    # ?tipo=&precio_min=&precio_max=&orden=precio&dir=desc&cursor=
+    parametros = leer_parametros("viajes", args)
+    if parametros["cursor_invalido"]:
+        return {"success": False, "message": "Cursor inválido"}, 400
+    viajes, siguiente = paginar(
+        db, "viajes", parametros,
+        columnas="id, titulo, descripcion, precio, precio_final, descuento, imagen, tipo"
+    )
+    return {
+        "viajes": [dict(viaje, url=url_detalle(viaje["id"])) for viaje in viajes],
+        "siguiente": siguiente,
+    }, 200
+
+def leer_busqueda(args):
+    texto = (args.get("q") or "").strip()
+    try:
+        pagina = int(args.get("pagina", 1))
+    except ValueError:
+        pagina = 1
+    return texto, max(pagina, 1)
+
+def resultados_busqueda(db, args):
+    texto, pagina = leer_busqueda(args)
+    resultados, hay_mas = buscar_viajes(db, texto, pagina)
+    return {
+        "q": texto,
+        "pagina": pagina,
+        "resultados": [
+            dict(r, titulo_resaltado=str(r["titulo_resaltado"]), fragmento=str(r["fragmento"]),
+                 url=url_detalle(r["id"]))
+            for r in resultados
+        ],
+        "siguiente": pagina + 1 if hay_mas else None,
+    }, 200
+
+def agregar_al_carrito(db, usuario, data):
+    # Autenticación incluida: el front no necesita llamar antes a /verificar_sesion
+    if not usuario:
+        return {"success": False, "login_required": True, "message": "Usuario no autenticado"}, 401
+
+    # Uno o varios ids; `paquete` (título) solo para las tarjetas fijas de giras/mujeres
+    ids = data.get("viaje_ids")
+    if ids is None and data.get("viaje_id") is not None:
+        ids = [data.get("viaje_id")]
+    if ids is None and data.get("paquete"):
+        viaje = catalogo_viajes.por_titulo(db, data.get("paquete"))
+        ids = [viaje["id"]] if viaje else []
+        if not ids:
+            return {"success": False, "message": "Paquete no encontrado"}, 404
+    if not ids or not isinstance(ids, list) or len(ids) > MAX_ITEMS_CARRITO:
+        return {"success": False, "message": "Id del paquete requerido"}, 400
+    try:
+        ids = list(dict.fromkeys(int(viaje_id) for viaje_id in ids))
+    except (TypeError, ValueError):
+        return {"success": False, "message": "Id de paquete inválido"}, 400
+
+    validos = [viaje_id for viaje_id in ids if catalogo_viajes.por_id(db, viaje_id)]
+    if not validos:
+        return {"success": False, "message": "Paquete no encontrado"}, 404
+
+    # Una sola transacción para todos los paquetes
+    carrito = Repositorios(db).carrito
+    insertados = carrito.agregar(usuario["id"], validos)
+    cantidad, _, total = carrito.totales(usuario["id"])
+    db.commit()
+
+    agregados = len(insertados)
+    no_encontrados = [viaje_id for viaje_id in ids if viaje_id not in validos]
+    if agregados == 0:
+        # Nada nuevo: no es un éxito ni corresponde registrar eventos
+        mensaje = "El paquete ya está en el carrito" if len(validos) == 1 else "Los paquetes ya estaban en el carrito"
+        return {"success": False, "message": mensaje, "agregados": 0, "no_encontrados": no_encontrados,
+                "cantidad_carrito": cantidad, "total_carrito": total}, 400
+
+    # Solo los que entraron ahora: los que ya estaban no son un evento nuevo
+    for viaje_id in insertados:
+        evento_carrito(usuario["id"], viaje_id, "agregar")
+    if agregados == 1:
+        mensaje = "Paquete agregado al carrito"
+    else:
+        mensaje = f"{agregados} paquetes agregados al carrito"
+    if agregados < len(validos):
+        mensaje += f" ({len(validos) - agregados} ya estaban)"
+    return {
+        "success": True,
+        "message": mensaje,
+        "agregados": agregados,
+        "no_encontrados": no_encontrados,
+        "cantidad_carrito": cantidad,
+        "total_carrito": total,
+    }, 200
@@ -1,9 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-import sqlite3
+from flask import (
+    Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, session, jsonify, flash
+)
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import logging
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+import click
+
+from database import get_db, cerrar_db, pool
+from modelos import separar_galeria, construir_portada
+from migraciones import aplicar_migraciones, esquema_al_dia
+from cache import catalogo_viajes, catalogo_promociones, paginas, pagina_cacheada
+from imagenes import encargar_derivados, imagen_responsive
+from almacenamiento import (
+    PeticionConSubidas, guardar_stream, guardar_streams, extension_imagen, registrar_archivo,
+    actualizar_referencias, recolectar_huerfanos
+)
+import estaticos
+import precios
+import prerender
+import respaldos
+from precios import validar_aplicacion, validar_precio, validar_descuento
+from repositorios import repos, EmailDuplicado
+from paginacion import leer_parametros, paginar, url_pagina
+from busqueda import buscar_viajes
+import api
+import escrituras
+from escrituras import auditar
+from importacion import importar, exportar, formato_por_nombre, COLUMNAS, FORMATOS
+from seguridad import (
+    ServidorOcupado, hashear_password, verificar_password, verificar_sin_usuario,
+    necesita_rehash, intentos_por_ip, intentos_por_email, envios_contacto
+)
+import sesiones
+import metricas
+from sesiones import usuario_actual, iniciar_sesion, revocar_sesiones, requiere_login, requiere_admin
 
 # --------------------------------------------------
 # CONFIGURACIÓN GENERAL
@@ -11,48 +42,53 @@ from werkzeug.utils import secure_filename
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", "clave_local_dev")
-
 UPLOAD_FOLDER = "static/uploads"
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Tamaño máximo de un request completo; cada archivo además tiene LIMITE_ARCHIVO
+MAX_SUBIDA = int(os.environ.get("MAX_SUBIDA_MB", "64")) * 1024 * 1024
+
+# Variantes WebP redimensionadas de las imágenes subidas (ver imagenes.py)
+DERIVADOS_FOLDER = os.path.join(UPLOAD_FOLDER, "derivados")
 
-DATABASE = "wonderchile.db"
+# Todas las rutas; la app se arma en create_app()
+web = Blueprint("web", __name__)
 
 # --------------------------------------------------
 # UTILIDADES
 # --------------------------------------------------
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def get_db():
-    db = sqlite3.connect(DATABASE)
-    db.row_factory = sqlite3.Row
-    return db
+def _registrar_imagen(huella, relativa, ruta):
+    metricas.registrar_subida(os.path.getsize(ruta))
+    db = get_db()
+    url, ruta = registrar_archivo(db, huella, f"/static/uploads/{relativa}", ruta)
+    encargar_derivados(db, huella, ruta, DERIVADOS_FOLDER, "/static/uploads/derivados")
+    return url
+
+def guardar_imagen_subida(file, extension):
+    # Guardado por huella de contenido (ver almacenamiento.py)
+    return _registrar_imagen(*guardar_stream(file.stream, current_app.config["UPLOAD_FOLDER"], extension))
+
+def guardar_galeria_subida(files):
+    # Los archivos vacíos o que no son imágenes se ignoran
+    validos = []
+    for file in files:
+        extension = extension_imagen(file) if file.filename else None
+        if extension:
+            validos.append((file.stream, extension))
+    guardados = guardar_streams(validos, current_app.config["UPLOAD_FOLDER"])
+    return [_registrar_imagen(*guardado) for guardado in guardados]
 
 # --------------------------------------------------
 # INICIALIZACIÓN BASE DE DATOS + ADMIN
 # --------------------------------------------------
 def crear_admin_por_defecto():
-    db = get_db()
+    usuarios = repos().usuarios
 
     admin_email = os.environ.get("ADMIN_EMAIL", "admin@wonderchile.cl")
     admin_password = os.environ.get("ADMIN_PASSWORD", "Admin123")
 
-    existe = db.execute(
-        "SELECT id FROM usuarios WHERE email = ?",
-        (admin_email,)
-    ).fetchone()
-
-    if not existe:
-        hashed_password = generate_password_hash(admin_password)
-        db.execute("""
-            INSERT INTO usuarios (nombre, email, password, role)
-            VALUES (?, ?, ?, 'admin')
-        """, ("Administrador", admin_email, hashed_password))
-        db.commit()
+    if not usuarios.por_email(admin_email):
+        hashed_password = hashear_password(admin_password)
+        usuarios.crear("Administrador", admin_email, hashed_password, role="admin")
+        get_db().commit()
         logger.info("Usuario admin creado correctamente")
 
 def init_db():
@@ -113,169 +149,221 @@ def init_db():
         tipo TEXT DEFAULT 'promocion'
     )""")
 
+    # Versión del catálogo compartida entre workers (ver cache.py)
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS cache_version (
+        nombre TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )""")
+    db.execute("""
+    INSERT OR IGNORE INTO cache_version (nombre, version)
+    VALUES ('viajes', 0), ('promociones', 0)
+    """)
+
     db.commit()
-    crear_admin_por_defecto()
+    aplicar_migraciones(db)
 
-init_db()
+@web.app_errorhandler(RequestEntityTooLarge)
+def subida_demasiado_grande(error):
+    return "Error: La subida supera el tamaño máximo permitido", 413
+
+@web.app_errorhandler(ServidorOcupado)
+def servidor_ocupado(error):
+    # El pool de hash está lleno: rechazar rápido en vez de encolar
+    return "Servidor ocupado, intenta nuevamente en unos segundos.", 429, {"Retry-After": "1"}
 
 # --------------------------------------------------
 # RUTAS PÚBLICAS
 # --------------------------------------------------
-@app.route("/")
+@web.route("/")
+@pagina_cacheada
 def home():
     db = get_db()
-    viajes = db.execute("SELECT * FROM viajes").fetchall()
+    # Secciones ya agrupadas y recortadas; se recalculan solo al cambiar el catálogo
+    secciones = catalogo_viajes.materializar(db, "portada", construir_portada)
+    # Nombre y rol desde la base: un cambio se ve sin volver a iniciar sesión
+    usuario = usuario_actual()
     return render_template(
         "index.html",
-        user_name=session.get("user_name"),
-        user_role=session.get("user_role"),
-        viajes=viajes
+        user_name=usuario["nombre"] if usuario else None,
+        user_role=usuario["role"] if usuario else None,
+        secciones=secciones
     )
 
-@app.route("/login", methods=["GET", "POST"])
+@web.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form["email"]
         password = request.form["password"]
 
-        db = get_db()
-        user = db.execute(
-            "SELECT * FROM usuarios WHERE email = ?",
-            (email,)
-        ).fetchone()
+        # Límite de intentos por IP y por email antes de gastar CPU en el hash
+        ip = request.remote_addr or "desconocida"
+        if not intentos_por_ip.consumir(ip):
+            return "Demasiados intentos. Intenta nuevamente más tarde.", 429, {"Retry-After": str(intentos_por_ip.espera(ip))}
+        if not intentos_por_email.consumir(email.lower()):
+            return "Demasiados intentos. Intenta nuevamente más tarde.", 429, {"Retry-After": str(intentos_por_email.espera(email.lower()))}
+
+        usuarios = repos().usuarios
+        user = usuarios.por_email(email)
 
-        if user and check_password_hash(user["password"], password):
-            session["user_id"] = user["id"]
-            session["user_name"] = user["nombre"]
-            session["user_role"] = user["role"]
-            return redirect(url_for("home"))
+        valido = verificar_password(user["password"], password) if user else verificar_sin_usuario(password)
+
+        if valido:
+            # Actualizar el hash si cambió el método o su costo
+            if necesita_rehash(user["password"]):
+                usuarios.cambiar_password(user["id"], hashear_password(password))
+                get_db().commit()
+            iniciar_sesion(user)
+            return redirect(url_for(".home"))
 
         return "Credenciales incorrectas"
 
     return render_template("login.html")
 
-@app.route("/logout")
+@web.route("/logout")
 def logout():
     session.clear()
-    return redirect(url_for("home"))
+    return redirect(url_for(".home"))
 
-@app.route("/paquetes")
+@web.route("/paquetes")
+@pagina_cacheada
 def paquetes():
     db = get_db()
-    viajes = db.execute("SELECT * FROM viajes").fetchall()
-    return render_template("paquetes.html", viajes=viajes)
+    parametros = leer_parametros("viajes", request.args)
+    viajes, siguiente = paginar(db, "viajes", parametros)
+    return render_template(
+        "paquetes.html",
+        viajes=viajes,
+        parametros=parametros,
+        siguiente_url=url_pagina(siguiente)
+    )
 
-@app.route("/giras")
+@web.route("/giras")
+@pagina_cacheada
 def giras():
     return render_template("giras.html")
 
-@app.route("/mujeres")
+@web.route("/mujeres")
+@pagina_cacheada
 def mujeres():
     return render_template("mujeres.html")
 
-@app.route("/contacto")
+@web.route("/contacto")
+@pagina_cacheada
 def contacto():
     return render_template("contacto.html")
 
-@app.route("/registro", methods=["GET", "POST"])
+# Largo máximo de cada campo del formulario de contacto
+LARGO_CONTACTO = {
+    "nombre": 200, "email": 200, "telefono": 50, "destino": 200, "fecha": 100,
+    "duracion": 100, "presupuesto": 100, "mensaje": 5000,
+}
+MAX_PERSONAS = 1000
+
+@web.route("/contacto", methods=["POST"])
+def enviar_contacto():
+    ip = request.remote_addr or "desconocida"
+    if not envios_contacto.consumir(ip):
+        return "Demasiados mensajes. Intenta nuevamente más tarde.", 429, {"Retry-After": str(envios_contacto.espera(ip))}
+
+    campos = {campo: (request.form.get(campo) or "").strip() for campo in LARGO_CONTACTO}
+    if not campos["nombre"] or not campos["email"]:
+        return "Error: Nombre y email son obligatorios", 400
+    if any(len(campos[campo]) > largo for campo, largo in LARGO_CONTACTO.items()):
+        return "Error: Uno de los campos es demasiado largo", 400
+    try:
+        personas = int(request.form.get("personas") or 0) or None
+    except ValueError:
+        return "Error: Número de personas inválido", 400
+    if personas is not None and not 1 <= personas <= MAX_PERSONAS:
+        return "Error: Número de personas inválido", 400
+
+    # Se guarda en segundo plano (ver escrituras.py); el request no espera a SQLite
+    escrituras.encolar(
+        "contacto",
+        nombre=campos["nombre"], email=campos["email"], telefono=campos["telefono"] or None,
+        destino=campos["destino"] or None, fecha_viaje=campos["fecha"] or None,
+        duracion=campos["duracion"] or None, personas=personas,
+        presupuesto=campos["presupuesto"] or None, mensaje=campos["mensaje"] or None,
+    )
+    return render_template("contacto.html", enviado=True)
+
+@web.route("/registro", methods=["GET", "POST"])
 def registro():
     if request.method == "POST":
         nombre = request.form["nombre"]
         email = request.form["email"]
         password = request.form["password"]
 
-        db = get_db()
-        hashed_password = generate_password_hash(password)
+        ip = request.remote_addr or "desconocida"
+        if not intentos_por_ip.consumir(ip):
+            return "Demasiados intentos. Intenta nuevamente más tarde.", 429, {"Retry-After": str(intentos_por_ip.espera(ip))}
+
+        hashed_password = hashear_password(password)
         try:
-            db.execute(
-                "INSERT INTO usuarios (nombre, email, password) VALUES (?, ?, ?)",
-                (nombre, email, hashed_password)
-            )
-            db.commit()
-            return redirect(url_for("login"))
-        except sqlite3.IntegrityError:
+            repos().usuarios.crear(nombre, email, hashed_password)
+        except EmailDuplicado:
             return "Email ya registrado"
+        get_db().commit()
+        return redirect(url_for(".login"))
 
     return render_template("registro.html")
 
-@app.route("/carrito")
+@web.route("/carrito")
+@requiere_login
 def carrito():
-    if not session.get("user_id"):
-        return redirect(url_for("login"))
-
-    db = get_db()
-    items = db.execute("""
-        SELECT c.id, v.titulo as paquete, c.fecha_agregado
-        FROM carrito c
-        JOIN viajes v ON c.viaje_id = v.id
-        WHERE c.usuario_id = ?
-        ORDER BY c.fecha_agregado DESC
-    """, (session["user_id"],)).fetchall()
+    usuario = usuario_actual()
+    items, totales = repos().carrito.items(usuario["id"])
+    return render_template("carrito.html", items=items, totales=totales, user_name=usuario["nombre"])
+
+@web.route("/api/viajes")
+def api_viajes():
+    payload, estado = api.pagina_viajes(get_db(), request.args)
+    return jsonify(payload), estado
+
+@web.route("/buscar")
+@pagina_cacheada
+def buscar():
+    texto, pagina = api.leer_busqueda(request.args)
+    resultados, hay_mas = buscar_viajes(get_db(), texto, pagina)
+    return render_template(
+        "buscar.html",
+        q=texto,
+        resultados=resultados,
+        pagina=pagina,
+        hay_mas=hay_mas
+    )
 
-    return render_template("carrito.html", items=items)
+@web.route("/api/buscar")
+def api_buscar():
+    payload, estado = api.resultados_busqueda(get_db(), request.args)
+    return jsonify(payload), estado
 
-@app.route("/verificar_sesion")
+@web.route("/verificar_sesion")
 def verificar_sesion():
-    return jsonify({"logged_in": bool(session.get("user_id"))})
+    return jsonify({"logged_in": bool(usuario_actual())})
 
-@app.route("/agregar_carrito", methods=["POST"])
+@web.route("/agregar_carrito", methods=["POST"])
 def agregar_carrito():
-    if not session.get("user_id"):
-        return jsonify({"success": False, "message": "Usuario no autenticado"}), 401
-
-    data = request.get_json()
-    paquete = data.get("paquete")
-    if not paquete:
-        return jsonify({"success": False, "message": "Nombre del paquete requerido"}), 400
-
-    db = get_db()
-
-    # Buscar viaje por titulo
-    viaje = db.execute("SELECT id FROM viajes WHERE titulo = ?", (paquete,)).fetchone()
-    if not viaje:
-        return jsonify({"success": False, "message": "Paquete no encontrado"}), 404
-
-    viaje_id = viaje["id"]
-
-    # Verificar que no esté ya en el carrito
-    existe = db.execute(
-        "SELECT id FROM carrito WHERE usuario_id = ? AND viaje_id = ?",
-        (session["user_id"], viaje_id)
-    ).fetchone()
-
-    if existe:
-        return jsonify({"success": False, "message": "El paquete ya está en el carrito"}), 400
-
-    db.execute(
-        "INSERT INTO carrito (usuario_id, viaje_id) VALUES (?, ?)",
-        (session["user_id"], viaje_id)
-    )
-    db.commit()
-
-    return jsonify({"success": True, "message": "Paquete agregado al carrito"})
+    payload, estado = api.agregar_al_carrito(get_db(), usuario_actual(), request.get_json(silent=True) or {})
+    return jsonify(payload), estado
 
-@app.route("/eliminar_carrito/<int:item_id>", methods=["POST"])
+@web.route("/eliminar_carrito/<int:item_id>", methods=["POST"])
+@requiere_login
 def eliminar_carrito(item_id):
-    if not session.get("user_id"):
-        return redirect(url_for("login"))
+    # Solo borra si el item pertenece al usuario
+    viaje_id = repos().carrito.quitar(usuario_actual()["id"], item_id)
+    if viaje_id is not None:
+        get_db().commit()
+        escrituras.evento_carrito(usuario_actual()["id"], viaje_id, "quitar")
 
-    db = get_db()
-    # Verificar que el item pertenece al usuario
-    item = db.execute(
-        "SELECT id FROM carrito WHERE id = ? AND usuario_id = ?",
-        (item_id, session["user_id"])
-    ).fetchone()
-
-    if item:
-        db.execute("DELETE FROM carrito WHERE id = ?", (item_id,))
-        db.commit()
-
-    return redirect(url_for("carrito"))
+    return redirect(url_for(".carrito"))
 
-@app.route("/paquete/<int:viaje_id>")
+@web.route("/paquete/<int:viaje_id>")
+@pagina_cacheada
 def detalle_paquete(viaje_id):
     db = get_db()
-    viaje = db.execute("SELECT * FROM viajes WHERE id = ?", (viaje_id,)).fetchone()
+    viaje = catalogo_viajes.por_id(db, viaje_id)
     if not viaje:
         return "Paquete no encontrado", 404
     return render_template("detalle_paquete.html", viaje=viaje)
@@ -283,42 +371,36 @@ def detalle_paquete(viaje_id):
 # --------------------------------------------------
 # ADMIN
 # --------------------------------------------------
-@app.route("/admin")
+@web.route("/admin")
+@requiere_admin
 def admin():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
     return render_template("admin.html")
 
-@app.route("/admin/viajes")
+@web.route("/admin/viajes")
+@requiere_admin
 def admin_viajes():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
     db = get_db()
-    viajes = db.execute("SELECT * FROM viajes WHERE tipo = 'paquete'").fetchall()
-    return render_template("admin_viajes.html", viajes=viajes, tipo="paquete", titulo="Paquetes Turísticos")
+    viajes, siguiente = paginar(db, "viajes", leer_parametros("viajes", request.args, tipo="paquete"))
+    return render_template("admin_viajes.html", viajes=viajes, tipo="paquete", titulo="Paquetes Turísticos", siguiente_url=url_pagina(siguiente))
 
-@app.route("/admin/giras")
+@web.route("/admin/giras")
+@requiere_admin
 def admin_giras():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
     db = get_db()
-    viajes = db.execute("SELECT * FROM viajes WHERE tipo = 'gira'").fetchall()
-    return render_template("admin_viajes.html", viajes=viajes, tipo="gira", titulo="Giras de Estudio")
+    viajes, siguiente = paginar(db, "viajes", leer_parametros("viajes", request.args, tipo="gira"))
+    return render_template("admin_viajes.html", viajes=viajes, tipo="gira", titulo="Giras de Estudio", siguiente_url=url_pagina(siguiente))
 
-@app.route("/admin/mujeres")
+@web.route("/admin/mujeres")
+@requiere_admin
 def admin_mujeres():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
     db = get_db()
-    viajes = db.execute("SELECT * FROM viajes WHERE tipo = 'mujeres'").fetchall()
-    return render_template("admin_viajes.html", viajes=viajes, tipo="mujeres", titulo="Viajes Solo Mujeres")
+    viajes, siguiente = paginar(db, "viajes", leer_parametros("viajes", request.args, tipo="mujeres"))
+    return render_template("admin_viajes.html", viajes=viajes, tipo="mujeres", titulo="Viajes Solo Mujeres", siguiente_url=url_pagina(siguiente))
 
-@app.route("/admin/viajes/agregar", methods=["GET", "POST"])
-@app.route("/admin/<tipo>/agregar", methods=["GET", "POST"])
+@web.route("/admin/viajes/agregar", methods=["GET", "POST"])
+@web.route("/admin/<tipo>/agregar", methods=["GET", "POST"])
+@requiere_admin
 def agregar_viaje(tipo="paquete"):
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
-
     if request.method == "POST":
         titulo = request.form.get("titulo")
         descripcion = request.form.get("descripcion")
@@ -330,9 +412,15 @@ def agregar_viaje(tipo="paquete"):
         itinerario = request.form.get("itinerario")
         galeria = request.form.get("galeria")
         imagen_opcion = request.form.get("imagen_opcion")
+        destacado = 1 if request.form.get("destacado") else 0
 
         if not titulo or not descripcion or not precio:
             return "Error: Todos los campos son obligatorios"
+        try:
+            precio = validar_precio(precio)
+        except ValueError as error:
+            flash(str(error))
+            return render_template("agregar_viaje.html", tipo=tipo), 400
 
         imagen_path = None
 
@@ -342,54 +430,43 @@ def agregar_viaje(tipo="paquete"):
             file = request.files["imagen_file"]
             if file.filename == "":
                 return "Error: No se seleccionó ningún archivo"
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(file_path)
-                imagen_path = f"/static/uploads/{filename}"
+            extension = extension_imagen(file)
+            if extension:
+                imagen_path = guardar_imagen_subida(file, extension)
             else:
-                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, jpeg, gif, webp)"
+                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, gif, webp)"
         else:
             imagen_path = request.form.get("imagen")
 
         # Handle gallery images
-        galeria_paths = []
-        if "galeria_files" in request.files:
-            files = request.files.getlist("galeria_files")
-            for file in files:
-                if file.filename != "" and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    file.save(file_path)
-                    galeria_paths.append(f"/static/uploads/{filename}")
+        galeria_paths = guardar_galeria_subida(request.files.getlist("galeria_files"))
 
         # If URLs were provided, add them to the gallery
-        galeria_urls = request.form.get("galeria", "").strip()
-        if galeria_urls:
-            urls = [url.strip() for url in galeria_urls.split(",") if url.strip()]
-            galeria_paths.extend(urls)
-
-        galeria_final = ",".join(galeria_paths) if galeria_paths else None
+        galeria_paths.extend(separar_galeria(galeria))
 
         db = get_db()
-        db.execute(
-            "INSERT INTO viajes (titulo, descripcion, precio, imagen, grupo_minimo, alojamiento, alimentacion, transporte, itinerario, galeria, tipo) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (titulo, descripcion, precio, imagen_path, grupo_minimo, alojamiento, alimentacion, transporte, itinerario, galeria_final, tipo)
-        )
+        viaje_id = repos().viajes.crear({
+            "titulo": titulo, "descripcion": descripcion, "precio": precio, "imagen": imagen_path,
+            "grupo_minimo": grupo_minimo, "alojamiento": alojamiento, "alimentacion": alimentacion,
+            "transporte": transporte, "itinerario": itinerario, "tipo": tipo, "destacado": destacado,
+        }, galeria_paths)
+        actualizar_referencias(db, [], [imagen_path] + galeria_paths)
+        catalogo_viajes.invalidar(db)
         db.commit()
+        prerender.encargar_viajes([viaje_id])
+        auditar(usuario_actual()["id"], "crear", f"viaje:{viaje_id}", {"titulo": titulo, "precio": precio})
 
-        return redirect(url_for(f"admin_{tipo}" if tipo != "paquete" else "admin_viajes"))
+        return redirect(url_for(f".admin_{tipo}" if tipo != "paquete" else ".admin_viajes"))
 
     return render_template("agregar_viaje.html", tipo=tipo)
 
-@app.route("/admin/viajes/<int:viaje_id>/editar", methods=["GET", "POST"])
-@app.route("/admin/<tipo>/<int:viaje_id>/editar", methods=["GET", "POST"])
+@web.route("/admin/viajes/<int:viaje_id>/editar", methods=["GET", "POST"])
+@web.route("/admin/<tipo>/<int:viaje_id>/editar", methods=["GET", "POST"])
+@requiere_admin
 def editar_viaje(viaje_id, tipo=None):
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
-
     db = get_db()
-    viaje = db.execute("SELECT * FROM viajes WHERE id = ?", (viaje_id,)).fetchone()
+    viajes = repos().viajes
+    viaje = viajes.obtener(viaje_id)
 
     if not viaje:
         return "Viaje no encontrado"
@@ -405,9 +482,15 @@ def editar_viaje(viaje_id, tipo=None):
         itinerario = request.form.get("itinerario")
         galeria = request.form.get("galeria")
         imagen_opcion = request.form.get("imagen_opcion")
+        destacado = 1 if request.form.get("destacado") else 0
 
         if not titulo or not descripcion or not precio:
             return "Error: Todos los campos son obligatorios"
+        try:
+            precio = validar_precio(precio)
+        except ValueError as error:
+            flash(str(error))
+            return render_template("editar_viaje.html", viaje=viaje), 400
 
         imagen_path = viaje["imagen"]
 
@@ -417,79 +500,93 @@ def editar_viaje(viaje_id, tipo=None):
             file = request.files["imagen_file"]
             if file.filename == "":
                 return "Error: No se seleccionó ningún archivo"
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(file_path)
-                imagen_path = f"/static/uploads/{filename}"
+            extension = extension_imagen(file)
+            if extension:
+                imagen_path = guardar_imagen_subida(file, extension)
             else:
-                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, jpeg, gif, webp)"
+                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, gif, webp)"
         else:
             nueva_imagen = request.form.get("imagen")
             if nueva_imagen:
                 imagen_path = nueva_imagen
 
         # Handle gallery images
-        galeria_paths = []
-        if "galeria_files" in request.files:
-            files = request.files.getlist("galeria_files")
-            for file in files:
-                if file.filename != "" and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    file.save(file_path)
-                    galeria_paths.append(f"/static/uploads/{filename}")
+        galeria_paths = guardar_galeria_subida(request.files.getlist("galeria_files"))
 
         # If URLs were provided, add them to the gallery
-        galeria_urls = request.form.get("galeria", "").strip()
-        if galeria_urls:
-            urls = [url.strip() for url in galeria_urls.split(",") if url.strip()]
-            galeria_paths.extend(urls)
-
-        # If no new gallery images were provided, keep the existing ones
-        galeria_final = ",".join(galeria_paths) if galeria_paths else galeria
-
-        db.execute(
-            "UPDATE viajes SET titulo = ?, descripcion = ?, precio = ?, imagen = ?, grupo_minimo = ?, alojamiento = ?, alimentacion = ?, transporte = ?, itinerario = ?, galeria = ? WHERE id = ?",
-            (titulo, descripcion, precio, imagen_path, grupo_minimo, alojamiento, alimentacion, transporte, itinerario, galeria_final, viaje_id)
-        )
+        galeria_paths.extend(separar_galeria(galeria))
+
+        # If the form did not send the itinerary, keep the existing one
+        if itinerario is None:
+            itinerario = viaje.itinerario_texto
+
+        # If no gallery field or new images were sent, keep the existing ones
+        galeria_anterior = [foto.url for foto in viaje.galeria]
+        if galeria is None and not galeria_paths:
+            galeria_paths = galeria_anterior
+        viajes.actualizar(viaje_id, {
+            "titulo": titulo, "descripcion": descripcion, "precio": precio, "imagen": imagen_path,
+            "grupo_minimo": grupo_minimo, "alojamiento": alojamiento, "alimentacion": alimentacion,
+            "transporte": transporte, "itinerario": itinerario, "destacado": destacado,
+        }, galeria_paths)
+        actualizar_referencias(db, [viaje["imagen"]] + galeria_anterior, [imagen_path] + galeria_paths)
+        catalogo_viajes.invalidar(db)
         db.commit()
+        recolectar_huerfanos()
+        prerender.encargar_viajes([viaje_id])
+        auditar(usuario_actual()["id"], "editar", f"viaje:{viaje_id}", {"titulo": titulo, "precio": precio})
 
         if tipo:
-            return redirect(url_for(f"admin_{tipo}"))
+            return redirect(url_for(f".admin_{tipo}"))
         else:
-            return redirect(url_for("admin_viajes"))
+            return redirect(url_for(".admin_viajes"))
 
     return render_template("editar_viaje.html", viaje=viaje)
 
-@app.route("/admin/viajes/<int:viaje_id>/delete", methods=["POST"])
-@app.route("/admin/<tipo>/<int:viaje_id>/delete", methods=["POST"])
+@web.route("/admin/viajes/<int:viaje_id>/delete", methods=["POST"])
+@web.route("/admin/<tipo>/<int:viaje_id>/delete", methods=["POST"])
+@requiere_admin
 def eliminar_viaje(viaje_id, tipo=None):
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
-
     db = get_db()
-    db.execute("DELETE FROM viajes WHERE id = ?", (viaje_id,))
+    viajes = repos().viajes
+    viaje = viajes.obtener(viaje_id)
+    if viaje:
+        actualizar_referencias(db, [viaje["imagen"]] + [foto.url for foto in viaje.galeria], [])
+    viajes.eliminar(viaje_id)
+    catalogo_viajes.invalidar(db)
     db.commit()
+    recolectar_huerfanos()
+    prerender.encargar_viajes([viaje_id])
+    auditar(usuario_actual()["id"], "eliminar", f"viaje:{viaje_id}")
 
     if tipo:
-        return redirect(url_for(f"admin_{tipo}"))
+        return redirect(url_for(f".admin_{tipo}"))
     else:
-        return redirect(url_for("admin_viajes"))
-
-@app.route("/admin/promociones")
+        return redirect(url_for(".admin_viajes"))
+
+def leer_aplicacion_promocion(db):
+    # A qué viajes aplica la promoción y en qué fechas: (valores, error)
+    try:
+        aplicacion = validar_aplicacion(
+            request.form.get("viaje_id"), request.form.get("aplica_tipo"),
+            request.form.get("desde"), request.form.get("hasta")
+        )
+    except ValueError as error:
+        return None, f"Error: {error}"
+    if aplicacion["viaje_id"] and not catalogo_viajes.por_id(db, aplicacion["viaje_id"]):
+        return None, "Error: El paquete de la promoción no existe"
+    return aplicacion, None
+
+@web.route("/admin/promociones")
+@requiere_admin
 def admin_promociones():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
     db = get_db()
-    promociones = db.execute("SELECT * FROM promociones").fetchall()
-    return render_template("admin_promociones.html", promociones=promociones)
+    promociones, siguiente = paginar(db, "promociones", leer_parametros("promociones", request.args))
+    return render_template("admin_promociones.html", promociones=promociones, siguiente_url=url_pagina(siguiente))
 
-@app.route("/admin/promociones/agregar", methods=["GET", "POST"])
+@web.route("/admin/promociones/agregar", methods=["GET", "POST"])
+@requiere_admin
 def agregar_promocion():
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
-
     if request.method == "POST":
         titulo = request.form.get("titulo")
         descripcion = request.form.get("descripcion")
@@ -499,6 +596,16 @@ def agregar_promocion():
 
         if not titulo or not descripcion or not descuento:
             return "Error: Todos los campos son obligatorios"
+        try:
+            descuento = validar_descuento(descuento)
+        except ValueError as error:
+            flash(str(error))
+            return render_template("agregar_promocion.html"), 400
+
+        db = get_db()
+        aplicacion, error = leer_aplicacion_promocion(db)
+        if error:
+            return error
 
         imagen_path = None
 
@@ -508,34 +615,34 @@ def agregar_promocion():
             file = request.files["imagen_file"]
             if file.filename == "":
                 return "Error: No se seleccionó ningún archivo"
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(file_path)
-                imagen_path = f"/static/uploads/{filename}"
+            extension = extension_imagen(file)
+            if extension:
+                imagen_path = guardar_imagen_subida(file, extension)
             else:
-                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, jpeg, gif, webp)"
+                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, gif, webp)"
         else:
             imagen_path = request.form.get("imagen")
 
-        db = get_db()
-        db.execute(
-            "INSERT INTO promociones (titulo, descripcion, descuento, imagen, tipo) VALUES (?, ?, ?, ?, ?)",
-            (titulo, descripcion, descuento, imagen_path, tipo)
-        )
+        promocion_id = repos().promociones.crear(dict(
+            aplicacion, titulo=titulo, descripcion=descripcion, descuento=descuento, imagen=imagen_path, tipo=tipo
+        ))
+        actualizar_referencias(db, [], [imagen_path])
+        catalogo_promociones.invalidar(db)
+        catalogo_viajes.invalidar(db)
         db.commit()
+        prerender.encargar_promociones(aplicacion)
+        auditar(usuario_actual()["id"], "crear", f"promocion:{promocion_id}", dict(aplicacion, descuento=descuento))
 
-        return redirect(url_for("admin_promociones"))
+        return redirect(url_for(".admin_promociones"))
 
     return render_template("agregar_promocion.html")
 
-@app.route("/admin/promociones/<int:promocion_id>/editar", methods=["GET", "POST"])
+@web.route("/admin/promociones/<int:promocion_id>/editar", methods=["GET", "POST"])
+@requiere_admin
 def editar_promocion(promocion_id):
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
-
     db = get_db()
-    promocion = db.execute("SELECT * FROM promociones WHERE id = ?", (promocion_id,)).fetchone()
+    promociones = repos().promociones
+    promocion = promociones.obtener(promocion_id)
 
     if not promocion:
         return "Promoción no encontrada"
@@ -549,6 +656,15 @@ def editar_promocion(promocion_id):
 
         if not titulo or not descripcion or not descuento:
             return "Error: Todos los campos son obligatorios"
+        try:
+            descuento = validar_descuento(descuento)
+        except ValueError as error:
+            flash(str(error))
+            return render_template("editar_promocion.html", promocion=promocion), 400
+
+        aplicacion, error = leer_aplicacion_promocion(db)
+        if error:
+            return error
 
         imagen_path = promocion["imagen"]
 
@@ -558,41 +674,311 @@ def editar_promocion(promocion_id):
             file = request.files["imagen_file"]
             if file.filename == "":
                 return "Error: No se seleccionó ningún archivo"
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(file_path)
-                imagen_path = f"/static/uploads/{filename}"
+            extension = extension_imagen(file)
+            if extension:
+                imagen_path = guardar_imagen_subida(file, extension)
             else:
-                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, jpeg, gif, webp)"
+                return "Error: Tipo de archivo no permitido. Solo se permiten imágenes (png, jpg, gif, webp)"
         else:
             nueva_imagen = request.form.get("imagen")
             if nueva_imagen:
                 imagen_path = nueva_imagen
 
-        db.execute(
-            "UPDATE promociones SET titulo = ?, descripcion = ?, descuento = ?, imagen = ?, tipo = ? WHERE id = ?",
-            (titulo, descripcion, descuento, imagen_path, tipo, promocion_id)
-        )
+        promociones.actualizar(promocion_id, dict(
+            aplicacion, titulo=titulo, descripcion=descripcion, descuento=descuento, imagen=imagen_path, tipo=tipo
+        ))
+        actualizar_referencias(db, [promocion["imagen"]], [imagen_path])
+        catalogo_promociones.invalidar(db)
+        catalogo_viajes.invalidar(db)
         db.commit()
+        # Los viajes que deja y los que toma la promoción
+        prerender.encargar_promociones(promocion, aplicacion)
+        recolectar_huerfanos()
+        auditar(usuario_actual()["id"], "editar", f"promocion:{promocion_id}", dict(aplicacion, descuento=descuento))
 
-        return redirect(url_for("admin_promociones"))
+        return redirect(url_for(".admin_promociones"))
 
     return render_template("editar_promocion.html", promocion=promocion)
 
-@app.route("/admin/promociones/<int:promocion_id>/delete", methods=["POST"])
+@web.route("/admin/promociones/<int:promocion_id>/delete", methods=["POST"])
+@requiere_admin
 def eliminar_promocion(promocion_id):
-    if session.get("user_role") != "admin":
-        return redirect(url_for("login"))
+    db = get_db()
+    promociones = repos().promociones
+    promocion = promociones.obtener(promocion_id)
+    if promocion:
+        actualizar_referencias(db, [promocion["imagen"]], [])
+    promociones.eliminar(promocion_id)
+    catalogo_promociones.invalidar(db)
+    catalogo_viajes.invalidar(db)
+    db.commit()
+    prerender.encargar_promociones(promocion)
+    recolectar_huerfanos()
+    auditar(usuario_actual()["id"], "eliminar", f"promocion:{promocion_id}")
 
+    return redirect(url_for(".admin_promociones"))
+
+@web.route("/admin/usuarios/<int:usuario_id>/revocar", methods=["POST"])
+@requiere_admin
+def revocar_usuario(usuario_id):
+    # Cierra al instante todas las sesiones abiertas del usuario
     db = get_db()
-    db.execute("DELETE FROM promociones WHERE id = ?", (promocion_id,))
+    revocar_sesiones(db, usuario_id)
     db.commit()
+    auditar(usuario_actual()["id"], "revocar_sesiones", f"usuario:{usuario_id}")
+    return jsonify({"success": True})
+
+@web.route("/admin/importar", methods=["GET", "POST"])
+@requiere_admin
+def admin_importar():
+    if request.method == "GET":
+        return render_template("admin_importar.html", tablas=list(COLUMNAS))
+
+    # El archivo puede ser tan grande como el request completo
+    request.limite_archivo = current_app.config["MAX_CONTENT_LENGTH"]
+    tabla = request.form.get("tabla")
+    archivo = request.files.get("archivo")
+    if tabla not in COLUMNAS:
+        return "Error: Tabla no válida", 400
+    if not archivo or not archivo.filename:
+        return "Error: No se seleccionó ningún archivo", 400
+    formato = request.form.get("formato") or formato_por_nombre(archivo.filename)
+    if formato not in FORMATOS:
+        return "Error: Formato no reconocido (usa .csv o .jsonl)", 400
+
+    resumen = importar(get_db(), tabla, archivo.stream, formato)
+    if resumen["detenida"]:
+        flash(f"Importación detenida en la línea {resumen['detenida']['linea']}: {resumen['detenida']['error']}. "
+              f"Las {resumen['guardadas']} filas anteriores quedaron guardadas.")
+    if resumen["guardadas"]:
+        prerender.encargar_todo()
+    auditar(usuario_actual()["id"], "importar", tabla, {
+        "archivo": archivo.filename, "guardadas": resumen["guardadas"], "errores": resumen["total_errores"],
+    })
+    return render_template("admin_importar.html", tablas=list(COLUMNAS), tabla=tabla, resumen=resumen)
+
+@web.route("/admin/exportar/<tabla>.<formato>")
+@requiere_admin
+def admin_exportar(tabla, formato):
+    if tabla not in COLUMNAS or formato not in FORMATOS:
+        return "Exportación no encontrada", 404
+
+    def generar():
+        # Conexión propia: la respuesta sigue enviándose después del teardown
+        conn = pool.obtener()
+        try:
+            yield from exportar(conn, tabla, formato)
+        finally:
+            pool.devolver(conn)
+
+    return Response(generar(), mimetype=FORMATOS[formato], headers={
+        "Content-Disposition": f"attachment; filename={tabla}.{formato}",
+    })
+
+@web.route("/admin/cache")
+@requiere_admin
+def admin_cache():
+    return jsonify({
+        "viajes": catalogo_viajes.estadisticas(),
+        "promociones": catalogo_promociones.estadisticas(),
+        "paginas": paginas.estadisticas(),
+        "sesiones": sesiones.estadisticas(),
+        "escrituras": escrituras.cola.estadisticas(),
+    })
+
+@web.route("/admin/respaldos", methods=["GET", "POST"])
+@requiere_admin
+def admin_respaldos():
+    if request.method == "GET":
+        return jsonify(respaldos.respaldos.estadisticas())
+
+    # Corre en un hilo del worker: la copia avanza por pasos con pausas
+    try:
+        respaldos.respaldos.encargar()
+    except respaldos.RespaldoEnCurso:
+        return "Error: Ya hay un respaldo en curso", 409
+    auditar(usuario_actual()["id"], "respaldar", "base")
+    return jsonify({"encargado": True}), 202
 
-    return redirect(url_for("admin_promociones"))
+# --------------------------------------------------
+# FÁBRICA DE LA APLICACIÓN
+# --------------------------------------------------
+# Crear la app no toca el esquema: solo compara PRAGMA user_version con la
+# cantidad de migraciones. Las tablas y el admin se crean con
+#   flask --app app migrate
+#   flask --app app seed
+# Así cada worker arranca rápido y gunicorn --preload no abre conexiones
+# en el proceso maestro.
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SECRET_KEY", "clave_local_dev")
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    app.config["MAX_CONTENT_LENGTH"] = MAX_SUBIDA
+    # Los archivos del multipart se escriben a disco mientras llegan
+    app.request_class = PeticionConSubidas
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    app.jinja_env.globals["imagen_responsive"] = imagen_responsive
+
+    # Las conexiones vuelven al pool al terminar cada request
+    app.teardown_appcontext(cerrar_db)
+
+    # Estáticos con huella en el nombre y cache inmutable (ver estaticos.py)
+    estaticos.init_app(app)
+
+    # Sesiones en el servidor; la cookie solo lleva un id opaco (ver sesiones.py)
+    sesiones.init_app(app)
+
+    # Latencias, SQL por request y render de plantillas en /metrics (ver metricas.py)
+    metricas.init_app(app)
+
+    # Páginas públicas pre-renderizadas en PRERENDER_DIR (ver prerender.py)
+    prerender.init_app(app)
+
+    # Detrás de un proxy remote_addr es la del proxy y todos los clientes
+    # compartirían la cubeta de intentos por IP. PROXY_HOPS = cantidad de
+    # proxies de confianza; con 0 no se lee X-Forwarded-For (se podría falsificar)
+    saltos = int(os.environ.get("PROXY_HOPS", "0"))
+    if saltos:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=saltos, x_proto=saltos)
+
+    app.register_blueprint(web)
+
+    app.config["ESQUEMA_AL_DIA"] = esquema_al_dia()
+    if not app.config["ESQUEMA_AL_DIA"]:
+        logger.error("La base de datos no está migrada: ejecuta `flask --app app migrate`")
+
+    @app.before_request
+    def verificar_esquema():
+        # Solo consulta la base mientras el esquema siga atrasado
+        if not app.config["ESQUEMA_AL_DIA"]:
+            if not esquema_al_dia():
+                return "Base de datos sin migrar", 503
+            app.config["ESQUEMA_AL_DIA"] = True
+
+    # Después del chequeo de esquema: necesita la tabla precios_vigentes
+    precios.init_app(app)
+
+    # Respaldos automáticos cada RESPALDO_INTERVALO_HORAS (ver respaldos.py)
+    respaldos.init_app(app)
+
+    @app.cli.command("migrate")
+    def migrate():
+        """Crea las tablas y aplica las migraciones pendientes."""
+        init_db()
+        app.config["ESQUEMA_AL_DIA"] = True
+
+    @app.cli.command("seed")
+    def seed():
+        """Crea el usuario administrador por defecto."""
+        crear_admin_por_defecto()
+
+    @app.cli.command("prerender")
+    @click.option("--salida", type=click.Path(file_okay=False), help="Por defecto PRERENDER_DIR o ./prerender.")
+    def prerender_cmd(salida):
+        """Pre-renderiza las páginas públicas y activa el build de forma atómica."""
+        salida = os.path.abspath(salida or app.config.get("PRERENDER_DIR") or "prerender")
+        escritas = prerender.construir(app, salida)
+        click.echo(f"{escritas} páginas escritas; build activo en {os.path.join(salida, 'actual')}")
+
+    @app.cli.command("importar")
+    @click.argument("tabla", type=click.Choice(list(COLUMNAS)))
+    @click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--formato", type=click.Choice(list(FORMATOS)), help="Por defecto según la extensión.")
+    def importar_cmd(tabla, archivo, formato):
+        """Importa viajes o promociones desde CSV / JSON Lines."""
+        formato = formato or formato_por_nombre(archivo)
+        if not formato:
+            raise click.UsageError("No se reconoce el formato; usa --formato")
+
+        def progreso(resumen):
+            click.echo(f"  {resumen['procesadas']} filas, {resumen['guardadas']} guardadas, "
+                       f"{resumen['total_errores']} con errores", err=True)
+
+        with open(archivo, "rb") as stream:
+            resumen = importar(get_db(), tabla, stream, formato, progreso=progreso)
+        for error in resumen["errores"]:
+            click.echo(f"línea {error['linea']}: {error['error']}", err=True)
+        click.echo(f"{resumen['guardadas']} filas guardadas, {resumen['total_errores']} con errores")
+        if resumen["detenida"]:
+            raise click.ClickException(
+                f"importación detenida en la línea {resumen['detenida']['linea']}; "
+                f"las {resumen['guardadas']} filas anteriores quedaron guardadas"
+            )
+
+    @app.cli.command("exportar")
+    @click.argument("tabla", type=click.Choice(list(COLUMNAS)))
+    @click.argument("archivo", type=click.Path(dir_okay=False))
+    @click.option("--formato", type=click.Choice(list(FORMATOS)), help="Por defecto según la extensión.")
+    def exportar_cmd(tabla, archivo, formato):
+        """Exporta viajes o promociones a CSV / JSON Lines."""
+        formato = formato or formato_por_nombre(archivo) or "csv"
+        with open(archivo, "w", encoding="utf-8", newline="") as salida:
+            for bloque in exportar(get_db(), tabla, formato):
+                salida.write(bloque)
+
+    @app.cli.command("respaldar")
+    @click.option("--paginas", type=int, default=respaldos.PAGINAS_POR_PASO, show_default=True,
+                  help="Páginas copiadas por paso.")
+    @click.option("--pausa-ms", type=int, default=respaldos.PAUSA_MS, show_default=True,
+                  help="Pausa entre pasos.")
+    def respaldar_cmd(paginas, pausa_ms):
+        """Respalda la base en caliente a RESPALDOS_DIR (comprimido y verificado)."""
+        def progreso(copiadas, total):
+            click.echo(f"\r  {copiadas}/{total} páginas", nl=False, err=True)
+
+        try:
+            resultado = respaldos.respaldar(paginas=paginas, pausa_ms=pausa_ms, progreso=progreso)
+        except respaldos.RespaldoEnCurso as error:
+            raise click.ClickException(str(error))
+        click.echo("", err=True)
+        click.echo(f"{resultado['archivo']}: {resultado['bytes']} bytes, "
+                   f"{resultado['paginas']} páginas en {resultado['segundos']} s")
+
+    @app.cli.command("verificar-respaldos")
+    @click.argument("archivos", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+    def verificar_respaldos_cmd(archivos):
+        """Corre integrity_check sobre los respaldos indicados (o todos los de RESPALDOS_DIR)."""
+        archivos = archivos or [os.path.join(respaldos.RESPALDOS_DIR, r["archivo"]) for r in respaldos.listar()]
+        fallidos = 0
+        for archivo in archivos:
+            try:
+                version = respaldos.verificar(archivo)
+                click.echo(f"ok     {archivo} (esquema {version})")
+            except respaldos.RespaldoFallido as error:
+                fallidos += 1
+                click.echo(f"FALLA  {archivo}: {error}")
+        if fallidos:
+            raise click.ClickException(f"{fallidos} respaldo(s) con errores")
+
+    @app.cli.command("restaurar")
+    @click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--sin-previo", is_flag=True, help="No respaldar la base actual antes de reemplazarla.")
+    @click.confirmation_option(prompt="¿Reemplazar la base actual por este respaldo?")
+    def restaurar_cmd(archivo, sin_previo):
+        """Reemplaza la base por un respaldo verificado y aplica las migraciones pendientes."""
+        try:
+            version, previo = respaldos.restaurar(archivo, previo=not sin_previo)
+        except respaldos.RespaldoFallido as error:
+            raise click.ClickException(f"Respaldo inválido, la base no se modificó: {error}")
+        except respaldos.RespaldoEnCurso as error:
+            raise click.ClickException(str(error))
+        if previo:
+            click.echo(f"Base anterior respaldada en {previo['archivo']}")
+        # Un respaldo anterior a las últimas migraciones queda al día
+        init_db()
+        app.config["ESQUEMA_AL_DIA"] = True
+        click.echo(f"Restaurado {archivo} (esquema {version}). Reinicia los workers y, "
+                   f"si usas PRERENDER_DIR, ejecuta `flask --app app prerender`.")
+
+    return app
+
+app = create_app()
 
 # --------------------------------------------------
 # MAIN
 # --------------------------------------------------
 if __name__ == "__main__":
+    with app.app_context():
+        init_db()
+        crear_admin_por_defecto()
     app.run(debug=True)
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import MultiDict
+
+import api
+from app import app as flask_app
+from database import BaseAsync, pool
+from sesiones import InterfazSesiones, usuario_por_sid
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# MODO ASGI (uvicorn)
+# --------------------------------------------------
+#   uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 8000
+#
+# Las rutas JSON (sesión, carrito, catálogo paginado y búsqueda) se atienden
+# en el event loop: esperar al cliente no ocupa un hilo y las consultas van
+# al pool de BaseAsync. Todo lo demás (HTML, admin, subidas) pasa a la app
+# Flask de siempre por un puente WSGI con su propio pool de hilos.
+# Las rutas nativas no pasan por los hooks de Flask (sin métricas de /metrics
+# ni caché de páginas); comparten con Flask la lógica de api.py, la base y
+# las sesiones del servidor.
+
+HILOS_WSGI = int(os.environ.get("ASGI_HILOS_WSGI", "8"))
+MAX_CUERPO_JSON = 64 * 1024
+CUERPO_EN_MEMORIA = 1024 * 1024
+
+base = BaseAsync(flask_app)
+
+# --------------------------------------------------
+# RESPUESTAS
+# --------------------------------------------------
+async def responder_json(send, payload, estado=200):
+    cuerpo = json.dumps(payload, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+async def responder_demasiado_grande(send):
+    # Mismo texto que el manejador de RequestEntityTooLarge de la app
+    cuerpo = "Error: La subida supera el tamaño máximo permitido".encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [
+            (b"content-type", b"text/html; charset=utf-8"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+def _argumentos(scope):
+    return MultiDict(parse_qsl(scope["query_string"].decode("latin1"), keep_blank_values=True))
+
+def _sid(scope):
+    for nombre, valor in scope["headers"]:
+        if nombre == b"cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(valor.decode("latin1"))
+            except Exception:
+                return None
+            morsel = cookie.get(flask_app.config["SESSION_COOKIE_NAME"])
+            return morsel.value if morsel else None
+    return None
+
+async def _leer_cuerpo(receive, limite):
+    # None si supera el límite
+    partes, total = [], 0
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "http.disconnect":
+            return b""
+        parte = mensaje.get("body", b"")
+        total += len(parte)
+        if total > limite:
+            return None
+        partes.append(parte)
+        if not mensaje.get("more_body"):
+            return b"".join(partes)
+
+# --------------------------------------------------
+# RUTAS NATIVAS
+# --------------------------------------------------
+async def api_viajes(scope, receive, send):
+    payload, estado = await base.ejecutar(api.pagina_viajes, _argumentos(scope))
+    await responder_json(send, payload, estado)
+
+async def api_buscar(scope, receive, send):
+    payload, estado = await base.ejecutar(api.resultados_busqueda, _argumentos(scope))
+    await responder_json(send, payload, estado)
+
+async def verificar_sesion(scope, receive, send):
+    usuario = await base.ejecutar(usuario_por_sid, _sid(scope))
+    await responder_json(send, {"logged_in": bool(usuario)})
+
+def _agregar(db, sid, data):
+    return api.agregar_al_carrito(db, usuario_por_sid(db, sid), data)
+
+async def agregar_carrito(scope, receive, send):
+    cuerpo = await _leer_cuerpo(receive, MAX_CUERPO_JSON)
+    if cuerpo is None:
+        await responder_json(send, {"success": False, "message": "Solicitud demasiado grande"}, 413)
+        return
+    try:
+        data = json.loads(cuerpo or b"{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    payload, estado = await base.ejecutar(_agregar, _sid(scope), data)
+    await responder_json(send, payload, estado)
+
+RUTAS = {
+    ("GET", "/api/viajes"): api_viajes,
+    ("GET", "/api/buscar"): api_buscar,
+}
+# Con SESSION_BACKEND=cookie la sesión la decodifica Flask
+if isinstance(flask_app.session_interface, InterfazSesiones):
+    RUTAS[("GET", "/verificar_sesion")] = verificar_sesion
+    RUTAS[("POST", "/agregar_carrito")] = agregar_carrito
+
+# --------------------------------------------------
+# PUENTE WSGI PARA EL RESTO DE LA APP
+# --------------------------------------------------
+def _largo_declarado(scope):
+    # Content-Length del cliente, o 0 si no viene (chunked) o no es un número
+    for nombre, valor in scope["headers"]:
+        if nombre == b"content-length":
+            try:
+                return int(valor)
+            except ValueError:
+                return 0
+    return 0
+
+def _environ(scope, cuerpo):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin1"),
+        "PATH_INFO": scope["path"].encode().decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": cuerpo,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope["headers"]:
+        nombre = nombre.decode("latin1").upper().replace("-", "_")
+        if nombre not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            nombre = "HTTP_" + nombre
+        valor = valor.decode("latin1")
+        environ[nombre] = environ[nombre] + "," + valor if nombre in environ else valor
+    return environ
+
+
+class PuenteWSGI:
+    # Corre la app WSGI en un pool de hilos; cada bloque de la respuesta se
+    # envía esperando al cliente (contrapresión para exportaciones grandes)
+    def __init__(self, wsgi, hilos=HILOS_WSGI, limite=None):
+        self.wsgi = wsgi
+        self.limite = limite
+        self.ejecutor = ThreadPoolExecutor(hilos, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        # El cuerpo se cuenta mientras llega: pasado `limite` se corta con 413
+        # sin seguir escribiendo a disco (Flask solo lo vería al terminar)
+        if self.limite is not None and _largo_declarado(scope) > self.limite:
+            await responder_demasiado_grande(send)
+            return
+        cuerpo = SpooledTemporaryFile(max_size=CUERPO_EN_MEMORIA)
+        leidos = 0
+        try:
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] == "http.disconnect":
+                    return
+                bloque = mensaje.get("body", b"")
+                leidos += len(bloque)
+                if self.limite is not None and leidos > self.limite:
+                    await responder_demasiado_grande(send)
+                    return
+                cuerpo.write(bloque)
+                if not mensaje.get("more_body"):
+                    break
+            cuerpo.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.ejecutor, self._atender, loop, scope, cuerpo, leidos, send)
+        finally:
+            cuerpo.close()
+
+    def _atender(self, loop, scope, cuerpo, leidos, send):
+        def enviar(mensaje):
+            asyncio.run_coroutine_threadsafe(send(mensaje), loop).result()
+
+        inicio = {}
+        def start_response(estado, cabeceras, exc_info=None):
+            inicio["mensaje"] = {
+                "type": "http.response.start",
+                "status": int(estado.split(" ", 1)[0]),
+                "headers": [(n.lower().encode("latin1"), v.encode("latin1")) for n, v in cabeceras],
+            }
+
+        # El cuerpo ya está completo y sin chunks: sin CONTENT_LENGTH Werkzeug
+        # descarta el de un request chunked (y con él el formulario)
+        environ = _environ(scope, cuerpo)
+        environ.pop("HTTP_TRANSFER_ENCODING", None)
+        environ["CONTENT_LENGTH"] = str(leidos)
+        resultado = self.wsgi(environ, start_response)
+        try:
+            for bloque in resultado:
+                if not bloque:
+                    continue
+                if inicio:
+                    enviar(inicio.pop("mensaje"))
+                enviar({"type": "http.response.body", "body": bloque, "more_body": True})
+            if inicio:
+                enviar(inicio.pop("mensaje"))
+            enviar({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(resultado, "close"):
+                resultado.close()
+
+flask_asgi = PuenteWSGI(flask_app, limite=flask_app.config["MAX_CONTENT_LENGTH"])
+
+# --------------------------------------------------
+# APLICACIÓN ASGI
+# --------------------------------------------------
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                base.cerrar()
+                flask_asgi.ejecutor.shutdown(wait=False)
+                pool.cerrar_todas()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    ruta = RUTAS.get((scope["method"], scope["path"]))
+    # El chequeo de esquema de create_app también vale para las rutas nativas
+    if ruta is None or not flask_app.config.get("ESQUEMA_AL_DIA", True):
+        await flask_asgi(scope, receive, send)
+        return
+    try:
+        await ruta(scope, receive, send)
+    except Exception:
+        logger.exception("Error en %s %s", scope["method"], scope["path"])
+        await responder_json(send, {"success": False, "message": "Error interno"}, 500)
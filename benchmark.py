@@ -0,0 +1,542 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import sqlite3
+import argparse
+import tempfile
+import platform
+import subprocess
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmark reproducible de las rutas públicas y del carrito.
+#
+# Crea un catálogo sintético en una base temporal, recorre /, /paquetes,
+# /paquete/<id>, /login y /agregar_carrito con el cliente de pruebas de
+# Flask (sin red, mide la app), con gunicorn local (HTTP real, varios
+# workers sync) y con uvicorn sobre asgi.py (modo ASGI), e informa p50/p95/p99 y requests por segundo. Los resultados
+# se guardan en JSON y se comparan con una línea base: si alguna ruta
+# empeora más que la tolerancia el script termina con código 1.
+#
+# Uso:
+#   python benchmark.py --viajes 50000 --guardar-baseline   # fija la línea base
+#   python benchmark.py --viajes 50000                       # compara contra ella
+#   python benchmark.py --modo servidores --concurrencia 64  # sync vs ASGI con mucha concurrencia
+#   python benchmark.py --modo carrito                       # total del carrito de 1 a 500 ítems
+#   python benchmark.py --modo escrituras                    # contacto síncrono vs cola diferida
+#   python benchmark.py --modo respaldo --viajes 200000      # latencia durante un respaldo en caliente
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(REPO, "benchmark_baseline.json")
+PASSWORD = "Bench123"
+
+parser = argparse.ArgumentParser(description="Benchmark de WonderChile")
+parser.add_argument("--viajes", type=int, default=10000)
+parser.add_argument("--usuarios", type=int, default=2000)
+parser.add_argument("--requests", type=int, default=300, help="requests por ruta y modo")
+parser.add_argument("--modo", choices=["cliente", "gunicorn", "uvicorn", "ambos", "servidores", "carrito", "escrituras", "respaldo"], default="ambos",
+                    help="ambos = cliente + gunicorn; servidores = gunicorn + uvicorn")
+parser.add_argument("--workers", type=int, default=2, help="procesos de gunicorn / uvicorn")
+parser.add_argument("--concurrencia", type=int, default=8, help="clientes HTTP simultáneos")
+parser.add_argument("--salida", default="benchmark_resultados.json")
+parser.add_argument("--baseline", default=BASELINE)
+parser.add_argument("--tolerancia", type=float, default=0.25, help="empeoramiento máximo aceptado (0.25 = 25%%)")
+parser.add_argument("--guardar-baseline", action="store_true")
+args = parser.parse_args()
+args.salida = os.path.abspath(args.salida)
+args.baseline = os.path.abspath(args.baseline)
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_bench_")
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+# Los límites de login están pensados para personas, no para este script
+os.environ.setdefault("LOGIN_INTENTOS_IP", "1000000000")
+os.environ.setdefault("LOGIN_INTENTOS_EMAIL", "1000000000")
+os.chdir(directorio)
+sys.path.insert(0, REPO)
+
+# --------------------------------------------------
+# DATOS SINTÉTICOS (misma forma que populate_db.py)
+# --------------------------------------------------
+def poblar():
+    import app as wonderchile
+    from seguridad import hashear_password
+    from precios import recalcular_precios
+
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        # Un solo hash para todos: sembrar miles de scrypt tomaría minutos
+        hash_comun = hashear_password(PASSWORD)
+
+    random.seed(1)
+    tipos = ["paquete", "gira", "mujeres"]
+    destinos = ["Santiago", "Cajón del Maipo", "Valparaíso", "Puerto Varas", "Torres del Paine",
+                "Atacama", "Isla de Pascua", "Chiloé", "Pucón", "Valle del Elqui"]
+    conn = sqlite3.connect(os.environ["DATABASE"])
+    conn.executemany(
+        "INSERT INTO usuarios (nombre, email, password, role) VALUES (?, ?, ?, 'user')",
+        [(f"Usuario {i}", f"usuario{i}@example.com", hash_comun) for i in range(args.usuarios)]
+    )
+    conn.executemany(
+        "INSERT INTO viajes (titulo, descripcion, precio, imagen, itinerario, tipo) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"{random.choice(destinos)} {i}",
+          f"Descubre {random.choice(destinos)} en un viaje guiado con actividades y alojamiento incluido.",
+          random.randint(30000, 300000), f"/static/uploads/viaje_{i}.jpg",
+          "Día 1: Llegada\nDía 2: Excursión\nDía 3: Regreso", random.choice(tipos))
+         for i in range(args.viajes)]
+    )
+    conn.executemany(
+        "INSERT INTO viaje_imagenes (viaje_id, url, orden) VALUES (?, ?, ?)",
+        [(v, f"/static/uploads/galeria_{v}_{n}.jpg", n)
+         for v in range(1, args.viajes + 1) for n in range(3)]
+    )
+    primer_usuario = conn.execute("SELECT MIN(id) FROM usuarios WHERE role = 'user'").fetchone()[0]
+    conn.executemany(
+        "INSERT OR IGNORE INTO carrito (usuario_id, viaje_id) VALUES (?, ?)",
+        [(primer_usuario + random.randrange(args.usuarios), random.randint(1, args.viajes))
+         for _ in range(args.usuarios * 5)]
+    )
+    # Promociones por tipo para que haya descuentos en el catálogo y el carrito
+    conn.executemany(
+        "INSERT INTO promociones (titulo, descripcion, descuento, tipo, aplica_tipo, desde, hasta) "
+        "VALUES (?, 'Promoción de prueba', ?, 'promocion', ?, ?, ?)",
+        [("Giras -10%", 10, "gira", None, None), ("Mujeres -15%", 15, "mujeres", "2000-01-01", "2999-12-31")]
+    )
+    recalcular_precios(conn)
+    conn.execute("UPDATE cache_version SET version = version + 1")
+    conn.commit()
+    conn.close()
+
+# --------------------------------------------------
+# ESCENARIOS
+# --------------------------------------------------
+# Cada escenario recibe un "cliente" con get(url) y post(url, form=, cuerpo_json=)
+# y devuelve el código de estado.
+def escenarios():
+    def email():
+        return f"usuario{random.randrange(args.usuarios)}@example.com"
+    return {
+        "/": lambda c: c.get("/"),
+        "/paquetes": lambda c: c.get("/paquetes"),
+        "/paquete/<id>": lambda c: c.get(f"/paquete/{random.randint(1, args.viajes)}"),
+        "/login": lambda c: c.post("/login", form={"email": email(), "password": PASSWORD}),
+        "/agregar_carrito": lambda c: c.post("/agregar_carrito", cuerpo_json={"viaje_id": random.randint(1, args.viajes)}),
+        "/verificar_sesion": lambda c: c.get("/verificar_sesion"),
+        "/api/viajes": lambda c: c.get(f"/api/viajes?precio_min={random.randint(30000, 250000)}&orden=precio"),
+    }
+
+def es_error(estado):
+    # 400 "ya está en el carrito" es una respuesta normal; 401/429/5xx no
+    return estado >= 500 or estado in (401, 429)
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def resumir(duraciones, errores, total_segundos):
+    ms = [d * 1000 for d in duraciones]
+    return {
+        "requests": len(ms),
+        "errores": errores,
+        "p50_ms": round(percentil(ms, 50), 3),
+        "p95_ms": round(percentil(ms, 95), 3),
+        "p99_ms": round(percentil(ms, 99), 3),
+        "rps": round(len(ms) / total_segundos, 1),
+    }
+
+# --------------------------------------------------
+# MODO 1: CLIENTE DE PRUEBAS DE FLASK
+# --------------------------------------------------
+class ClienteFlask:
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def get(self, url):
+        return self.cliente.get(url).status_code
+
+    def post(self, url, form=None, cuerpo_json=None):
+        return self.cliente.post(url, data=form, json=cuerpo_json).status_code
+
+def medir_cliente():
+    import app as wonderchile
+    cliente = ClienteFlask(wonderchile.app)
+    cliente.post("/login", form={"email": "usuario0@example.com", "password": PASSWORD})
+    resultados = {}
+    for ruta, escenario in escenarios().items():
+        escenario(cliente)  # calentar cachés
+        duraciones, errores = [], 0
+        inicio_total = time.perf_counter()
+        for _ in range(args.requests):
+            inicio = time.perf_counter()
+            estado = escenario(cliente)
+            duraciones.append(time.perf_counter() - inicio)
+            errores += es_error(estado)
+        resultados[ruta] = resumir(duraciones, errores, time.perf_counter() - inicio_total)
+        # /login cambia la sesión: volver al mismo usuario para el carrito
+        cliente.post("/login", form={"email": "usuario0@example.com", "password": PASSWORD})
+    return resultados
+
+# --------------------------------------------------
+# MODO 2 Y 3: GUNICORN (SYNC) Y UVICORN (ASGI) LOCALES
+# --------------------------------------------------
+class SinRedireccion(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *a, **kw):
+        return None
+
+class ClienteHTTP:
+    def __init__(self, base):
+        self.base = base
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), SinRedireccion()
+        )
+
+    def _enviar(self, peticion):
+        try:
+            with self.abridor.open(peticion, timeout=30) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+    def get(self, url):
+        return self._enviar(urllib.request.Request(self.base + url))
+
+    def post(self, url, form=None, cuerpo_json=None):
+        if cuerpo_json is not None:
+            cuerpo, tipo = json.dumps(cuerpo_json).encode(), "application/json"
+        else:
+            cuerpo, tipo = urllib.parse.urlencode(form or {}).encode(), "application/x-www-form-urlencoded"
+        return self._enviar(urllib.request.Request(
+            self.base + url, data=cuerpo, headers={"Content-Type": tipo}, method="POST"
+        ))
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def esperar_servidor(base, proceso, segundos=30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("el servidor terminó al arrancar")
+        try:
+            urllib.request.urlopen(base + "/", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no respondió a tiempo")
+
+COMANDOS = {
+    "gunicorn": lambda puerto: [
+        sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO, "gunicorn.conf.py"),
+        "-w", str(args.workers), "-b", f"127.0.0.1:{puerto}", "--log-level", "warning", "app:app"],
+    "uvicorn": lambda puerto: [
+        sys.executable, "-m", "uvicorn", "--workers", str(args.workers), "--host", "127.0.0.1",
+        "--port", str(puerto), "--log-level", "warning", "--no-access-log", "asgi:app"],
+}
+
+def medir_servidor(nombre):
+    puerto = puerto_libre()
+    base = f"http://127.0.0.1:{puerto}"
+    entorno = dict(os.environ, PYTHONPATH=REPO)
+    proceso = subprocess.Popen(COMANDOS[nombre](puerto), cwd=directorio, env=entorno)
+    try:
+        esperar_servidor(base, proceso)
+        clientes = []
+        for i in range(args.concurrencia):
+            cliente = ClienteHTTP(base)
+            cliente.post("/login", form={"email": f"usuario{i}@example.com", "password": PASSWORD})
+            clientes.append(cliente)
+
+        resultados = {}
+        for ruta, escenario in escenarios().items():
+            def trabajar(cliente, cantidad):
+                tiempos, fallidos = [], 0
+                for _ in range(cantidad):
+                    inicio = time.perf_counter()
+                    estado = escenario(cliente)
+                    tiempos.append(time.perf_counter() - inicio)
+                    fallidos += es_error(estado)
+                return tiempos, fallidos
+
+            por_cliente = max(1, args.requests // args.concurrencia)
+            inicio_total = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrencia) as ejecutor:
+                partes = list(ejecutor.map(trabajar, clientes, [por_cliente] * len(clientes)))
+            total = time.perf_counter() - inicio_total
+            duraciones = [t for tiempos, _ in partes for t in tiempos]
+            resultados[ruta] = resumir(duraciones, sum(f for _, f in partes), total)
+            for i, cliente in enumerate(clientes):
+                cliente.post("/login", form={"email": f"usuario{i}@example.com", "password": PASSWORD})
+        return resultados
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+# --------------------------------------------------
+# MODO 4: TOTAL DEL CARRITO SEGÚN SU TAMAÑO
+# --------------------------------------------------
+# total_carrito() (agregado en SQLite, lo que devuelve /agregar_carrito),
+# totales_carrito() (filas y totales para la página /carrito) y, como
+# referencia, una consulta de precio por ítem.
+TAMANOS_CARRITO = (1, 10, 50, 100, 250, 500)
+
+def medir_carrito():
+    import app as wonderchile
+    from database import get_db
+    from precios import total_carrito, totales_carrito
+
+    def por_item(db, usuario_id):
+        total = 0
+        for fila in db.execute("SELECT viaje_id FROM carrito WHERE usuario_id = ?", (usuario_id,)).fetchall():
+            total += db.execute(
+                "SELECT precio_final FROM viajes_con_precio WHERE id = ?", (fila["viaje_id"],)
+            ).fetchone()[0]
+        return total
+
+    resultados = {}
+    with wonderchile.app.app_context():
+        db = get_db()
+        usuario_id = db.execute("SELECT id FROM usuarios WHERE email = 'usuario0@example.com'").fetchone()[0]
+        for cantidad in TAMANOS_CARRITO:
+            cantidad = min(cantidad, args.viajes)
+            db.execute("DELETE FROM carrito WHERE usuario_id = ?", (usuario_id,))
+            db.executemany(
+                "INSERT INTO carrito (usuario_id, viaje_id) VALUES (?, ?)",
+                [(usuario_id, viaje_id) for viaje_id in random.sample(range(1, args.viajes + 1), cantidad)]
+            )
+            db.commit()
+            for nombre, funcion in (("total", total_carrito), ("filas+total", totales_carrito), ("por ítem", por_item)):
+                funcion(db, usuario_id)  # calentar
+                duraciones = []
+                inicio_total = time.perf_counter()
+                for _ in range(args.requests):
+                    inicio = time.perf_counter()
+                    funcion(db, usuario_id)
+                    duraciones.append(time.perf_counter() - inicio)
+                resultados[f"{nombre} x{cantidad}"] = resumir(duraciones, 0, time.perf_counter() - inicio_total)
+    return resultados
+
+# --------------------------------------------------
+# ESCRITURAS DIFERIDAS
+# --------------------------------------------------
+# Lo que espera quien envía el formulario de contacto: INSERT + commit en
+# el request o escrituras.encolar(). "+escritor" repite la medición con
+# otro proceso tomando el lock de escritura de SQLite 50 ms de cada 60,
+# como un import o un recálculo de precios largo. Entre envíos hay 1 ms
+# de pausa, así que req/s no aplica en este modo.
+def _escritor_lento(ruta, detener):
+    db = sqlite3.connect(ruta, timeout=30, isolation_level=None)
+    while not detener.is_set():
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("UPDATE viajes SET destacado = destacado WHERE id = 1")
+        time.sleep(0.05)
+        db.execute("COMMIT")
+        time.sleep(0.01)
+    db.close()
+
+def medir_escrituras():
+    import threading
+    from database import pool
+    from escrituras import ColaEscrituras, insertar, nueva_entrada
+
+    datos = {"nombre": "Bench", "email": "bench@example.com", "mensaje": "Consulta de benchmark"}
+    cola = ColaEscrituras(directorio=os.path.join(directorio, "spool"))
+
+    def sincrono():
+        conn = pool.obtener()
+        try:
+            insertar(conn, [nueva_entrada("contacto", datos)])
+            conn.commit()
+        finally:
+            pool.devolver(conn)
+
+    def encolado():
+        cola.encolar("contacto", datos)
+
+    resultados = {}
+    for contencion in (False, True):
+        detener = threading.Event()
+        escritor = None
+        if contencion:
+            escritor = threading.Thread(target=_escritor_lento, args=(os.environ["DATABASE"], detener))
+            escritor.start()
+            time.sleep(0.1)
+        try:
+            for nombre, funcion in (("síncrono", sincrono), ("encolado", encolado)):
+                duraciones = []
+                errores = 0
+                inicio_total = time.perf_counter()
+                for _ in range(args.requests):
+                    inicio = time.perf_counter()
+                    try:
+                        funcion()
+                    except sqlite3.OperationalError:
+                        errores += 1
+                    duraciones.append(time.perf_counter() - inicio)
+                    # Llegadas espaciadas: las mediciones cubren varios ciclos del escritor
+                    time.sleep(0.001)
+                clave = f"{nombre} +escritor" if contencion else nombre
+                resultados[clave] = resumir(duraciones, errores, time.perf_counter() - inicio_total)
+        finally:
+            detener.set()
+            if escritor:
+                escritor.join()
+
+    # Todo lo encolado tiene que terminar en la base
+    cola.cerrar(timeout=60)
+    enviados = args.requests * 4
+    guardados = sqlite3.connect(os.environ["DATABASE"]).execute(
+        "SELECT COUNT(*) FROM contactos WHERE email = 'bench@example.com'"
+    ).fetchone()[0]
+    if guardados != enviados:
+        print(f"Aviso: {enviados - guardados} escrituras no llegaron a la base")
+    return resultados
+
+# --------------------------------------------------
+# RESPALDO EN CALIENTE
+# --------------------------------------------------
+# Latencia de lectura y carrito mientras respaldos.respaldar() copia la
+# base en otro hilo (como lo dispara el panel): sin respaldo, por pasos
+# con pausas (la configuración por defecto) y en un solo paso. Con
+# respaldo se mide hasta que termina, con al menos --requests requests.
+RUTAS_RESPALDO = ("/paquetes", "/paquete/<id>", "/agregar_carrito", "/api/viajes")
+
+def medir_respaldo():
+    import threading
+    import app as wonderchile
+    import respaldos
+
+    cliente = ClienteFlask(wonderchile.app)
+    cliente.post("/login", form={"email": "usuario0@example.com", "password": PASSWORD})
+    rutas = [escenario for ruta, escenario in escenarios().items() if ruta in RUTAS_RESPALDO]
+    for escenario in rutas:
+        escenario(cliente)  # calentar cachés
+    carpeta = os.path.join(directorio, "respaldos")
+    print(f"Base de {os.path.getsize(os.environ['DATABASE']) / 1024 / 1024:.0f} MB")
+
+    variantes = {
+        "sin respaldo": None,
+        "por pasos": (respaldos.PAGINAS_POR_PASO, respaldos.PAUSA_MS),
+        "un paso": (-1, 0),
+    }
+    resultados = {}
+    for nombre, ajustes in variantes.items():
+        hilo = None
+        copia = {}
+        if ajustes:
+            paginas, pausa_ms = ajustes
+            hilo = threading.Thread(target=lambda: copia.update(
+                respaldos.respaldar(directorio=carpeta, paginas=paginas, pausa_ms=pausa_ms)
+            ))
+            hilo.start()
+        duraciones, errores = [], 0
+        inicio_total = time.perf_counter()
+        while len(duraciones) < args.requests or (hilo and hilo.is_alive()):
+            escenario = rutas[len(duraciones) % len(rutas)]
+            inicio = time.perf_counter()
+            estado = escenario(cliente)
+            duraciones.append(time.perf_counter() - inicio)
+            errores += es_error(estado)
+        if hilo:
+            hilo.join()
+        resultados[nombre] = resumir(duraciones, errores, time.perf_counter() - inicio_total)
+        if copia:
+            resultados[nombre]["respaldo_s"] = copia["segundos"]
+    return resultados
+
+# --------------------------------------------------
+# COMPARACIÓN CON LA LÍNEA BASE
+# --------------------------------------------------
+def comparar(actual, base):
+    regresiones = []
+    for modo, rutas in actual["resultados"].items():
+        for ruta, medida in rutas.items():
+            anterior = base.get("resultados", {}).get(modo, {}).get(ruta)
+            if not anterior:
+                continue
+            if medida["p95_ms"] > anterior["p95_ms"] * (1 + args.tolerancia):
+                regresiones.append(f"{modo} {ruta}: p95 {anterior['p95_ms']} -> {medida['p95_ms']} ms")
+            if medida["rps"] < anterior["rps"] * (1 - args.tolerancia):
+                regresiones.append(f"{modo} {ruta}: rps {anterior['rps']} -> {medida['rps']}")
+            if medida["errores"] > anterior["errores"]:
+                regresiones.append(f"{modo} {ruta}: errores {anterior['errores']} -> {medida['errores']}")
+    return regresiones
+
+def imprimir(resultados):
+    for modo, rutas in resultados.items():
+        print(f"\n[{modo}]")
+        print(f"{'ruta':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errores':>9}")
+        for ruta, m in rutas.items():
+            print(f"{ruta:<18}{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}{m['rps']:>10}{m['errores']:>9}")
+
+
+if __name__ == "__main__":
+    try:
+        print(f"Poblando {args.viajes} viajes y {args.usuarios} usuarios...")
+        poblar()
+        resultados = {}
+        if args.modo in ("cliente", "ambos"):
+            resultados["cliente"] = medir_cliente()
+        if args.modo in ("gunicorn", "ambos", "servidores"):
+            resultados["gunicorn"] = medir_servidor("gunicorn")
+        if args.modo in ("uvicorn", "servidores"):
+            resultados["uvicorn"] = medir_servidor("uvicorn")
+        if args.modo == "carrito":
+            resultados["carrito"] = medir_carrito()
+        if args.modo == "escrituras":
+            resultados["escrituras"] = medir_escrituras()
+        if args.modo == "respaldo":
+            resultados["respaldo"] = medir_respaldo()
+    finally:
+        # Volcar la cola de escrituras (eventos del carrito) antes de borrar su spool
+        if "escrituras" in sys.modules:
+            sys.modules["escrituras"].cola.cerrar()
+        os.chdir(REPO)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "maquina": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": {"viajes": args.viajes, "usuarios": args.usuarios, "requests": args.requests,
+                       "workers": args.workers, "concurrencia": args.concurrencia},
+        "resultados": resultados,
+    }
+    imprimir(resultados)
+
+    # Leer la línea base antes de escribir nada (puede ser el mismo archivo)
+    base = None
+    if not args.guardar_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Línea base actualizada: {args.baseline}")
+        sys.exit(0)
+
+    if base is None:
+        print("Sin línea base para comparar (usa --guardar-baseline)")
+        sys.exit(0)
+    if base.get("parametros") != informe["parametros"]:
+        print("Aviso: la línea base se midió con otros parámetros")
+    regresiones = comparar(informe, base)
+    if regresiones:
+        print(f"\nREGRESIONES (tolerancia {args.tolerancia:.0%}):")
+        for linea in regresiones:
+            print(f"  {linea}")
+        sys.exit(1)
+    print("OK: sin regresiones respecto de la línea base")
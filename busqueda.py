@@ -0,0 +1,69 @@
+import re
+
+from markupsafe import Markup, escape
+
+# --------------------------------------------------
+# BÚSQUEDA DE TEXTO COMPLETO (SQLite FTS5)
+# --------------------------------------------------
+# `viajes_fts` es una tabla FTS5 de contenido externo sobre `viajes`,
+# mantenida por triggers (ver migraciones.py). El tokenizador quita los
+# acentos, así "vina" encuentra "Viña", y cada palabra buscada se trata
+# como prefijo ("pata" encuentra "Patagonia").
+
+POR_PAGINA = 20
+MAX_PAGINAS = 50
+MAX_PALABRAS = 8
+
+# Peso de cada columna en bm25: titulo, descripcion, itinerario, alojamiento, transporte
+PESOS = (10.0, 4.0, 2.0, 1.0, 1.0)
+
+# Marcadores neutros para resaltar; se reemplazan después de escapar el HTML
+_INICIO, _FIN = "\x02", "\x03"
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+def construir_consulta(texto):
+    # Solo palabras: la sintaxis FTS5 del usuario (comillas, NEAR, OR...) se descarta
+    palabras = _PALABRA.findall(texto or "")[:MAX_PALABRAS]
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+def _resaltar(fragmento):
+    if fragmento is None:
+        return ""
+    return Markup(
+        str(escape(fragmento)).replace(_INICIO, "<mark>").replace(_FIN, "</mark>")
+    )
+
+def buscar_viajes(db, texto, pagina=1, por_pagina=POR_PAGINA):
+    consulta = construir_consulta(texto)
+    if not consulta:
+        return [], False
+    pagina = min(max(pagina, 1), MAX_PAGINAS)
+
+    filas = db.execute(f"""
+        SELECT v.id, v.titulo, v.precio, v.precio_final, v.descuento, v.imagen, v.tipo,
+               highlight(viajes_fts, 0, ?, ?) AS titulo_resaltado,
+               snippet(viajes_fts, -1, ?, ?, '…', 16) AS fragmento
+        FROM viajes_fts
+        JOIN viajes_con_precio v ON v.id = viajes_fts.rowid
+        WHERE viajes_fts MATCH ?
+        ORDER BY bm25(viajes_fts, {", ".join(str(p) for p in PESOS)})
+        LIMIT ? OFFSET ?
+    """, (_INICIO, _FIN, _INICIO, _FIN, consulta,
+          por_pagina + 1, (pagina - 1) * por_pagina)).fetchall()
+
+    hay_mas = len(filas) > por_pagina
+    resultados = [
+        {
+            "id": fila["id"],
+            "titulo": fila["titulo"],
+            "precio": fila["precio"],
+            "precio_final": fila["precio_final"],
+            "descuento": fila["descuento"],
+            "imagen": fila["imagen"],
+            "tipo": fila["tipo"],
+            "titulo_resaltado": _resaltar(fila["titulo_resaltado"]),
+            "fragmento": _resaltar(fila["fragmento"]),
+        }
+        for fila in filas[:por_pagina]
+    ]
+    return resultados, hay_mas
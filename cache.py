@@ -0,0 +1,242 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, make_response, Response, current_app
+
+from database import get_db
+from modelos import cargar_viajes
+
+# --------------------------------------------------
+# CACHÉ DEL CATÁLOGO (viajes / promociones)
+# --------------------------------------------------
+# Cada tabla cacheada tiene una fila en `cache_version`. Las rutas admin
+# incrementan la versión dentro de la misma transacción que modifica la
+# tabla, así todos los workers de gunicorn detectan el cambio en su
+# siguiente request y descartan su copia local.
+
+def leer_version(db, nombre):
+    # Se consulta como máximo una vez por request
+    versiones = g.setdefault("cache_versiones", {})
+    if nombre not in versiones:
+        fila = db.execute(
+            "SELECT version FROM cache_version WHERE nombre = ?", (nombre,)
+        ).fetchone()
+        versiones[nombre] = fila["version"] if fila else 0
+    return versiones[nombre]
+
+def incrementar_version(db, nombre):
+    # Debe llamarse antes del commit de la escritura que invalida
+    db.execute(
+        "INSERT INTO cache_version (nombre, version) VALUES (?, 1) "
+        "ON CONFLICT(nombre) DO UPDATE SET version = version + 1",
+        (nombre,)
+    )
+    g.pop("cache_versiones", None)
+
+
+class CacheCatalogo:
+    def __init__(self, tabla, cargador=None):
+        self.tabla = tabla
+        self.cargador = cargador or (
+            lambda db: db.execute(f"SELECT * FROM {tabla} ORDER BY id").fetchall()
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._todos = []
+        self._por_tipo = {}
+        self._por_id = {}
+        self._por_titulo = {}
+        self._materializadas = {}
+
+    def _cargar(self, db):
+        version = leer_version(db, self.tabla)
+        if version == self._version:
+            self.hits += 1
+            return
+        with self._lock:
+            if version == self._version:
+                self.hits += 1
+                return
+            self.misses += 1
+            filas = self.cargador(db)
+            por_tipo = {}
+            for fila in filas:
+                por_tipo.setdefault(fila["tipo"], []).append(fila)
+            self._todos = filas
+            self._por_tipo = por_tipo
+            self._por_id = {fila["id"]: fila for fila in filas}
+            self._por_titulo = {fila["titulo"]: fila for fila in reversed(filas)}
+            self._materializadas = {}
+            self._version = version
+
+    def version(self, db):
+        return leer_version(db, self.tabla)
+
+    def todos(self, db):
+        self._cargar(db)
+        return self._todos
+
+    def por_tipo(self, db, tipo):
+        self._cargar(db)
+        return self._por_tipo.get(tipo, [])
+
+    def por_id(self, db, item_id):
+        self._cargar(db)
+        return self._por_id.get(item_id)
+
+    def por_titulo(self, db, titulo):
+        self._cargar(db)
+        return self._por_titulo.get(titulo)
+
+    def materializar(self, db, nombre, construir):
+        # Vista derivada del catálogo, construida una vez por versión
+        self._cargar(db)
+        vistas = self._materializadas
+        if nombre not in vistas:
+            vistas[nombre] = construir(self._todos)
+        return vistas[nombre]
+
+    def invalidar(self, db):
+        incrementar_version(db, self.tabla)
+        self._version = None
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "version": self._version,
+            "filas": len(self._todos),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+catalogo_viajes = CacheCatalogo("viajes", cargar_viajes)
+catalogo_promociones = CacheCatalogo("promociones")
+
+# --------------------------------------------------
+# CACHÉ DE PÁGINAS RENDERIZADAS (ETag / 304)
+# --------------------------------------------------
+PAGINAS_MAX = 512
+
+_huella_plantillas = None
+
+def huella_plantillas():
+    # Cambia en cada despliegue que modifique plantillas; igual en todos los workers.
+    # Se calcula en el primer request, no al importar.
+    global _huella_plantillas
+    if _huella_plantillas is not None:
+        return _huella_plantillas
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    h = hashlib.sha1()
+    for nombre in sorted(os.listdir(carpeta)):
+        st = os.stat(os.path.join(carpeta, nombre))
+        h.update(f"{nombre}:{st.st_size}:{st.st_mtime_ns}".encode())
+    _huella_plantillas = h.hexdigest()[:12]
+    return _huella_plantillas
+
+
+def variante_sesion():
+    # anónimo / usuario / admin; las cabeceras saludan por nombre, así que
+    # las variantes con sesión incluyen id y nombre tal como están en la base
+    from sesiones import usuario_actual  # sesiones importa este módulo
+    usuario = usuario_actual()
+    if not usuario:
+        return "anonimo"
+    rol = "admin" if usuario["role"] == "admin" else "usuario"
+    return f"{rol}:{usuario['id']}:{usuario['nombre']}"
+
+
+class CachePaginas:
+    def __init__(self, maximo=PAGINAS_MAX):
+        self.maximo = maximo
+        self.hits = 0
+        self.misses = 0
+        self.no_modificadas = 0
+        self._lock = threading.Lock()
+        self._versiones = None
+        self._entradas = OrderedDict()
+
+    def _sincronizar(self, versiones):
+        # Un cambio en viajes, promociones o derivados descarta todas las páginas
+        if versiones != self._versiones:
+            self._entradas.clear()
+            self._versiones = versiones
+
+    def obtener(self, clave, versiones):
+        with self._lock:
+            self._sincronizar(versiones)
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada
+
+    def guardar(self, clave, versiones, entrada):
+        with self._lock:
+            self._sincronizar(versiones)
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "no_modificadas": self.no_modificadas,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+paginas = CachePaginas()
+
+
+def pagina_cacheada(vista):
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        db = get_db()
+        versiones = (
+            catalogo_viajes.version(db),
+            catalogo_promociones.version(db),
+            leer_version(db, "imagenes"),
+        )
+        variante = variante_sesion()
+        clave = (request.path, tuple(sorted(request.args.items(multi=True))), variante)
+        etag = hashlib.sha1(
+            repr((huella_plantillas(), current_app.config.get("HUELLA_ESTATICOS"), versiones, clave)).encode()
+        ).hexdigest()
+        cache_control = "public, no-cache" if variante == "anonimo" else "private, no-cache"
+
+        # Si el cliente ya tiene esta versión no se renderiza nada
+        if request.if_none_match.contains(etag):
+            paginas.no_modificadas += 1
+            respuesta = Response(status=304)
+            respuesta.set_etag(etag)
+            respuesta.headers["Cache-Control"] = cache_control
+            return respuesta
+
+        entrada = paginas.obtener(clave, versiones)
+        if entrada is None:
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+            entrada = (respuesta.get_data(), respuesta.mimetype)
+            paginas.guardar(clave, versiones, entrada)
+
+        cuerpo, mimetype = entrada
+        respuesta = Response(cuerpo, mimetype=mimetype)
+        respuesta.set_etag(etag)
+        respuesta.headers["Cache-Control"] = cache_control
+        respuesta.vary.add("Cookie")
+        return respuesta
+    return envoltura
@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import base64
+import asyncio
+import atexit
+import shutil
+import tempfile
+
+# Verifica que los formularios del panel rechacen valores que romperían el
+# motor de precios (texto o fuera de rango en precio / descuento) sin
+# escribir nada, y que un cursor de paginación alterado muestre la primera
+# página (HTML) o responda 400 (API) en vez de un 500, que agregar al
+# carrito paquetes que ya están no se informe como éxito y que el puente
+# ASGI corte con 413 un cuerpo demasiado grande mientras llega (y pase
+# completo un formulario chunked), contra una base SQLite temporal. Falla (código 1) ante cualquier diferencia.
+#
+# Uso: python check_entradas.py
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_entradas_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+os.environ.setdefault("LOGIN_INTENTOS_IP", "1000000")
+sys.path.insert(0, REPO)
+
+import app as wonderchile  # noqa: E402
+import api  # noqa: E402
+from database import get_db  # noqa: E402
+from repositorios import Repositorios  # noqa: E402
+
+fallas = []
+
+def verificar(condicion, mensaje):
+    if not condicion:
+        fallas.append(mensaje)
+
+def preparar():
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        wonderchile.crear_admin_por_defecto()
+        db = get_db()
+        r = Repositorios(db)
+        viaje_id = r.viajes.crear({"titulo": "Torres", "descripcion": "D", "precio": 100000, "tipo": "paquete"})
+        r.viajes.crear({"titulo": "Atacama", "descripcion": "D", "precio": 200000, "tipo": "paquete"})
+        promocion_id = r.promociones.crear({"titulo": "Paquetes", "descripcion": "-10%", "descuento": 10,
+                                            "aplica_tipo": "paquete"})
+        db.commit()
+    return viaje_id, promocion_id
+
+def estado_base(viaje_id, promocion_id):
+    with wonderchile.app.app_context():
+        db = get_db()
+        return (
+            db.execute("SELECT COUNT(*) FROM promociones").fetchone()[0],
+            db.execute("SELECT COUNT(*) FROM viajes").fetchone()[0],
+            db.execute("SELECT descuento FROM promociones WHERE id = ?", (promocion_id,)).fetchone()[0],
+            db.execute("SELECT precio FROM viajes WHERE id = ?", (viaje_id,)).fetchone()[0],
+        )
+
+# --------------------------------------------------
+# ESCENARIOS
+# --------------------------------------------------
+def formularios_de_precios(cliente, viaje_id, promocion_id):
+    antes = estado_base(viaje_id, promocion_id)
+    promocion = {"titulo": "Mala", "descripcion": "x", "aplica_tipo": "paquete"}
+    viaje = {"titulo": "Malo", "descripcion": "x"}
+    casos = [
+        ("/admin/promociones/agregar", dict(promocion, descuento="abc"), "descuento no numérico"),
+        ("/admin/promociones/agregar", dict(promocion, descuento="150"), "descuento sobre 100"),
+        ("/admin/promociones/agregar", dict(promocion, descuento="-5"), "descuento negativo"),
+        (f"/admin/promociones/{promocion_id}/editar", dict(promocion, descuento="abc"), "editar con descuento no numérico"),
+        (f"/admin/promociones/{promocion_id}/editar", dict(promocion, descuento="150"), "editar con descuento sobre 100"),
+        ("/admin/viajes/agregar", dict(viaje, precio="mil"), "precio no numérico"),
+        ("/admin/viajes/agregar", dict(viaje, precio="-1"), "precio negativo"),
+        (f"/admin/viajes/{viaje_id}/editar", dict(viaje, precio="mil"), "editar con precio no numérico"),
+    ]
+    for url, datos, caso in casos:
+        respuesta = cliente.post(url, data=datos)
+        verificar(respuesta.status_code == 400, f"{caso}: {respuesta.status_code}")
+        verificar("color: red" in respuesta.get_data(as_text=True), f"{caso}: el formulario no muestra el error")
+    verificar(estado_base(viaje_id, promocion_id) == antes, "un formulario inválido modificó la base")
+
+    viajes = cliente.get("/api/viajes").get_json()["viajes"]
+    verificar(all(v["precio_final"] > 0 for v in viajes), f"precio final en 0: {viajes}")
+
+    # Los valores válidos se siguen aceptando
+    respuesta = cliente.post("/admin/promociones/agregar", data=dict(promocion, descuento="20"))
+    verificar(respuesta.status_code == 302, f"descuento válido: {respuesta.status_code}")
+
+def cursores_alterados(cliente):
+    def cursor(valores):
+        return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+    forjados = [
+        cursor([{"a": 1}]), cursor([[1]]), cursor([None]), cursor([True]), cursor([1, 2, 3]),
+        cursor({"id": 1}), cursor(["1"]), "no-es-base64!", cursor("texto"),
+    ]
+    for valor in forjados:
+        respuesta = cliente.get(f"/paquetes?cursor={valor}")
+        verificar(respuesta.status_code == 200, f"/paquetes con cursor {valor!r}: {respuesta.status_code}")
+        respuesta = cliente.get(f"/api/viajes?cursor={valor}")
+        verificar(respuesta.status_code == 400, f"/api/viajes con cursor {valor!r}: {respuesta.status_code}")
+    # Por precio el cursor es [precio, id]
+    for valores in ([1], [{"a": 1}, 1], [100, "x"], [None, 1]):
+        respuesta = cliente.get(f"/api/viajes?orden=precio&cursor={cursor(valores)}")
+        verificar(respuesta.status_code == 400, f"orden=precio con cursor {valores}: {respuesta.status_code}")
+
+    # Los cursores que genera la propia app siguen funcionando
+    primera = cliente.get("/api/viajes?orden=precio&limite=1").get_json()
+    respuesta = cliente.get(f"/api/viajes?orden=precio&limite=1&cursor={primera['siguiente']}")
+    verificar(respuesta.status_code == 200 and respuesta.get_json()["viajes"] != primera["viajes"],
+              "un cursor válido dejó de paginar")
+
+def carrito_repetido(cliente):
+    # Registrar los eventos en vez de encolarlos, para ver cuáles se emiten
+    eventos = []
+    api.evento_carrito = lambda usuario_id, viaje_id, accion: eventos.append(viaje_id)
+    ids = [v["id"] for v in cliente.get("/api/viajes").get_json()["viajes"]]
+    respuesta = cliente.post("/agregar_carrito", json={"viaje_id": ids[0]})
+    verificar(respuesta.status_code == 200 and eventos == [ids[0]], f"primer paquete: {eventos}")
+    eventos.clear()
+    # Lote parcial: solo los que no estaban cuentan y generan evento
+    respuesta = cliente.post("/agregar_carrito", json={"viaje_ids": ids})
+    datos = respuesta.get_json()
+    verificar(respuesta.status_code == 200 and datos["agregados"] == len(ids) - 1, f"lote parcial: {datos}")
+    verificar(sorted(eventos) == sorted(ids[1:]), f"eventos del lote parcial: {eventos}")
+    eventos.clear()
+    for cuerpo in ({"viaje_ids": ids}, {"viaje_id": ids[0]}):
+        respuesta = cliente.post("/agregar_carrito", json=cuerpo)
+        datos = respuesta.get_json()
+        verificar(respuesta.status_code == 400 and not datos["success"] and datos["agregados"] == 0
+                  and "ya" in datos["message"], f"{cuerpo} repetido: {respuesta.status_code} {datos}")
+    verificar(not eventos, f"eventos sin agregar nada: {eventos}")
+
+def puente_asgi():
+    import asgi
+    verificar(asgi.flask_asgi.limite == wonderchile.app.config["MAX_CONTENT_LENGTH"],
+              "el puente ASGI no usa MAX_CONTENT_LENGTH")
+    puente = asgi.PuenteWSGI(wonderchile.app, hilos=1, limite=1024)
+
+    async def enviar(cabeceras, bloques):
+        scope = {"type": "http", "method": "POST", "path": "/contacto", "query_string": b"",
+                 "http_version": "1.1", "headers": cabeceras, "client": ("10.0.0.1", 1),
+                 "server": ("localhost", 80), "scheme": "http"}
+        pendientes, respuesta = list(bloques), []
+
+        async def receive():
+            if not pendientes:
+                return {"type": "http.disconnect"}
+            return {"type": "http.request", "body": pendientes.pop(0), "more_body": len(pendientes) > 0}
+
+        async def send(mensaje):
+            respuesta.append(mensaje)
+
+        await puente(scope, receive, send)
+        return respuesta[0]["status"], len(pendientes)
+
+    formulario = [(b"content-type", b"application/x-www-form-urlencoded")]
+    estado, sin_leer = asyncio.run(enviar(formulario + [(b"content-length", b"4096")], [b"x" * 512] * 8))
+    verificar(estado == 413 and sin_leer == 8, f"Content-Length sobre el límite: {estado}, {sin_leer} sin leer")
+    estado, sin_leer = asyncio.run(enviar(formulario + [(b"transfer-encoding", b"chunked")], [b"x" * 512] * 8))
+    verificar(estado == 413 and sin_leer > 0, f"chunked sobre el límite: {estado}, {sin_leer} sin leer")
+    datos = b"nombre=Chunked&email=chunked%40example.com&personas=2"
+    estado, _ = asyncio.run(enviar(formulario + [(b"transfer-encoding", b"chunked")], [datos[:12], datos[12:]]))
+    verificar(estado == 200, f"formulario chunked: {estado} (¿llegó vacío a Flask?)")
+
+if __name__ == "__main__":
+    viaje_id, promocion_id = preparar()
+    cliente = wonderchile.app.test_client()
+    cliente.post("/login", data={"email": "admin@wonderchile.cl", "password": "Admin123"})
+    formularios_de_precios(cliente, viaje_id, promocion_id)
+    cursores_alterados(cliente)
+    carrito_repetido(cliente)
+    puente_asgi()
+
+    if fallas:
+        print("\n".join(fallas))
+        sys.exit(1)
+    print("OK: entradas inválidas rechazadas")
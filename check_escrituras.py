@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import sqlite3
+import tempfile
+
+# Verifica la cola de escrituras diferidas (escrituras.py) contra una base
+# SQLite temporal: una entrada que SQLite rechaza no frena a las demás
+# (termina en descartadas.jsonl), un spool huérfano con una entrada mala
+# se recupera igual, la base ocupada se reintenta sin descartar nada y el
+# formulario de contacto rechaza valores fuera de rango antes de encolar,
+# con un límite por IP propio (no el del login).
+# Falla (código 1) ante cualquier diferencia.
+#
+# Uso: python check_escrituras.py
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_escrituras_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+# Que un lock ajeno se note enseguida y no tras 5 s de espera
+os.environ["DB_BUSY_TIMEOUT_MS"] = "100"
+sys.path.insert(0, REPO)
+
+import app as wonderchile  # noqa: E402
+from escrituras import ColaEscrituras, DESCARTADAS, nueva_entrada  # noqa: E402
+
+fallas = []
+
+def verificar(condicion, mensaje):
+    if not condicion:
+        fallas.append(mensaje)
+
+def contar(tabla, condicion="1"):
+    conn = sqlite3.connect(os.environ["DATABASE"])
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {condicion}").fetchone()[0]
+    finally:
+        conn.close()
+
+def esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.05)
+    return False
+
+def descartadas(carpeta):
+    ruta = os.path.join(carpeta, DESCARTADAS)
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+# --------------------------------------------------
+# ESCENARIOS
+# --------------------------------------------------
+def entrada_mala_no_bloquea():
+    carpeta = os.path.join(directorio, "spool-mala")
+    cola = ColaEscrituras(directorio=carpeta, intervalo_ms=50)
+    # Entero fuera del rango de SQLite: OverflowError al insertar
+    cola.encolar("contacto", {"nombre": "Mala", "email": "mala@example.com", "personas": 10 ** 20})
+    cola.encolar("contacto", {"nombre": "Buena", "email": "buena@example.com"})
+    cola.encolar("carrito", {"usuario_id": 1, "viaje_id": 1, "accion": "agregar"})
+    cola.encolar("auditoria", {"usuario_id": 1, "accion": "editar", "objeto": "viaje:1"})
+    verificar(esperar(lambda: contar("contactos", "email = 'buena@example.com'") == 1),
+              "una entrada mala frena el contacto siguiente")
+    verificar(contar("eventos_carrito") == 1 and contar("auditoria") == 1,
+              "una entrada mala frena el carrito o la auditoría")
+    cola.encolar("contacto", {"nombre": "Después", "email": "despues@example.com"})
+    verificar(esperar(lambda: contar("contactos", "email = 'despues@example.com'") == 1),
+              "la cola no sigue drenando después de una entrada mala")
+    cola.cerrar()
+
+    rechazadas = descartadas(carpeta)
+    verificar(len(rechazadas) == 1 and rechazadas[0]["entrada"]["datos"]["nombre"] == "Mala",
+              f"descartadas: {rechazadas}")
+    estadisticas = cola.estadisticas()
+    verificar(estadisticas["descartadas"] == 1 and estadisticas["atrasadas"] == 0, f"estadísticas {estadisticas}")
+    verificar(not [n for n in os.listdir(carpeta) if n.endswith(".lote")], "quedaron segmentos sin borrar")
+
+def huerfano_con_entrada_mala():
+    # Lo que deja un worker caído: la entrada mala no debe bloquear la recuperación
+    carpeta = os.path.join(directorio, "spool-huerfano")
+    os.makedirs(carpeta)
+    with open(os.path.join(carpeta, "escrituras-999999.spool"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(nueva_entrada("contacto", {"nombre": "X", "email": "x@example.com",
+                                                      "personas": 10 ** 20})) + "\n")
+        f.write(json.dumps(nueva_entrada("contacto", {"nombre": "Y", "email": "huerfano@example.com"})) + "\n")
+    cola = ColaEscrituras(directorio=carpeta, intervalo_ms=50)
+    cola.encolar("auditoria", {"usuario_id": 1, "accion": "probar", "objeto": "huerfano"})
+    verificar(esperar(lambda: contar("contactos", "email = 'huerfano@example.com'") == 1),
+              "el spool huérfano con una entrada mala no se recupera")
+    verificar(esperar(lambda: contar("auditoria", "objeto = 'huerfano'") == 1), "la cola quedó frenada tras recuperar")
+    cola.cerrar()
+    verificar(len(descartadas(carpeta)) == 1, "la entrada mala del huérfano no se descartó")
+
+def base_ocupada_se_reintenta():
+    carpeta = os.path.join(directorio, "spool-ocupada")
+    cola = ColaEscrituras(directorio=carpeta, intervalo_ms=50)
+    bloqueo = sqlite3.connect(os.environ["DATABASE"], isolation_level=None)
+    bloqueo.execute("BEGIN IMMEDIATE")
+    cola.encolar("contacto", {"nombre": "Ocupada", "email": "ocupada@example.com"})
+    time.sleep(0.5)
+    verificar(cola.estadisticas()["errores"] > 0, "el lock ajeno no se notó")
+    bloqueo.execute("COMMIT")
+    bloqueo.close()
+    verificar(esperar(lambda: contar("contactos", "email = 'ocupada@example.com'") == 1, segundos=10),
+              "la entrada no llegó después de liberar la base")
+    cola.cerrar()
+    verificar(not descartadas(carpeta), "con la base ocupada no se debe descartar nada")
+
+def formulario_valida_personas():
+    cliente = wonderchile.app.test_client()
+    for personas in ("99999999999999999999", "-3", "abc"):
+        respuesta = cliente.post("/contacto", data={"nombre": "A", "email": "a@example.com", "personas": personas})
+        verificar(respuesta.status_code == 400, f"personas={personas} devolvió {respuesta.status_code}")
+    respuesta = cliente.post("/contacto", data={"nombre": "A", "email": "a@example.com", "personas": "4"})
+    verificar(respuesta.status_code == 200, f"contacto válido devolvió {respuesta.status_code}")
+
+def contacto_con_cubeta_propia():
+    # El contacto y el login no comparten límite por IP
+    from seguridad import envios_contacto, intentos_por_ip
+    cliente = wonderchile.app.test_client()
+    datos = {"nombre": "A", "email": "a@example.com"}
+    ip = {"REMOTE_ADDR": "10.1.1.1"}
+    estados = [cliente.post("/contacto", data=datos, environ_base=ip).status_code
+               for _ in range(envios_contacto.capacidad + 1)]
+    verificar(estados[-1] == 429 and set(estados[:-1]) == {200}, f"límite del contacto: {estados}")
+    respuesta = cliente.post("/login", data={"email": "x@example.com", "password": "x"}, environ_base=ip)
+    verificar(respuesta.status_code != 429, "el contacto gastó los intentos de login")
+
+    ip = {"REMOTE_ADDR": "10.1.1.2"}
+    for _ in range(intentos_por_ip.capacidad + 1):
+        cliente.post("/login", data={"email": "x@example.com", "password": "x"}, environ_base=ip)
+    respuesta = cliente.post("/contacto", data=datos, environ_base=ip)
+    verificar(respuesta.status_code == 200, f"los logins fallidos bloquean el contacto: {respuesta.status_code}")
+
+if __name__ == "__main__":
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+    entrada_mala_no_bloquea()
+    huerfano_con_entrada_mala()
+    base_ocupada_se_reintenta()
+    formulario_valida_personas()
+    contacto_con_cubeta_propia()
+
+    if fallas:
+        print("\n".join(fallas))
+        sys.exit(1)
+    print("OK: la cola de escrituras drena aunque haya entradas inválidas")
@@ -0,0 +1,146 @@
+import io
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+# Verifica la importación masiva (importacion.py) contra una base SQLite
+# temporal: reimportar una fila parcial de un viaje existente no borra su
+# galería, su itinerario ni las referencias de sus imágenes, y un archivo
+# que no está en UTF-8 o un CSV mal formado se informa en el resumen (panel
+# y CLI) en vez de terminar en un 500 o un traceback.
+# Falla (código 1) ante cualquier diferencia.
+#
+# Uso: python check_importacion.py
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_importacion_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+os.environ.setdefault("LOGIN_INTENTOS_IP", "1000000")
+sys.path.insert(0, REPO)
+
+import app as wonderchile  # noqa: E402
+from database import get_db  # noqa: E402
+from importacion import importar  # noqa: E402
+
+fallas = []
+
+IMAGENES = ("/static/uploads/portada.jpg", "/static/uploads/g1.jpg", "/static/uploads/g2.jpg")
+COMPLETA = (
+    "id,titulo,descripcion,precio,imagen,itinerario,galeria\n"
+    f'1,Torres,Trekking,200000,{IMAGENES[0]},"Día 1: Llegada\nDía 2: Base Torres","{IMAGENES[1]},{IMAGENES[2]}"\n'
+)
+
+def verificar(condicion, mensaje):
+    if not condicion:
+        fallas.append(mensaje)
+
+def importar_texto(tabla, datos, formato="csv"):
+    with wonderchile.app.app_context():
+        return importar(get_db(), tabla, io.BytesIO(datos), formato)
+
+def estado_viaje(viaje_id):
+    with wonderchile.app.app_context():
+        db = get_db()
+        return {
+            "galeria": db.execute("SELECT COUNT(*) FROM viaje_imagenes WHERE viaje_id = ?", (viaje_id,)).fetchone()[0],
+            "itinerario": db.execute("SELECT COUNT(*) FROM viaje_itinerario WHERE viaje_id = ?",
+                                     (viaje_id,)).fetchone()[0],
+            "referencias": dict(db.execute("SELECT url, referencias FROM imagenes").fetchall()),
+            "precio": db.execute("SELECT precio FROM viajes WHERE id = ?", (viaje_id,)).fetchone()[0],
+        }
+
+def contar_viajes():
+    with wonderchile.app.app_context():
+        return get_db().execute("SELECT COUNT(*) FROM viajes").fetchone()[0]
+
+def preparar():
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        wonderchile.crear_admin_por_defecto()
+        db = get_db()
+        db.executemany(
+            "INSERT INTO imagenes (url, hash, ruta, referencias, subido) VALUES (?, ?, ?, 0, datetime('now'))",
+            [(url, f"h{n}", url.lstrip("/")) for n, url in enumerate(IMAGENES)]
+        )
+        db.commit()
+
+# --------------------------------------------------
+# ESCENARIOS
+# --------------------------------------------------
+def fila_parcial_conserva_detalle():
+    resumen = importar_texto("viajes", COMPLETA.encode())
+    verificar(resumen["guardadas"] == 1, f"importación completa: {resumen}")
+    antes = estado_viaje(1)
+    verificar(antes["galeria"] == 2 and antes["itinerario"] == 2, f"estado inicial: {antes}")
+    verificar(all(n == 1 for n in antes["referencias"].values()), f"referencias iniciales: {antes}")
+
+    # Sin columnas de galería / itinerario / imagen, y con las celdas vacías
+    for datos in ("id,titulo,descripcion,precio\n1,Torres,Trekking,250000\n",
+                  "id,titulo,descripcion,precio,imagen,itinerario,galeria\n1,Torres,Trekking,250000,,,\n"):
+        resumen = importar_texto("viajes", datos.encode())
+        verificar(resumen["guardadas"] == 1, f"fila parcial: {resumen}")
+        despues = estado_viaje(1)
+        verificar(despues["precio"] == 250000, f"la fila parcial no actualizó el precio: {despues}")
+        verificar(dict(despues, precio=None) == dict(antes, precio=None),
+                  f"la fila parcial cambió el detalle: {antes} -> {despues}")
+
+    # Una galería nueva sí reemplaza la anterior y mueve las referencias
+    resumen = importar_texto("viajes", f"id,titulo,descripcion,precio,galeria\n1,Torres,T,1,{IMAGENES[1]}\n".encode())
+    despues = estado_viaje(1)
+    verificar(despues["galeria"] == 1 and despues["itinerario"] == 2, f"galería nueva: {despues}")
+    verificar(despues["referencias"] == {IMAGENES[0]: 1, IMAGENES[1]: 1, IMAGENES[2]: 0},
+              f"referencias tras la galería nueva: {despues['referencias']}")
+
+def archivos_ilegibles(cliente):
+    base = contar_viajes()
+    latin1 = "titulo,descripcion,precio\nValdivia,Río y selva,1000\nPucón,Volcán,2000\n".encode("latin-1")
+    resumen = importar_texto("viajes", latin1)
+    verificar(resumen["detenida"] and resumen["detenida"]["linea"] == 2, f"latin-1: {resumen}")
+    verificar(contar_viajes() == base, "el archivo latin-1 guardó filas")
+
+    # Las filas anteriores al error quedan guardadas y el resumen lo dice
+    mixto = "titulo,descripcion,precio\nArica,Playa,1000\n".encode() + "Pucón,Volcán,2000\n".encode("latin-1")
+    resumen = importar_texto("viajes", mixto)
+    verificar(resumen["guardadas"] == 1 and resumen["detenida"]["linea"] == 3, f"mixto: {resumen}")
+    verificar(contar_viajes() == base + 1, "las filas previas al error no quedaron guardadas")
+
+    malformado = b'titulo,descripcion,precio\n"Sin cerrar,x,1\n'
+    resumen = importar_texto("viajes", malformado)
+    verificar(resumen["detenida"] is not None, f"CSV mal formado: {resumen}")
+
+    jsonl = '{"titulo": "A", "descripcion": "B", "precio": 1}\n'.encode() + '{"titulo": "Ñ"}\n'.encode("latin-1")
+    resumen = importar_texto("viajes", jsonl, "jsonl")
+    verificar(resumen["guardadas"] == 1 and resumen["detenida"]["linea"] == 2, f"JSON Lines latin-1: {resumen}")
+
+    respuesta = cliente.post("/admin/importar", data={
+        "tabla": "viajes", "archivo": (io.BytesIO(latin1), "excel.csv"),
+    }, content_type="multipart/form-data")
+    cuerpo = respuesta.get_data(as_text=True)
+    verificar(respuesta.status_code == 200 and "UTF-8" in cuerpo and "color: red" in cuerpo,
+              f"/admin/importar con latin-1: {respuesta.status_code}")
+
+    ruta = os.path.join(directorio, "excel.csv")
+    with open(ruta, "wb") as f:
+        f.write(latin1)
+    resultado = wonderchile.app.test_cli_runner().invoke(args=["importar", "viajes", ruta])
+    # ClickException: mensaje y código 1, sin traceback
+    verificar(resultado.exit_code == 1 and isinstance(resultado.exception, SystemExit),
+              f"CLI con latin-1: {resultado.exit_code} {resultado.exception!r}")
+    verificar("UTF-8" in resultado.output, f"la CLI no informa el error: {resultado.output}")
+
+if __name__ == "__main__":
+    preparar()
+    cliente = wonderchile.app.test_client()
+    cliente.post("/login", data={"email": "admin@wonderchile.cl", "password": "Admin123"})
+    fila_parcial_conserva_detalle()
+    archivos_ilegibles(cliente)
+
+    if fallas:
+        print("\n".join(fallas))
+        sys.exit(1)
+    print("OK: importación parcial e ilegible verificada")
@@ -0,0 +1,123 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+# Verifica el pre-render incremental (prerender.py) contra una base SQLite
+# temporal: crear, editar o eliminar una promoción re-renderiza "/",
+# "/paquetes" y el detalle de los viajes que alcanza (antes y después del
+# cambio), sin rehacer el build completo.
+# Falla (código 1) ante cualquier diferencia.
+#
+# Uso: python check_prerender.py
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_prerender_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+os.environ["PRERENDER_DIR"] = os.path.join(directorio, "prerender")
+os.environ.setdefault("LOGIN_INTENTOS_IP", "1000000")
+sys.path.insert(0, REPO)
+
+import app as wonderchile  # noqa: E402
+import prerender  # noqa: E402
+from database import get_db  # noqa: E402
+from repositorios import Repositorios  # noqa: E402
+
+fallas = []
+renderizadas = []
+builds = []
+
+def verificar(condicion, mensaje):
+    if not condicion:
+        fallas.append(mensaje)
+
+def registrar():
+    # Anota qué se re-renderiza sin dejar de hacerlo
+    actualizar, construir = prerender.actualizar, prerender.construir
+
+    def actualizar_registrado(app, salida, viaje_ids):
+        renderizadas.append(sorted(viaje_ids))
+        return actualizar(app, salida, viaje_ids)
+
+    def construir_registrado(app, salida):
+        builds.append(salida)
+        return construir(app, salida)
+
+    prerender.actualizar = actualizar_registrado
+    prerender.construir = construir_registrado
+
+def esperar_encargos():
+    # Un solo hilo: cuando corre este, ya terminaron los anteriores
+    prerender.encargos.encargar(lambda: None).result(timeout=30)
+
+def preparar():
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        wonderchile.crear_admin_por_defecto()
+        db = get_db()
+        r = Repositorios(db)
+        ids = {
+            nombre: r.viajes.crear({"titulo": nombre, "descripcion": "-", "precio": 100000, "tipo": tipo})
+            for nombre, tipo in (("Torres", "paquete"), ("Atacama", "paquete"), ("Valdivia", "gira"),
+                                 ("Chiloé", "mujeres"))
+        }
+        db.commit()
+    prerender.construir(wonderchile.app, wonderchile.app.config["PRERENDER_DIR"])
+    return ids
+
+def detalle(viaje_id):
+    ruta = os.path.join(wonderchile.app.config["PRERENDER_DIR"], "actual", prerender.archivo_de(f"/paquete/{viaje_id}"))
+    with open(ruta, encoding="utf-8") as f:
+        return f.read()
+
+def promocion(**campos):
+    datos = {"titulo": "Promo", "descripcion": "-", "descuento": "20", "imagen_opcion": "url", "imagen": ""}
+    datos.update(campos)
+    return datos
+
+# --------------------------------------------------
+# ESCENARIOS
+# --------------------------------------------------
+def promociones_rehacen_solo_lo_afectado(cliente, ids):
+    respuesta = cliente.post("/admin/promociones/agregar", data=promocion(aplica_tipo="gira"))
+    verificar(respuesta.status_code == 302, f"agregar promoción devolvió {respuesta.status_code}")
+    esperar_encargos()
+    verificar(renderizadas[-1:] == [[ids["Valdivia"]]], f"promoción por tipo: {renderizadas}")
+    verificar('class="descuento"' in detalle(ids["Valdivia"]), "el detalle de la gira no muestra el descuento")
+    verificar('class="descuento"' not in detalle(ids["Torres"]), "el descuento llegó a un viaje de otro tipo")
+
+    with wonderchile.app.app_context():
+        promocion_id = get_db().execute("SELECT MAX(id) FROM promociones").fetchone()[0]
+
+    # Editar: los viajes que deja (la gira) y el que toma
+    respuesta = cliente.post(f"/admin/promociones/{promocion_id}/editar",
+                             data=promocion(aplica_tipo="", viaje_id=str(ids["Torres"])))
+    verificar(respuesta.status_code == 302, f"editar promoción devolvió {respuesta.status_code}")
+    esperar_encargos()
+    verificar(renderizadas[-1:] == [sorted([ids["Valdivia"], ids["Torres"]])], f"editar promoción: {renderizadas}")
+    verificar('class="descuento"' not in detalle(ids["Valdivia"]), "la gira conserva el descuento retirado")
+    verificar('class="descuento"' in detalle(ids["Torres"]), "el detalle del viaje nuevo no muestra el descuento")
+
+    respuesta = cliente.post(f"/admin/promociones/{promocion_id}/delete")
+    verificar(respuesta.status_code == 302, f"eliminar promoción devolvió {respuesta.status_code}")
+    esperar_encargos()
+    verificar(renderizadas[-1:] == [[ids["Torres"]]], f"eliminar promoción: {renderizadas}")
+    verificar('class="descuento"' not in detalle(ids["Torres"]), "el detalle conserva la promoción eliminada")
+
+    verificar(not builds, f"una promoción rehízo el build completo: {builds}")
+
+if __name__ == "__main__":
+    ids = preparar()
+    registrar()
+    cliente = wonderchile.app.test_client()
+    cliente.post("/login", data={"email": "admin@wonderchile.cl", "password": "Admin123"})
+    promociones_rehacen_solo_lo_afectado(cliente, ids)
+
+    if fallas:
+        print("\n".join(fallas))
+        sys.exit(1)
+    print("OK: las promociones re-renderizan solo las páginas afectadas")
@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import atexit
+import random
+import shutil
+import sqlite3
+import tempfile
+
+# Verifica con EXPLAIN QUERY PLAN que ninguna consulta filtrada de la app
+# recorra una tabla completa. Crea una base temporal grande, ejecuta las
+# rutas con el cliente de pruebas de Flask, captura cada SQL emitido y
+# falla (código 1) si alguno hace SCAN sin índice.
+#
+# Uso: python check_query_plans.py [cantidad_de_viajes]
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+CANTIDAD_VIAJES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+CANTIDAD_USUARIOS = 2000
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_plans_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+sys.path.insert(0, REPO)
+
+import database  # noqa: E402
+import app as wonderchile  # noqa: E402
+
+# Capturar todo el SQL que pasa por el pool de conexiones
+capturadas = []
+conectar_original = database.pool._conectar
+
+def conectar_con_traza():
+    conn = conectar_original()
+    conn.set_trace_callback(capturadas.append)
+    return conn
+
+database.pool.cerrar_todas()
+database.pool._conectar = conectar_con_traza
+
+# --------------------------------------------------
+# DATOS DE PRUEBA (misma forma que populate_db.py)
+# --------------------------------------------------
+def poblar():
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        wonderchile.crear_admin_por_defecto()
+    # Las migraciones recorren tablas a propósito; solo interesan las rutas
+    capturadas.clear()
+    conn = sqlite3.connect(os.environ["DATABASE"])
+    random.seed(1)
+    tipos = ["paquete", "gira", "mujeres"]
+    conn.executemany(
+        "INSERT INTO usuarios (nombre, email, password, role) VALUES (?, ?, ?, 'user')",
+        [(f"Usuario {i}", f"usuario{i}@example.com", "x") for i in range(CANTIDAD_USUARIOS)]
+    )
+    conn.executemany(
+        "INSERT INTO viajes (titulo, descripcion, precio, imagen, itinerario, tipo) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Viaje {i}", f"Descripción del viaje {i}", random.randint(30000, 300000),
+          f"/static/uploads/viaje_{i}.jpg", "Día 1: Llegada\nDía 2: Tour", random.choice(tipos))
+         for i in range(CANTIDAD_VIAJES)]
+    )
+    conn.executemany(
+        "INSERT INTO viaje_imagenes (viaje_id, url, orden) VALUES (?, ?, ?)",
+        [(v, f"/static/uploads/galeria_{v}_{n}.jpg", n)
+         for v in range(1, CANTIDAD_VIAJES + 1) for n in range(2)]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO carrito (usuario_id, viaje_id) VALUES (?, ?)",
+        [(random.randint(1, CANTIDAD_USUARIOS), random.randint(1, CANTIDAD_VIAJES))
+         for _ in range(CANTIDAD_USUARIOS * 5)]
+    )
+    conn.execute("UPDATE cache_version SET version = version + 1")
+    conn.commit()
+    conn.close()
+
+def recorrer_rutas():
+    cliente = wonderchile.app.test_client()
+    for url in ["/", "/paquetes", "/giras", "/mujeres", "/contacto", "/paquete/1", "/paquete/2"]:
+        cliente.get(url)
+    # Paginación: primera y segunda página con cada combinación de filtros y orden
+    for consulta in ["", "?tipo=gira", "?orden=precio", "?orden=precio&dir=desc&tipo=mujeres",
+                     "?precio_min=50000&precio_max=90000&orden=precio", "?tipo=paquete&dir=desc"]:
+        respuesta = cliente.get(f"/api/viajes{consulta}").get_json()
+        separador = "&" if consulta else "?"
+        cliente.get(f"/api/viajes{consulta}{separador}cursor={respuesta['siguiente']}")
+        cliente.get(f"/paquetes{consulta}")
+    for texto in ["viaje", "descripcion 12", "llegada tour"]:
+        cliente.get("/buscar", query_string={"q": texto})
+        cliente.get("/api/buscar", query_string={"q": texto, "pagina": 2})
+    cliente.post("/login", data={
+        "email": os.environ.get("ADMIN_EMAIL", "admin@wonderchile.cl"),
+        "password": os.environ.get("ADMIN_PASSWORD", "Admin123"),
+    })
+    cliente.post("/agregar_carrito", json={"viaje_id": 5})
+    cliente.post("/agregar_carrito", json={"viaje_ids": [6, 7, 8]})
+    cliente.post("/agregar_carrito", json={"paquete": "Viaje 9"})
+    cliente.get("/carrito")
+    cliente.post("/eliminar_carrito/1")
+    for url in ["/admin", "/admin/viajes", "/admin/giras", "/admin/mujeres",
+                "/admin/promociones", "/admin/viajes/3/editar"]:
+        cliente.get(url)
+    cliente.post("/admin/viajes/3/editar", data={
+        "titulo": "Viaje 3", "descripcion": "Editado", "precio": "1000",
+        "itinerario": "Día 1: Llegada", "galeria": "/static/uploads/a.jpg",
+    })
+    cliente.post("/admin/viajes/4/delete")
+    cliente.post("/admin/promociones/agregar", data={
+        "titulo": "Promo", "descripcion": "d", "descuento": "10", "imagen": "",
+    })
+    cliente.post("/admin/promociones/agregar", data={
+        "titulo": "Promo giras", "descripcion": "d", "descuento": "15", "imagen": "",
+        "aplica_tipo": "gira", "desde": "2000-01-01", "hasta": "2999-12-31",
+    })
+    cliente.post("/admin/promociones/agregar", data={
+        "titulo": "Promo viaje", "descripcion": "d", "descuento": "20", "imagen": "",
+        "viaje_id": "7", "desde": "2999-01-01",
+    })
+    cliente.get("/carrito")
+    cliente.post("/admin/promociones/1/delete")
+    cliente.get("/logout")
+
+# --------------------------------------------------
+# ANÁLISIS DE PLANES
+# --------------------------------------------------
+IGNORADAS = re.compile(r"^\s*(--|PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)", re.I)
+# Las tablas virtuales (FTS5) resuelven el MATCH con su propio índice
+SCAN_SIN_INDICE = re.compile(r"^SCAN (\S+)(?!.*(USING (COVERING )?INDEX|VIRTUAL TABLE INDEX))")
+
+# Tablas de pocas filas (decenas): recorrerlas cuesta menos que un índice
+TABLAS_PEQUENAS = {"promociones"}
+CTE = re.compile(r"(?:WITH|,)\s+(\w+) AS \(", re.I)
+
+def analizar():
+    conn = sqlite3.connect(os.environ["DATABASE"])
+    fallas = []
+    vistas = set()
+    for sql in capturadas:
+        sql = " ".join(sql.split())
+        if sql in vistas or IGNORADAS.match(sql):
+            continue
+        vistas.add(sql)
+        # Las lecturas completas a propósito (carga de la caché) no llevan WHERE
+        if " WHERE " not in sql.upper():
+            continue
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        # Recorrer un CTE o una subconsulta (p. ej. la de una ventana OVER) es
+        # recorrer un resultado intermedio; sus tablas aparecen en otras filas
+        permitidas = TABLAS_PEQUENAS | set(CTE.findall(sql))
+        scans = []
+        for fila in plan:
+            scan = SCAN_SIN_INDICE.match(fila[3])
+            if scan and scan.group(1) not in permitidas and not scan.group(1).startswith("("):
+                scans.append(fila[3])
+        if scans:
+            fallas.append((sql, scans))
+    conn.close()
+    return vistas, fallas
+
+
+if __name__ == "__main__":
+    poblar()
+    recorrer_rutas()
+    vistas, fallas = analizar()
+    print(f"{len(vistas)} consultas distintas analizadas sobre {CANTIDAD_VIAJES} viajes")
+    for sql, scans in fallas:
+        print(f"\nSCAN sin índice: {', '.join(scans)}\n  {sql[:300]}")
+    if fallas:
+        print(f"\n{len(fallas)} consultas recorren tablas completas")
+        sys.exit(1)
+    print("OK: todas las consultas filtradas usan índices")
@@ -0,0 +1,127 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+# Verifica los repositorios de repositorios.py: corre un escenario
+# (usuarios, viajes, promociones con ventanas, carrito) contra una base
+# SQLite temporal. Falla (código 1) ante cualquier diferencia.
+#
+# Uso: python check_repositorios.py
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+directorio = tempfile.mkdtemp(prefix="wonderchile_repos_")
+atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+os.chdir(directorio)
+os.environ["DATABASE"] = os.path.join(directorio, "wonderchile.db")
+sys.path.insert(0, REPO)
+
+import app as wonderchile  # noqa: E402
+from database import get_db  # noqa: E402
+from repositorios import Repositorios, EmailDuplicado  # noqa: E402
+from paginacion import paginar, decodificar_cursor  # noqa: E402
+
+fallas = []
+
+def verificar(condicion, mensaje):
+    if not condicion:
+        fallas.append(mensaje)
+
+# --------------------------------------------------
+# ESCENARIO
+# --------------------------------------------------
+def escenario(db):
+    r = Repositorios(db)
+    manana = (date.today() + timedelta(days=1)).isoformat()
+
+    # Usuarios
+    ana = r.usuarios.crear("Ana", "ana@example.com", "hash-1")
+    beto = r.usuarios.crear("Beto", "beto@example.com", "hash-2")
+    try:
+        r.usuarios.crear("Otra Ana", "ana@example.com", "hash-3")
+        verificar(False, "un email repetido debe lanzar EmailDuplicado")
+    except EmailDuplicado:
+        pass
+    # La conexión sigue usable después del error
+    verificar(r.usuarios.por_email("ana@example.com")["id"] == ana, "por_email tras duplicado")
+    r.usuarios.cambiar_password(ana, "hash-nuevo")
+    verificar(r.usuarios.por_email("ana@example.com")["password"] == "hash-nuevo", "cambiar_password")
+    verificar(dict(r.usuarios.por_id(beto)) == {"id": beto, "nombre": "Beto", "role": "user"}, "por_id")
+    verificar(r.usuarios.por_id(999999) is None, "por_id inexistente")
+
+    # Viajes
+    base = {"descripcion": "Desc", "alojamiento": "Hotel", "destacado": 0}
+    v1 = r.viajes.crear(dict(base, titulo="Torres", precio=100000, tipo="paquete",
+                             itinerario="Día 1: Llegada\nDía 2: Trekking"), ["/a.jpg", "/b.jpg"])
+    v2 = r.viajes.crear(dict(base, titulo="Atacama", precio=200000, tipo="paquete"), [])
+    v3 = r.viajes.crear(dict(base, titulo="Gira", precio=50000, tipo="gira"), [])
+    viaje = r.viajes.obtener(v1)
+    verificar([foto.url for foto in viaje.galeria] == ["/a.jpg", "/b.jpg"], "galería")
+    verificar([dia.dia for dia in viaje.itinerario] == ["Día 1", "Día 2"], "itinerario")
+    verificar(viaje["precio_final"] == 100000 and viaje["descuento"] == 0, "precio sin promociones")
+
+    # Promociones: por tipo vigente, por viaje que empieza mañana
+    por_tipo = r.promociones.crear({"titulo": "Paquetes", "descripcion": "-20%", "descuento": 20,
+                                    "aplica_tipo": "paquete"})
+    r.promociones.crear({"titulo": "Atacama", "descripcion": "-50%", "descuento": 50,
+                         "viaje_id": v2, "desde": manana})
+    verificar(r.viajes.obtener(v1)["precio_final"] == 80000, "promoción por tipo")
+    verificar(r.viajes.obtener(v2)["precio_final"] == 160000, "la promoción futura aún no aplica")
+    verificar(r.viajes.obtener(v3)["precio_final"] == 50000, "otro tipo sin descuento")
+    vigente_hasta = db.execute("SELECT vigente_hasta FROM precios_vigentes WHERE viaje_id = ?", (v2,)).fetchone()[0]
+    verificar(vigente_hasta == manana, f"vigente_hasta {vigente_hasta!r}")
+    r.promociones.actualizar(por_tipo, {"descuento": 30})
+    verificar(r.viajes.obtener(v1)["precio_final"] == 70000, "actualizar promoción")
+    verificar(r.promociones.obtener(por_tipo)["descuento"] == 30, "obtener promoción")
+
+    # Paginación: orden y filtros sobre el precio final, no el base
+    v4 = r.viajes.crear(dict(base, titulo="Valdivia", precio=90000, tipo="gira"), [])
+    def pagina(orden="precio", direccion="asc", limite=10, cursor=None, **filtros):
+        filas, siguiente = paginar(db, "viajes", {"orden": orden, "direccion": direccion, "limite": limite,
+                                                  "filtros": filtros, "cursor": cursor})
+        return [fila["id"] for fila in filas], siguiente
+    verificar(pagina()[0] == [v3, v1, v4, v2], f"orden por precio final {pagina()[0]}")
+    verificar(pagina(direccion="desc")[0] == [v2, v4, v1, v3], "orden descendente por precio final")
+    verificar(pagina(precio_max=80000)[0] == [v3, v1], "precio_max sobre el precio final")
+    verificar(pagina(precio_min=95000, precio_max=150000)[0] == [v2], "precio_min sobre el precio final")
+    primera, siguiente = pagina(limite=2)
+    segunda, _ = pagina(limite=2, cursor=decodificar_cursor(siguiente, "precio"))
+    verificar(primera == [v3, v1] and segunda == [v4, v2], f"cursor por precio final {primera} {segunda}")
+    verificar(pagina(tipo="paquete")[0] == [v1, v2], "tipo y precio final")
+    r.viajes.eliminar(v4)
+
+    # Carrito
+    verificar(sorted(r.carrito.agregar(ana, [v1, v2])) == sorted([v1, v2]), "agregar devuelve los insertados")
+    verificar(r.carrito.agregar(ana, [v1, v2, v3]) == [v3], "solo devuelve los que no estaban")
+    verificar(r.carrito.agregar(ana, [v1, v2]) == [], "sin duplicados")
+    cantidad, subtotal, total = r.carrito.totales(ana)
+    verificar((cantidad, subtotal, total) == (3, 350000, 70000 + 140000 + 50000),
+              f"totales {(cantidad, subtotal, total)}")
+    filas, totales = r.carrito.items(ana)
+    verificar(len(filas) == 3 and totales["ahorro"] == 90000, f"items {totales}")
+    item = filas[0]["id"]
+    verificar(r.carrito.quitar(beto, item) is None, "no se quitan ítems ajenos")
+    verificar(r.carrito.quitar(ana, item) == filas[0]["viaje_id"], "quitar devuelve el viaje")
+    verificar(r.carrito.totales(ana)[0] == 2, "quitar reduce la cantidad")
+
+    # Editar y eliminar viajes
+    r.viajes.actualizar(v2, dict(base, titulo="Atacama", precio=300000, itinerario=None), ["/c.jpg"])
+    verificar(r.viajes.obtener(v2)["precio_final"] == 210000, "editar recalcula el precio")
+    r.viajes.eliminar(v3)
+    verificar(r.viajes.obtener(v3) is None, "eliminar viaje")
+    r.promociones.eliminar(por_tipo)
+    verificar(r.viajes.obtener(v1)["precio_final"] == 100000, "eliminar promoción")
+    db.commit()
+
+if __name__ == "__main__":
+    with wonderchile.app.app_context():
+        wonderchile.init_db()
+        escenario(get_db())
+
+    if fallas:
+        print("\n".join(fallas))
+        sys.exit(1)
+    print("OK: repositorios verificados")
@@ -0,0 +1,150 @@
+import sqlite3
+import os
+import queue
+import threading
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# CONFIGURACIÓN BASE DE DATOS
+# --------------------------------------------------
+DATABASE = os.environ.get("DATABASE", "wonderchile.db")
+
+# Conexiones reutilizables por proceso (cada worker de gunicorn tiene su pool)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# PRAGMAs aplicados a cada conexión nueva.
+# WAL permite que los lectores (/, /paquetes) no se bloqueen con las
+# escrituras del admin; synchronous=NORMAL es seguro con WAL.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # ~16 MB de caché de páginas
+    "PRAGMA mmap_size = 134217728",    # 128 MB mapeados en memoria
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+# --------------------------------------------------
+# POOL DE CONEXIONES
+# --------------------------------------------------
+class PoolConexiones:
+    def __init__(self, database, tamano=POOL_SIZE):
+        self.database = database
+        self.tamano = tamano
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # Tras un fork (gunicorn --preload) las conexiones heredadas no se reutilizan
+        self._pid = os.getpid()
+        self._libres = queue.LifoQueue(maxsize=self.tamano)
+
+    def _conectar(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def obtener(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reiniciar()
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            return self._conectar()
+
+    def devolver(self, conn):
+        if self._pid != os.getpid():
+            conn.close()
+            return
+        try:
+            # Nunca devolver al pool una transacción a medio terminar
+            if conn.in_transaction:
+                conn.rollback()
+            self._libres.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        except sqlite3.Error:
+            logger.exception("Conexión descartada del pool")
+            conn.close()
+
+    def cerrar_todas(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+pool = PoolConexiones(DATABASE)
+
+# --------------------------------------------------
+# CONEXIÓN POR CONTEXTO DE APLICACIÓN
+# --------------------------------------------------
+# Envoltorio opcional de cada conexión entregada (ver metricas.py)
+_envoltura = None
+
+def envolver_conexiones(funcion):
+    global _envoltura
+    _envoltura = funcion
+
+def get_db():
+    # Una sola conexión por request / contexto, devuelta al pool en el teardown
+    if "db" not in g:
+        g.db = pool.obtener()
+        g.db_envuelta = _envoltura(g.db) if _envoltura else g.db
+    return g.db_envuelta
+
+def cerrar_db(exception=None):
+    g.pop("db_envuelta", None)
+    db = g.pop("db", None)
+    if db is not None:
+        pool.devolver(db)
+
+# --------------------------------------------------
+# ACCESO ASÍNCRONO (modo ASGI, ver asgi.py)
+# --------------------------------------------------
+# sqlite3 es bloqueante: cada llamada corre en un pool de POOL_SIZE hilos,
+# dentro de un contexto de aplicación propio, así get_db(), la caché del
+# catálogo y el teardown que devuelve la conexión funcionan igual que en
+# un request. El event loop nunca espera a SQLite.
+class BaseAsync:
+    def __init__(self, app, hilos=POOL_SIZE):
+        self.app = app
+        self.hilos = hilos
+        self._lock = threading.Lock()
+        self._ejecutor = None
+        self._pid = None
+
+    def _obtener_ejecutor(self):
+        with self._lock:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(self.hilos, thread_name_prefix="sqlite")
+                self._pid = os.getpid()
+            return self._ejecutor
+
+    def _en_contexto(self, funcion, args):
+        with self.app.app_context():
+            return funcion(get_db(), *args)
+
+    async def ejecutar(self, funcion, *args):
+        # funcion(db, *args) en un hilo del pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._obtener_ejecutor(), self._en_contexto, funcion, args)
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False)
+            self._ejecutor = None
@@ -0,0 +1,344 @@
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import logging
+import threading
+
+from database import pool
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# ESCRITURAS DIFERIDAS (write-behind)
+# --------------------------------------------------
+# Mensajes de contacto, eventos del carrito y auditoría del admin no
+# necesitan estar en SQLite antes de responder. encolar() agrega la entrada
+# a un spool local (JSON Lines, solo se agrega al final) y vuelve sin tomar
+# el lock de escritura de SQLite. Un hilo por proceso vuelca lo acumulado
+# en una sola transacción cada INTERVALO_MS o al juntar MAX_FILAS.
+#
+# Cada proceso escribe su propio archivo, escrituras-<pid>.spool. Antes de
+# volcar, el hilo lo renombra a un segmento .lote que se borra solo
+# después del commit. Si el worker muere, el próximo proceso que use la
+# cola toma los archivos de pids que ya no existen y los vuelca. `uid` es
+# único en cada tabla (INSERT OR IGNORE): volcar dos veces no duplica.
+#
+# Solo se reintenta cuando SQLite está ocupada (OperationalError: locked,
+# busy). Si un lote falla por otra razón se guarda fila por fila y las que
+# siguen fallando van a DESCARTADAS, así una entrada mala no frena la cola.
+#
+# Con ESCRITURAS_FSYNC=1 cada entrada se sincroniza a disco (sobrevive a un
+# corte de luz, no solo a la caída del proceso) a costa de latencia.
+
+ESCRITURAS_DIR = os.environ.get("ESCRITURAS_DIR", "spool")
+INTERVALO_MS = int(os.environ.get("ESCRITURAS_INTERVALO_MS", "200"))
+MAX_FILAS = int(os.environ.get("ESCRITURAS_MAX_FILAS", "500"))
+FSYNC = os.environ.get("ESCRITURAS_FSYNC") == "1"
+# Espera máxima entre reintentos mientras SQLite no acepta el volcado
+REINTENTO_MAXIMO = 30
+# Entradas que SQLite no aceptó (JSON Lines, dentro de ESCRITURAS_DIR)
+DESCARTADAS = "descartadas.jsonl"
+
+# tipo -> (tabla, columnas además de uid y fecha)
+DESTINOS = {
+    "contacto": ("contactos", ("nombre", "email", "telefono", "destino", "fecha_viaje",
+                               "duracion", "personas", "presupuesto", "mensaje")),
+    "carrito": ("eventos_carrito", ("usuario_id", "viaje_id", "accion")),
+    "auditoria": ("auditoria", ("usuario_id", "accion", "objeto", "detalle")),
+}
+
+_ARCHIVO = re.compile(r"^escrituras-(\d+)")
+
+def nueva_entrada(tipo, datos):
+    if tipo not in DESTINOS:
+        raise ValueError(f"Tipo de escritura desconocido: {tipo!r}")
+    ahora = time.time()
+    return {
+        "uid": uuid.uuid4().hex,
+        "tipo": tipo,
+        "t": ahora,
+        # Mismo formato que CURRENT_TIMESTAMP: la hora del evento, no la del volcado
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ahora)),
+        "datos": datos,
+    }
+
+def insertar(db, entradas):
+    # Sin commit: un executemany por tabla dentro de la transacción del llamador
+    por_tipo = {}
+    for entrada in entradas:
+        if entrada.get("tipo") in DESTINOS:
+            por_tipo.setdefault(entrada["tipo"], []).append(entrada)
+        else:
+            logger.warning("Entrada de spool descartada (tipo %r)", entrada.get("tipo"))
+    for tipo, grupo in por_tipo.items():
+        tabla, columnas = DESTINOS[tipo]
+        marcas = ", ".join("?" for _ in range(len(columnas) + 2))
+        db.executemany(
+            f"INSERT OR IGNORE INTO {tabla} (uid, fecha, {', '.join(columnas)}) VALUES ({marcas})",
+            [(entrada["uid"], entrada["fecha"]) + tuple(entrada["datos"].get(c) for c in columnas)
+             for entrada in grupo]
+        )
+    return por_tipo
+
+def leer_spool(ruta):
+    entradas = []
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                # Una línea cortada por una caída a mitad de escritura
+                logger.warning("Línea %s inválida en %s: se descarta", numero, ruta)
+    return entradas
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# --------------------------------------------------
+# COLA POR PROCESO
+# --------------------------------------------------
+class ColaEscrituras:
+    def __init__(self, directorio=ESCRITURAS_DIR, intervalo_ms=INTERVALO_MS, max_filas=MAX_FILAS):
+        self.directorio = directorio
+        self.intervalo = intervalo_ms / 1000
+        self.max_filas = max_filas
+        self._cond = threading.Condition()
+        self._pid = None
+        self._hilo = None
+        self.volcadas = 0
+        self.recuperadas = 0
+        self.errores = 0
+        self.descartadas = 0
+        self.ultimo_volcado_ms = None
+        # Al salir del proceso se vuelca lo pendiente (no aplica a un SIGKILL)
+        atexit.register(self.cerrar)
+
+    def _ruta_activa(self):
+        return os.path.join(self.directorio, f"escrituras-{self._pid}.spool")
+
+    def _nuevo_segmento(self):
+        self._segmento += 1
+        return os.path.join(self.directorio, f"escrituras-{self._pid}-{self._token}-{self._segmento:06d}.lote")
+
+    def _iniciar(self):
+        # Primer uso en este proceso (o tras un fork); se llama con el lock tomado
+        self._pid = os.getpid()
+        self._archivo = None
+        self._pendientes = []
+        self._atrasados = []      # (entradas, segmento) listos para volcar, en orden
+        self._segmento = 0
+        # Los segmentos nuevos nunca pisan archivos de una ejecución anterior
+        self._token = uuid.uuid4().hex[:8]
+        self._fallos = 0
+        self._proximo_intento = 0.0
+        self._cerrando = False
+        os.makedirs(self.directorio, exist_ok=True)
+        self._reclamar_huerfanos()
+        self._hilo = threading.Thread(target=self._trabajar, name="escrituras", daemon=True)
+        self._hilo.start()
+
+    def _reclamar_huerfanos(self):
+        # Archivos de procesos muertos, o de uno anterior con este mismo pid
+        # (un contenedor reiniciado repite pids). El rename es atómico: si
+        # dos workers compiten, solo uno se queda con cada archivo.
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, "escrituras-*"))):
+            coincidencia = _ARCHIVO.match(os.path.basename(ruta))
+            if not coincidencia:
+                continue
+            pid = int(coincidencia.group(1))
+            if pid != self._pid and _vivo(pid):
+                continue
+            segmento = self._nuevo_segmento()
+            try:
+                os.rename(ruta, segmento)
+            except FileNotFoundError:
+                continue
+            entradas = leer_spool(segmento)
+            self.recuperadas += len(entradas)
+            self._atrasados.append((entradas, segmento))
+            logger.info("Recuperadas %s escrituras de %s", len(entradas), os.path.basename(ruta))
+
+    def encolar(self, tipo, datos):
+        entrada = nueva_entrada(tipo, datos)
+        linea = json.dumps(entrada, ensure_ascii=False) + "\n"
+        with self._cond:
+            if self._pid != os.getpid() or self._hilo is None:
+                self._iniciar()
+            if self._archivo is None:
+                self._archivo = open(self._ruta_activa(), "a", encoding="utf-8")
+            self._archivo.write(linea)
+            self._archivo.flush()
+            if FSYNC:
+                os.fsync(self._archivo.fileno())
+            self._pendientes.append(entrada)
+            if len(self._pendientes) >= self.max_filas:
+                self._cond.notify()
+            metricas.registrar_escrituras_pendientes(self._profundidad())
+        return entrada["uid"]
+
+    def _profundidad(self):
+        return len(self._pendientes) + sum(len(entradas) for entradas, _ in self._atrasados)
+
+    def _rotar(self):
+        # Con el lock: lo pendiente y su archivo pasan a ser un segmento
+        if not self._pendientes:
+            return
+        self._archivo.close()
+        self._archivo = None
+        segmento = self._nuevo_segmento()
+        os.replace(self._ruta_activa(), segmento)
+        self._atrasados.append((self._pendientes, segmento))
+        self._pendientes = []
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._pendientes) >= self.max_filas or self._cerrando,
+                    timeout=self.intervalo
+                )
+                try:
+                    self._rotar()
+                except OSError:
+                    logger.exception("No se pudo rotar el spool de escrituras")
+                cerrando = self._cerrando
+                atrasados = list(self._atrasados)
+            self._volcar_atrasados(atrasados, forzar=cerrando)
+            if cerrando:
+                return
+
+    def _volcar_atrasados(self, atrasados, forzar=False):
+        if not forzar and time.monotonic() < self._proximo_intento:
+            return
+        for entradas, segmento in atrasados:
+            if not self._volcar(entradas, segmento):
+                # Espera creciente mientras la base no acepte escrituras
+                self._fallos += 1
+                espera = min(REINTENTO_MAXIMO, self.intervalo * 2 ** self._fallos)
+                self._proximo_intento = time.monotonic() + espera
+                return
+            self._fallos = 0
+            with self._cond:
+                self._atrasados.pop(0)
+                metricas.registrar_escrituras_pendientes(self._profundidad())
+
+    def _volcar(self, entradas, segmento):
+        inicio = time.perf_counter()
+        conn = pool.obtener()
+        try:
+            try:
+                por_tipo = insertar(conn, entradas)
+                conn.commit()
+            except sqlite3.OperationalError:
+                # Base ocupada: se reintenta el lote completo más tarde
+                self.errores += 1
+                metricas.registrar_error_escrituras()
+                logger.exception("No se pudieron volcar %s escrituras; quedan en %s", len(entradas), segmento)
+                return False
+            except Exception:
+                conn.rollback()
+                self.errores += 1
+                metricas.registrar_error_escrituras()
+                logger.exception("Lote %s con entradas inválidas: se vuelca fila por fila", segmento)
+                por_tipo = self._volcar_por_fila(conn, entradas)
+                if por_tipo is None:
+                    return False
+        finally:
+            pool.devolver(conn)
+        os.remove(segmento)
+
+        segundos = time.perf_counter() - inicio
+        self.volcadas += len(entradas)
+        self.ultimo_volcado_ms = round(segundos * 1000, 3)
+        demora = time.time() - min((entrada.get("t", time.time()) for entrada in entradas), default=time.time())
+        metricas.registrar_volcado_escrituras(segundos, demora, {tipo: len(grupo) for tipo, grupo in por_tipo.items()})
+        return True
+
+    def _volcar_por_fila(self, conn, entradas):
+        # Un commit por entrada; las que fallan van a DESCARTADAS. Devuelve
+        # las volcadas por tipo, o None si la base quedó ocupada a mitad (el
+        # reintento del lote no duplica: uid es único)
+        por_tipo = {}
+        rechazadas = []
+        for entrada in entradas:
+            try:
+                for tipo, grupo in insertar(conn, [entrada]).items():
+                    por_tipo.setdefault(tipo, []).extend(grupo)
+                conn.commit()
+            except sqlite3.OperationalError:
+                conn.rollback()
+                return None
+            except Exception as error:
+                conn.rollback()
+                rechazadas.append({"entrada": entrada, "error": f"{type(error).__name__}: {error}"})
+        if rechazadas:
+            self._descartar(rechazadas)
+        return por_tipo
+
+    def _descartar(self, rechazadas):
+        with open(os.path.join(self.directorio, DESCARTADAS), "a", encoding="utf-8") as f:
+            for rechazada in rechazadas:
+                f.write(json.dumps(rechazada, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.descartadas += len(rechazadas)
+        metricas.registrar_escrituras_descartadas(len(rechazadas))
+        logger.error("%s escrituras descartadas a %s", len(rechazadas), DESCARTADAS)
+
+    def cerrar(self, timeout=10):
+        # Vuelca lo pendiente y detiene el hilo (al salir del proceso)
+        with self._cond:
+            if self._pid != os.getpid() or self._hilo is None:
+                return
+            self._cerrando = True
+            self._cond.notify()
+            hilo = self._hilo
+        hilo.join(timeout)
+        with self._cond:
+            self._hilo = None
+
+    def estadisticas(self):
+        with self._cond:
+            activa = self._pid == os.getpid() and self._hilo is not None
+            return {
+                "pendientes": len(self._pendientes) if activa else 0,
+                "atrasadas": sum(len(entradas) for entradas, _ in self._atrasados) if activa else 0,
+                "volcadas": self.volcadas,
+                "recuperadas": self.recuperadas,
+                "errores": self.errores,
+                "descartadas": self.descartadas,
+                "ultimo_volcado_ms": self.ultimo_volcado_ms,
+            }
+
+cola = ColaEscrituras()
+
+# --------------------------------------------------
+# ATAJOS
+# --------------------------------------------------
+def encolar(tipo, **datos):
+    return cola.encolar(tipo, datos)
+
+def evento_carrito(usuario_id, viaje_id, accion):
+    return cola.encolar("carrito", {"usuario_id": usuario_id, "viaje_id": viaje_id, "accion": accion})
+
+def auditar(usuario_id, accion, objeto, detalle=None):
+    return cola.encolar("auditoria", {
+        "usuario_id": usuario_id,
+        "accion": accion,
+        "objeto": objeto,
+        "detalle": json.dumps(detalle, ensure_ascii=False) if detalle is not None else None,
+    })
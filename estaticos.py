@@ -0,0 +1,131 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se generan hermanos .gz
+    brotli = None
+
+# --------------------------------------------------
+# ARCHIVOS ESTÁTICOS CON HUELLA
+# --------------------------------------------------
+# `python estaticos.py` genera static/manifest.json (ruta -> ruta con hash)
+# y los hermanos .gz/.br de CSS/JS/SVG. Si no hay manifiesto se calcula en
+# memoria al arrancar. `url_for('static', ...)` devuelve siempre el nombre
+# con huella, así que esas URLs se pueden cachear para siempre.
+
+MANIFIESTO = "manifest.json"
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+COMPRIMIBLES = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+# Las subidas ya tienen el hash en el nombre (ver almacenamiento.py)
+EXCLUIDOS = ("uploads/",)
+
+def _huella(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(64 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()[:12]
+
+def _con_huella(relativa, huella):
+    base, extension = os.path.splitext(relativa)
+    return f"{base}.{huella}{extension}"
+
+def _recorrer(carpeta):
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            relativa = os.path.relpath(os.path.join(raiz, nombre), carpeta).replace(os.sep, "/")
+            if relativa == MANIFIESTO or relativa.endswith((".gz", ".br")):
+                continue
+            if relativa.startswith(EXCLUIDOS):
+                continue
+            yield relativa
+
+def calcular_manifiesto(carpeta):
+    return {
+        relativa: _con_huella(relativa, _huella(os.path.join(carpeta, relativa)))
+        for relativa in _recorrer(carpeta)
+    }
+
+def cargar_manifiesto(carpeta):
+    ruta = os.path.join(carpeta, MANIFIESTO)
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    return calcular_manifiesto(carpeta)
+
+def _escribir_atomico(destino, datos):
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, destino)
+
+def construir(carpeta):
+    manifiesto = calcular_manifiesto(carpeta)
+    for relativa in manifiesto:
+        if os.path.splitext(relativa)[1] not in COMPRIMIBLES:
+            continue
+        ruta = os.path.join(carpeta, relativa)
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        _escribir_atomico(ruta + ".gz", gzip.compress(datos, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _escribir_atomico(ruta + ".br", brotli.compress(datos, quality=11))
+    _escribir_atomico(
+        os.path.join(carpeta, MANIFIESTO),
+        json.dumps(manifiesto, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return manifiesto
+
+# --------------------------------------------------
+# INTEGRACIÓN CON FLASK
+# --------------------------------------------------
+def init_app(app):
+    carpeta = app.static_folder
+    manifiesto = cargar_manifiesto(carpeta)
+    originales = {con_huella: relativa for relativa, con_huella in manifiesto.items()}
+    # Forma parte del ETag de las páginas cacheadas (ver cache.py)
+    app.config["HUELLA_ESTATICOS"] = hashlib.sha1(
+        json.dumps(manifiesto, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+
+    @app.url_defaults
+    def agregar_huella(endpoint, values):
+        if endpoint == "static" and values.get("filename") in manifiesto:
+            values["filename"] = manifiesto[values["filename"]]
+
+    def servir_estatico(filename):
+        original = originales.get(filename)
+        if original is None:
+            respuesta = send_from_directory(carpeta, filename)
+            if filename.startswith(EXCLUIDOS) and filename.count("/") >= 3:
+                # uploads/ab/cd/<hash>.ext y uploads/derivados/ab/<hash>-x.webp
+                respuesta.headers["Cache-Control"] = CACHE_INMUTABLE
+            return respuesta
+
+        mimetype = mimetypes.guess_type(original)[0] or "application/octet-stream"
+        aceptadas = request.accept_encodings
+        for codificacion, sufijo in (("br", ".br"), ("gzip", ".gz")):
+            if aceptadas[codificacion] and os.path.exists(os.path.join(carpeta, original + sufijo)):
+                respuesta = send_from_directory(carpeta, original + sufijo, mimetype=mimetype)
+                respuesta.headers["Content-Encoding"] = codificacion
+                break
+        else:
+            respuesta = send_from_directory(carpeta, original, mimetype=mimetype)
+        respuesta.vary.add("Accept-Encoding")
+        respuesta.headers["Cache-Control"] = CACHE_INMUTABLE
+        return respuesta
+
+    app.view_functions["static"] = servir_estatico
+
+
+if __name__ == "__main__":
+    carpeta = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    generados = construir(carpeta)
+    print(f"Manifiesto con {len(generados)} archivos escrito en {carpeta}/{MANIFIESTO}")
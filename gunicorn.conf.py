@@ -0,0 +1,18 @@
+import os
+import shutil
+import tempfile
+
+# --------------------------------------------------
+# MÉTRICAS MULTIPROCESO (ver metricas.py)
+# --------------------------------------------------
+# Se define antes de cargar la app para que todos los workers escriban en
+# el mismo directorio; se vacía en cada arranque para no sumar valores viejos.
+directorio_metricas = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "wonderchile_metricas")
+)
+shutil.rmtree(directorio_metricas, ignore_errors=True)
+os.makedirs(directorio_metricas, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,174 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from markupsafe import Markup
+
+from database import get_db, pool
+from cache import leer_version
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow se sirven solo los originales
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# DERIVADOS DE IMÁGENES (WebP redimensionado)
+# --------------------------------------------------
+# Al subir una imagen se encargan sus variantes a un pool de procesos, así
+# el POST del admin responde de inmediato. Las variantes se guardan por
+# huella (SHA-256, ver almacenamiento.py): subir los mismos bytes otra vez
+# reutiliza lo ya generado.
+
+VARIANTES = {
+    "miniatura": 320,   # miniaturas de galería
+    "tarjeta": 640,     # tarjetas del catálogo
+    "detalle": 1280,    # imagen principal del paquete
+}
+CALIDAD_WEBP = 80
+IMAGENES_WORKERS = int(os.environ.get("IMAGENES_WORKERS", "2"))
+
+# `sizes` según dónde se muestra la imagen
+SIZES = {
+    "tarjeta": "(max-width: 768px) 100vw, 33vw",
+    "detalle": "(max-width: 768px) 100vw, 60vw",
+    "galeria": "(max-width: 768px) 50vw, 25vw",
+}
+
+def generar_derivados(origen, huella, carpeta):
+    # Se ejecuta en el pool de procesos: nada de Flask ni de la base de datos aquí
+    resultados = []
+    with Image.open(origen) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+
+        anchos_generados = set()
+        for variante, ancho in VARIANTES.items():
+            # Nunca agrandar: las variantes más anchas que el original se omiten
+            ancho_real = min(ancho, img.width)
+            if ancho_real in anchos_generados:
+                continue
+            anchos_generados.add(ancho_real)
+
+            relativa = os.path.join(huella[:2], f"{huella}-{variante}.webp")
+            destino = os.path.join(carpeta, relativa)
+            if not os.path.exists(destino):
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                copia = img.copy()
+                copia.thumbnail((ancho_real, img.height))
+                temporal = f"{destino}.{os.getpid()}.tmp"
+                copia.save(temporal, "WEBP", quality=CALIDAD_WEBP, method=4)
+                os.replace(temporal, destino)
+            resultados.append((variante, ancho_real, relativa))
+    return resultados
+
+# --------------------------------------------------
+# POOL DE PROCESOS
+# --------------------------------------------------
+# Sin fork: el pool se crea dentro de un worker con hilos que puede tener
+# tomados locks (pool de SQLite, logging) y un hijo copiado a mitad de uno
+# se queda colgado. forkserver (spawn donde no existe) arranca procesos
+# limpios; por eso generar_derivados vive a nivel de módulo
+ARRANQUE = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_ejecutor = None
+_ejecutor_pid = None
+_ejecutor_lock = threading.Lock()
+_pendientes = set()
+
+def _obtener_ejecutor():
+    global _ejecutor, _ejecutor_pid
+    with _ejecutor_lock:
+        if _ejecutor is None or _ejecutor_pid != os.getpid():
+            _ejecutor = ProcessPoolExecutor(
+                max_workers=IMAGENES_WORKERS, mp_context=multiprocessing.get_context(ARRANQUE)
+            )
+            _ejecutor_pid = os.getpid()
+        return _ejecutor
+
+def _registrar_variantes(huella, prefijo_url, futuro):
+    with _ejecutor_lock:
+        _pendientes.discard(huella)
+    try:
+        resultados = futuro.result()
+    except Exception:
+        logger.exception("No se pudieron generar los derivados de %s", huella)
+        return
+
+    conn = pool.obtener()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO imagen_variantes (hash, variante, ancho, url) VALUES (?, ?, ?, ?)",
+            [(huella, variante, ancho, f"{prefijo_url}/{relativa}")
+             for variante, ancho, relativa in resultados]
+        )
+        conn.execute("UPDATE cache_version SET version = version + 1 WHERE nombre = 'imagenes'")
+        conn.commit()
+    finally:
+        pool.devolver(conn)
+
+def encargar_derivados(db, huella, ruta, carpeta_derivados, prefijo_url):
+    # Solo si esta huella todavía no tiene variantes
+    existentes = db.execute(
+        "SELECT 1 FROM imagen_variantes WHERE hash = ? LIMIT 1", (huella,)
+    ).fetchone()
+    if existentes:
+        return
+    if Image is None:
+        logger.warning("Pillow no está instalado; no se generan derivados de %s", ruta)
+        return
+
+    ejecutor = _obtener_ejecutor()
+    with _ejecutor_lock:
+        # Los mismos bytes subidos dos veces seguidas se procesan una sola vez
+        if huella in _pendientes:
+            return
+        _pendientes.add(huella)
+    futuro = ejecutor.submit(generar_derivados, ruta, huella, carpeta_derivados)
+    futuro.add_done_callback(partial(_registrar_variantes, huella, prefijo_url))
+
+# --------------------------------------------------
+# SRCSET PARA PLANTILLAS
+# --------------------------------------------------
+class CacheVariantes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._por_url = {}
+
+    def srcset(self, db, url):
+        version = leer_version(db, "imagenes")
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    filas = db.execute("""
+                        SELECT i.url AS original, v.ancho, v.url
+                        FROM imagenes i
+                        JOIN imagen_variantes v ON v.hash = i.hash
+                        ORDER BY v.ancho
+                    """).fetchall()
+                    por_url = {}
+                    for fila in filas:
+                        por_url.setdefault(fila["original"], []).append(
+                            f"{fila['url']} {fila['ancho']}w"
+                        )
+                    self._por_url = {k: ", ".join(v) for k, v in por_url.items()}
+                    self._version = version
+        return self._por_url.get(url)
+
+variantes = CacheVariantes()
+
+def imagen_responsive(url, uso="tarjeta"):
+    # Atributos srcset/sizes para <img>; vacío si aún no hay derivados
+    if not url:
+        return ""
+    srcset = variantes.srcset(get_db(), url)
+    if not srcset:
+        return ""
+    return Markup(' srcset="{}" sizes="{}"').format(srcset, SIZES[uso])
@@ -0,0 +1,300 @@
+import io
+import csv
+import json
+import logging
+
+from modelos import separar_galeria, guardar_galeria, guardar_itinerario
+from almacenamiento import actualizar_referencias
+from cache import incrementar_version
+from precios import recalcular_precios, validar_aplicacion, validar_precio, validar_descuento
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# IMPORTACIÓN / EXPORTACIÓN MASIVA (CSV y JSON Lines)
+# --------------------------------------------------
+# Los archivos se leen fila a fila y se guardan en lotes de LOTE filas por
+# transacción. Una fila inválida se informa con su número de línea y se
+# salta sin abortar el resto. Con `id` la fila actualiza el registro
+# existente (upsert) y solo cambia las columnas con valor; sin `id` se
+# inserta uno nuevo. Si el archivo deja de poder leerse (no es UTF-8, CSV
+# mal formado) la importación se detiene ahí: los lotes anteriores quedan
+# guardados y el resumen lo indica en `detenida`.
+# La exportación es un generador que recorre el cursor: nunca arma la
+# tabla completa en memoria.
+
+LOTE = 500
+MAX_ERRORES = 200
+TIPOS_VIAJE = {"paquete", "gira", "mujeres"}
+
+def _texto(valor):
+    if isinstance(valor, list):  # galería como lista en JSON
+        valor = ",".join(str(v) for v in valor)
+    return str(valor).strip() or None
+
+def _numero(valor):
+    return float(str(valor).replace(",", "."))
+
+def _entero(valor):
+    return int(float(valor))
+
+def _booleano(valor):
+    return 1 if str(valor).strip().lower() in ("1", "true", "si", "sí", "x") else 0
+
+# Columnas por tabla: nombre -> (conversión, obligatoria)
+COLUMNAS = {
+    "viajes": {
+        "id": (_entero, False),
+        "titulo": (_texto, True),
+        "descripcion": (_texto, True),
+        "precio": (_numero, True),
+        "imagen": (_texto, False),
+        "grupo_minimo": (_texto, False),
+        "alojamiento": (_texto, False),
+        "alimentacion": (_texto, False),
+        "transporte": (_texto, False),
+        "itinerario": (_texto, False),
+        "tipo": (_texto, False),
+        "destacado": (_booleano, False),
+        "galeria": (_texto, False),
+    },
+    "promociones": {
+        "id": (_entero, False),
+        "titulo": (_texto, True),
+        "descripcion": (_texto, True),
+        "descuento": (_numero, True),
+        "imagen": (_texto, False),
+        "tipo": (_texto, False),
+        "viaje_id": (_entero, False),
+        "aplica_tipo": (_texto, False),
+        "desde": (_texto, False),
+        "hasta": (_texto, False),
+    },
+}
+
+FORMATOS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+def formato_por_nombre(nombre):
+    nombre = (nombre or "").lower()
+    if nombre.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if nombre.endswith(".csv"):
+        return "csv"
+    return None
+
+# --------------------------------------------------
+# LECTURA Y VALIDACIÓN
+# --------------------------------------------------
+class ArchivoIlegible(ValueError):
+    # El archivo no se puede seguir leyendo desde esa línea: la importación se detiene
+    pass
+
+def _lineas(stream, estado):
+    # Decodifica línea por línea para ubicar un byte inválido en su línea exacta
+    # readline y no `for linea in stream`: el archivo subido (ArchivoSubido) no es iterable
+    for numero, linea in enumerate(iter(stream.readline, b""), start=1):
+        try:
+            yield linea.decode("utf-8-sig" if numero == 1 else "utf-8")
+        except UnicodeDecodeError:
+            estado["error"] = ArchivoIlegible(
+                f"El archivo no está en UTF-8 (línea {numero}); guárdalo como «CSV UTF-8»"
+            )
+            estado["linea"] = numero
+            return
+
+def leer_filas(stream, formato):
+    # (número de línea, dict) por cada fila, sin cargar el archivo completo
+    estado = {}
+    lineas = _lineas(stream, estado)
+    if formato == "csv":
+        # strict: una comilla sin cerrar es un error, no una fila truncada
+        lector = csv.DictReader(lineas, strict=True)
+        try:
+            for fila in lector:
+                yield lector.line_num, fila
+        except csv.Error as error:
+            yield lector.line_num, ArchivoIlegible(f"CSV mal formado: {error}")
+            return
+    else:
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError as error:
+                yield numero, ValueError(f"JSON inválido: {error}")
+                continue
+            yield numero, fila if isinstance(fila, dict) else ValueError("Se esperaba un objeto JSON")
+    if estado:
+        yield estado["linea"], estado["error"]
+
+def validar_fila(tabla, fila):
+    valores = {}
+    for columna, (convertir, obligatoria) in COLUMNAS[tabla].items():
+        valor = fila.get(columna)
+        if valor is None or str(valor).strip() == "":
+            if obligatoria:
+                raise ValueError(f"Falta '{columna}'")
+            continue
+        try:
+            valores[columna] = convertir(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Valor inválido en '{columna}': {valor!r}")
+
+    if tabla == "viajes":
+        valores.setdefault("tipo", "paquete")
+        if valores["tipo"] not in TIPOS_VIAJE:
+            raise ValueError(f"Tipo desconocido: {valores['tipo']!r}")
+        valores["precio"] = validar_precio(valores["precio"])
+    else:
+        valores.setdefault("tipo", "promocion")
+        valores["descuento"] = validar_descuento(valores["descuento"])
+        aplicacion = validar_aplicacion(*(valores.get(c) for c in ("viaje_id", "aplica_tipo", "desde", "hasta")))
+        valores.update((c, v) for c, v in aplicacion.items() if c in valores)
+    return valores
+
+# --------------------------------------------------
+# ESCRITURA
+# --------------------------------------------------
+def _guardar_viaje(db, valores):
+    # Galería e itinerario se reescriben solo si la fila trae esas columnas;
+    # lo mismo las referencias de las imágenes que se reemplazan
+    galeria = separar_galeria(valores.pop("galeria")) if "galeria" in valores else None
+    antes, despues = [], []
+    if "id" in valores:
+        anterior = db.execute("SELECT imagen FROM viajes WHERE id = ?", (valores["id"],)).fetchone()
+        if anterior and "imagen" in valores:
+            antes.append(anterior["imagen"])
+        if anterior and galeria is not None:
+            antes += [fila["url"] for fila in db.execute(
+                "SELECT url FROM viaje_imagenes WHERE viaje_id = ?", (valores["id"],)
+            )]
+    viaje_id = _upsert(db, "viajes", valores)
+    if galeria is not None:
+        guardar_galeria(db, viaje_id, galeria)
+        despues += galeria
+    if "itinerario" in valores:
+        guardar_itinerario(db, viaje_id, valores["itinerario"])
+    despues.append(valores.get("imagen"))
+    actualizar_referencias(db, antes, despues)
+    return viaje_id
+
+def _guardar_promocion(db, valores):
+    antes = []
+    if "id" in valores:
+        anterior = db.execute("SELECT imagen FROM promociones WHERE id = ?", (valores["id"],)).fetchone()
+        if anterior:
+            antes = [anterior["imagen"]]
+    _upsert(db, "promociones", valores)
+    actualizar_referencias(db, antes, [valores.get("imagen")])
+
+def _upsert(db, tabla, valores):
+    columnas = list(valores)
+    marcas = ", ".join("?" for _ in columnas)
+    sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcas})"
+    if "id" in valores:
+        cambios = ", ".join(f"{c} = excluded.{c}" for c in columnas if c != "id")
+        sql += f" ON CONFLICT(id) DO UPDATE SET {cambios}"
+    cursor = db.execute(sql, [valores[c] for c in columnas])
+    return valores.get("id") or cursor.lastrowid
+
+GUARDAR = {"viajes": _guardar_viaje, "promociones": _guardar_promocion}
+
+def importar(db, tabla, stream, formato, progreso=None, lote=LOTE):
+    resumen = {"procesadas": 0, "guardadas": 0, "errores": [], "total_errores": 0, "detenida": None}
+    guardar = GUARDAR[tabla]
+    guardados = []
+
+    def cerrar_lote():
+        # Precios y versión del catálogo cambian en la misma transacción que los datos
+        if tabla == "viajes":
+            recalcular_precios(db, guardados)
+        else:
+            recalcular_precios(db)
+            incrementar_version(db, "viajes")
+        incrementar_version(db, tabla)
+        db.commit()
+        guardados.clear()
+        if progreso:
+            progreso(resumen)
+
+    def error(linea, mensaje):
+        resumen["total_errores"] += 1
+        if len(resumen["errores"]) < MAX_ERRORES:
+            resumen["errores"].append({"linea": linea, "error": mensaje})
+
+    for linea, fila in leer_filas(stream, formato):
+        if isinstance(fila, ArchivoIlegible):
+            # Lo ya leído se guarda igual; desde aquí no se puede seguir
+            error(linea, str(fila))
+            resumen["detenida"] = {"linea": linea, "error": str(fila)}
+            break
+        resumen["procesadas"] += 1
+        if isinstance(fila, Exception):
+            error(linea, str(fila))
+            continue
+        try:
+            valores = validar_fila(tabla, fila)
+        except ValueError as e:
+            error(linea, str(e))
+            continue
+
+        # Cada fila en su savepoint: un fallo de SQLite no deshace el lote
+        if not db.in_transaction:
+            db.execute("BEGIN")
+        db.execute("SAVEPOINT fila")
+        try:
+            guardado = guardar(db, valores)
+        except Exception as e:  # se informa y se sigue con la próxima fila
+            db.execute("ROLLBACK TO fila")
+            db.execute("RELEASE fila")
+            error(linea, f"Error al guardar: {e}")
+            continue
+        db.execute("RELEASE fila")
+        resumen["guardadas"] += 1
+        guardados.append(guardado)
+        if len(guardados) >= lote:
+            cerrar_lote()
+
+    cerrar_lote()
+    logger.info("Importación de %s: %s guardadas, %s errores",
+                tabla, resumen["guardadas"], resumen["total_errores"])
+    return resumen
+
+# --------------------------------------------------
+# EXPORTACIÓN
+# --------------------------------------------------
+CONSULTAS_EXPORTACION = {
+    "viajes": """
+        SELECT v.id, v.titulo, v.descripcion, v.precio, v.imagen, v.grupo_minimo,
+               v.alojamiento, v.alimentacion, v.transporte, v.itinerario, v.tipo, v.destacado,
+               (SELECT group_concat(url, ',') FROM (
+                    SELECT url FROM viaje_imagenes WHERE viaje_id = v.id ORDER BY orden
+               )) AS galeria
+        FROM viajes v ORDER BY v.id
+    """,
+    "promociones": """
+        SELECT id, titulo, descripcion, descuento, imagen, tipo, viaje_id, aplica_tipo, desde, hasta
+        FROM promociones ORDER BY id
+    """,
+}
+
+def exportar(db, tabla, formato, filas_por_bloque=200):
+    # Genera el archivo en bloques de texto a medida que se leen las filas
+    columnas = list(COLUMNAS[tabla])
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer) if formato == "csv" else None
+    if escritor:
+        escritor.writerow(columnas)
+
+    for numero, fila in enumerate(db.execute(CONSULTAS_EXPORTACION[tabla]), start=1):
+        if escritor:
+            escritor.writerow([fila[c] for c in columnas])
+        else:
+            buffer.write(json.dumps({c: fila[c] for c in columnas}, ensure_ascii=False) + "\n")
+        if numero % filas_por_bloque == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
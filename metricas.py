@@ -0,0 +1,214 @@
+import os
+import time
+import logging
+
+from flask import g, request, Response
+from flask.signals import before_render_template, template_rendered
+
+from database import envolver_conexiones
+
+try:
+    from prometheus_client import (
+        Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+    )
+    from prometheus_client import multiprocess
+except ImportError:  # sin prometheus_client no se exponen métricas
+    Counter = None
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# MÉTRICAS ESTILO PROMETHEUS
+# --------------------------------------------------
+# Con gunicorn, PROMETHEUS_MULTIPROC_DIR (ver gunicorn.conf.py) hace que
+# cada worker escriba sus valores en archivos de ese directorio y /metrics
+# suma los de todos, sin importar qué worker atiende el scrape.
+# Si METRICS_TOKEN está definido, /metrics exige "Authorization: Bearer <token>".
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+if Counter is not None:
+    LATENCIA = Histogram(
+        "wonderchile_http_request_duration_seconds",
+        "Duración de cada request por endpoint",
+        ["endpoint", "metodo"],
+    )
+    RESPUESTAS = Counter(
+        "wonderchile_http_responses_total",
+        "Respuestas por endpoint y código de estado",
+        ["endpoint", "estado"],
+    )
+    SQL_CONSULTAS = Histogram(
+        "wonderchile_sql_queries_per_request",
+        "Sentencias SQL ejecutadas por request",
+        ["endpoint"],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+    )
+    SQL_SEGUNDOS = Histogram(
+        "wonderchile_sql_seconds_per_request",
+        "Tiempo total en SQLite por request",
+        ["endpoint"],
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    )
+    RENDER = Histogram(
+        "wonderchile_template_render_seconds",
+        "Tiempo de render de cada plantilla",
+        ["plantilla"],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    )
+    SUBIDAS = Counter(
+        "wonderchile_upload_bytes_total",
+        "Bytes recibidos en subidas de imágenes",
+    )
+    # Cola de escrituras diferidas (ver escrituras.py)
+    ESCRITURAS_PENDIENTES = Gauge(
+        "wonderchile_escrituras_pendientes",
+        "Escrituras encoladas que aún no están en SQLite",
+        multiprocess_mode="livesum",
+    )
+    ESCRITURAS_VOLCADO = Histogram(
+        "wonderchile_escrituras_volcado_seconds",
+        "Duración de cada volcado de la cola a SQLite",
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    )
+    ESCRITURAS_DEMORA = Histogram(
+        "wonderchile_escrituras_demora_seconds",
+        "Tiempo entre encolar la entrada más antigua de un volcado y su commit",
+        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    )
+    ESCRITURAS_FILAS = Counter(
+        "wonderchile_escrituras_filas_total",
+        "Filas volcadas por tipo de escritura",
+        ["tipo"],
+    )
+    ESCRITURAS_ERRORES = Counter(
+        "wonderchile_escrituras_errores_total",
+        "Volcados fallidos (se reintentan)",
+    )
+    ESCRITURAS_DESCARTADAS = Counter(
+        "wonderchile_escrituras_descartadas_total",
+        "Entradas que SQLite rechazó, guardadas en descartadas.jsonl",
+    )
+    # Respaldos en caliente (ver respaldos.py)
+    RESPALDO_DURACION = Histogram(
+        "wonderchile_respaldo_seconds",
+        "Duración de cada respaldo (copia, verificación y compresión)",
+        buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+    )
+    RESPALDO_ULTIMO = Gauge(
+        "wonderchile_respaldo_ultimo_timestamp_seconds",
+        "Hora del último respaldo verificado",
+        multiprocess_mode="max",
+    )
+    RESPALDO_ERRORES = Counter(
+        "wonderchile_respaldo_errores_total",
+        "Respaldos fallidos",
+    )
+
+
+class ConexionMedida:
+    # Delegado de sqlite3.Connection que suma consultas y tiempo al request actual
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            if "metricas_inicio" in g:
+                g.sql_consultas += 1
+                g.sql_segundos += time.perf_counter() - inicio
+
+    def execute(self, *args):
+        return self._medir(self._conn.execute, *args)
+
+    def executemany(self, *args):
+        return self._medir(self._conn.executemany, *args)
+
+    def executescript(self, *args):
+        return self._medir(self._conn.executescript, *args)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+def registrar_subida(cantidad_bytes):
+    if Counter is not None:
+        SUBIDAS.inc(cantidad_bytes)
+
+def registrar_escrituras_pendientes(cantidad):
+    if Counter is not None:
+        ESCRITURAS_PENDIENTES.set(cantidad)
+
+def registrar_volcado_escrituras(segundos, demora, filas_por_tipo):
+    if Counter is not None:
+        ESCRITURAS_VOLCADO.observe(segundos)
+        ESCRITURAS_DEMORA.observe(demora)
+        for tipo, cantidad in filas_por_tipo.items():
+            ESCRITURAS_FILAS.labels(tipo).inc(cantidad)
+
+def registrar_error_escrituras():
+    if Counter is not None:
+        ESCRITURAS_ERRORES.inc()
+
+def registrar_escrituras_descartadas(cantidad):
+    if Counter is not None:
+        ESCRITURAS_DESCARTADAS.inc(cantidad)
+
+def registrar_respaldo(segundos):
+    if Counter is not None:
+        RESPALDO_DURACION.observe(segundos)
+        RESPALDO_ULTIMO.set(time.time())
+
+def registrar_error_respaldo():
+    if Counter is not None:
+        RESPALDO_ERRORES.inc()
+
+def _endpoint():
+    return request.endpoint or "sin_ruta"
+
+def _antes_del_request():
+    g.metricas_inicio = time.perf_counter()
+    g.sql_consultas = 0
+    g.sql_segundos = 0.0
+
+def _despues_del_request(respuesta):
+    inicio = g.pop("metricas_inicio", None)
+    if inicio is None:
+        return respuesta
+    endpoint = _endpoint()
+    LATENCIA.labels(endpoint, request.method).observe(time.perf_counter() - inicio)
+    RESPUESTAS.labels(endpoint, str(respuesta.status_code)).inc()
+    SQL_CONSULTAS.labels(endpoint).observe(g.sql_consultas)
+    SQL_SEGUNDOS.labels(endpoint).observe(g.sql_segundos)
+    return respuesta
+
+def _antes_de_render(sender, template, context, **extra):
+    g.setdefault("renders", []).append(time.perf_counter())
+
+def _despues_de_render(sender, template, context, **extra):
+    renders = g.get("renders")
+    if renders:
+        RENDER.labels(template.name or "sin_nombre").observe(time.perf_counter() - renders.pop())
+
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return "No autorizado", 401
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(app):
+    if Counter is None:
+        logger.warning("prometheus_client no está instalado: /metrics deshabilitado")
+        return
+    app.before_request(_antes_del_request)
+    app.after_request(_despues_del_request)
+    before_render_template.connect(_antes_de_render, app)
+    template_rendered.connect(_despues_de_render, app)
+    envolver_conexiones(ConexionMedida)
+    app.add_url_rule("/metrics", "metrics", metrics)
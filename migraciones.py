@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import logging
+
+from database import DATABASE
+from modelos import separar_galeria, guardar_galeria, guardar_itinerario
+from precios import recalcular_precios
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# MIGRACIONES DE ESQUEMA
+# --------------------------------------------------
+# Cada migración se ejecuta una sola vez, en orden. El número de la última
+# aplicada se guarda en PRAGMA user_version. Nunca reordenar ni borrar
+# entradas de MIGRACIONES: solo agregar al final.
+
+MIGRACIONES = []
+
+def migracion(func):
+    MIGRACIONES.append(func)
+    return func
+
+def esquema_al_dia(database=DATABASE):
+    # Chequeo de arranque: un entero, sin pasar por el pool de conexiones
+    if not os.path.exists(database):
+        return False
+    conn = sqlite3.connect(database)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRACIONES)
+    finally:
+        conn.close()
+
+def aplicar_migraciones(db):
+    actual = db.execute("PRAGMA user_version").fetchone()[0]
+    for numero, func in enumerate(MIGRACIONES, start=1):
+        if numero <= actual:
+            continue
+        logger.info("Aplicando migración %s: %s", numero, func.__name__)
+        func(db)
+        db.execute(f"PRAGMA user_version = {numero}")
+        db.commit()
+
+
+@migracion
+def normalizar_galeria_itinerario(db):
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS viaje_imagenes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        viaje_id INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        orden INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (viaje_id) REFERENCES viajes (id)
+    )""")
+
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS viaje_itinerario (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        viaje_id INTEGER NOT NULL,
+        orden INTEGER NOT NULL DEFAULT 0,
+        dia TEXT NOT NULL,
+        descripcion TEXT,
+        FOREIGN KEY (viaje_id) REFERENCES viajes (id)
+    )""")
+
+    # Pasar los datos de las columnas de texto a las tablas hijas.
+    # `itinerario` se conserva como texto editable; `galeria` queda en desuso.
+    filas = db.execute(
+        "SELECT id, galeria, itinerario FROM viajes "
+        "WHERE galeria IS NOT NULL OR itinerario IS NOT NULL"
+    ).fetchall()
+    for fila in filas:
+        guardar_galeria(db, fila["id"], separar_galeria(fila["galeria"]))
+        guardar_itinerario(db, fila["id"], fila["itinerario"])
+    db.execute("UPDATE viajes SET galeria = NULL")
+    db.execute("UPDATE cache_version SET version = version + 1 WHERE nombre = 'viajes'")
+
+
+@migracion
+def crear_tablas_imagenes(db):
+    # URL pública -> huella del contenido, y variantes generadas por huella
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS imagenes (
+        url TEXT PRIMARY KEY,
+        hash TEXT NOT NULL
+    )""")
+
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS imagen_variantes (
+        hash TEXT NOT NULL,
+        variante TEXT NOT NULL,
+        ancho INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        PRIMARY KEY (hash, variante)
+    )""")
+
+    db.execute("INSERT OR IGNORE INTO cache_version (nombre, version) VALUES ('imagenes', 0)")
+
+
+@migracion
+def almacenamiento_por_contenido(db):
+    # `ruta` solo existe para archivos guardados por huella; las subidas
+    # antiguas (ruta NULL) nunca se recolectan
+    db.execute("ALTER TABLE imagenes ADD COLUMN ruta TEXT")
+    db.execute("ALTER TABLE imagenes ADD COLUMN referencias INTEGER NOT NULL DEFAULT 0")
+    db.execute("ALTER TABLE imagenes ADD COLUMN subido TIMESTAMP")
+
+
+@migracion
+def carrito_unico(db):
+    # Quitar duplicados previos antes de exigir un paquete por usuario
+    db.execute("""
+        DELETE FROM carrito WHERE id NOT IN (
+            SELECT MIN(id) FROM carrito GROUP BY usuario_id, viaje_id
+        )
+    """)
+    db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_carrito_usuario_viaje ON carrito (usuario_id, viaje_id)"
+    )
+
+
+@migracion
+def crear_indices(db):
+    # Consultas calientes de app.py; verificadas con check_query_plans.py
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_tipo ON viajes (tipo)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_titulo ON viajes (titulo)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_carrito_usuario_fecha ON carrito (usuario_id, fecha_agregado)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viaje_imagenes_viaje ON viaje_imagenes (viaje_id, orden)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viaje_itinerario_viaje ON viaje_itinerario (viaje_id, orden)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_imagenes_hash ON imagenes (hash)")
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS ix_imagenes_huerfanas ON imagenes (referencias) "
+        "WHERE ruta IS NOT NULL"
+    )
+
+
+@migracion
+def indices_paginacion(db):
+    # Paginación por (precio, id) con y sin filtro de tipo
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_tipo_precio ON viajes (tipo, precio)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_precio ON viajes (precio)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_promociones_tipo ON promociones (tipo)")
+
+
+@migracion
+def busqueda_texto_completo(db):
+    # Índice FTS5 de contenido externo: el texto vive solo en `viajes`
+    db.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS viajes_fts USING fts5(
+        titulo, descripcion, itinerario, alojamiento, transporte,
+        content = 'viajes',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""")
+
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_fts_insert AFTER INSERT ON viajes BEGIN
+        INSERT INTO viajes_fts (rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES (new.id, new.titulo, new.descripcion, new.itinerario, new.alojamiento, new.transporte);
+    END""")
+
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_fts_delete AFTER DELETE ON viajes BEGIN
+        INSERT INTO viajes_fts (viajes_fts, rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES ('delete', old.id, old.titulo, old.descripcion, old.itinerario, old.alojamiento, old.transporte);
+    END""")
+
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_fts_update AFTER UPDATE ON viajes BEGIN
+        INSERT INTO viajes_fts (viajes_fts, rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES ('delete', old.id, old.titulo, old.descripcion, old.itinerario, old.alojamiento, old.transporte);
+        INSERT INTO viajes_fts (rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES (new.id, new.titulo, new.descripcion, new.itinerario, new.alojamiento, new.transporte);
+    END""")
+
+    # Indexar lo que ya existe
+    db.execute("INSERT INTO viajes_fts (viajes_fts) VALUES ('rebuild')")
+
+
+@migracion
+def crear_tabla_sesiones(db):
+    # Sesiones del lado del servidor (ver sesiones.py); la cookie guarda solo `sid`
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS sesiones (
+        sid TEXT PRIMARY KEY,
+        user_id INTEGER,
+        datos TEXT NOT NULL,
+        expira INTEGER NOT NULL
+    )""")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_sesiones_user_id ON sesiones (user_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_sesiones_expira ON sesiones (expira)")
+    db.execute(
+        "INSERT OR IGNORE INTO cache_version (nombre, version) VALUES ('sesiones', 0), ('usuarios', 0)"
+    )
+
+
+@migracion
+def viajes_destacados(db):
+    # Los destacados van primero en cada sección de la portada
+    db.execute("ALTER TABLE viajes ADD COLUMN destacado INTEGER NOT NULL DEFAULT 0")
+
+
+@migracion
+def motor_de_precios(db):
+    # Promociones aplicables a un viaje o a un tipo, con ventana de vigencia (ver precios.py)
+    db.execute("ALTER TABLE promociones ADD COLUMN viaje_id INTEGER REFERENCES viajes (id)")
+    db.execute("ALTER TABLE promociones ADD COLUMN aplica_tipo TEXT")
+    db.execute("ALTER TABLE promociones ADD COLUMN desde TEXT")
+    db.execute("ALTER TABLE promociones ADD COLUMN hasta TEXT")
+
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS precios_vigentes (
+        viaje_id INTEGER PRIMARY KEY,
+        precio_base REAL,
+        descuento REAL NOT NULL DEFAULT 0,
+        precio_final REAL,
+        promocion_id INTEGER,
+        vigente_hasta TEXT
+    )""")
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS ix_precios_vigente_hasta ON precios_vigentes (vigente_hasta) "
+        "WHERE vigente_hasta IS NOT NULL"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS ix_promociones_viaje ON promociones (viaje_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_promociones_aplica_tipo ON promociones (aplica_tipo)")
+
+    # Sin fila en precios_vigentes (p. ej. inserts directos) vale el precio base
+    db.execute("""
+    CREATE VIEW IF NOT EXISTS viajes_con_precio AS
+    SELECT v.*,
+           COALESCE(p.precio_final, v.precio) AS precio_final,
+           COALESCE(p.descuento, 0) AS descuento,
+           p.promocion_id
+    FROM viajes v
+    LEFT JOIN precios_vigentes p ON p.viaje_id = v.id
+    """)
+
+    recalcular_precios(db)
+    db.execute("UPDATE cache_version SET version = version + 1 WHERE nombre = 'viajes'")
+
+
+@migracion
+def escrituras_diferidas(db):
+    # Destinos de la cola de escrituras (ver escrituras.py). `uid` es único
+    # para que volcar de nuevo un spool recuperado no duplique filas
+    for columna, tipo in (("telefono", "TEXT"), ("destino", "TEXT"), ("fecha_viaje", "TEXT"),
+                          ("duracion", "TEXT"), ("personas", "INTEGER"), ("presupuesto", "TEXT"),
+                          ("uid", "TEXT")):
+        db.execute(f"ALTER TABLE contactos ADD COLUMN {columna} {tipo}")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_contactos_uid ON contactos (uid)")
+
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS eventos_carrito (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        uid TEXT NOT NULL UNIQUE,
+        usuario_id INTEGER,
+        viaje_id INTEGER,
+        accion TEXT NOT NULL,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_eventos_carrito_usuario ON eventos_carrito (usuario_id, fecha)")
+
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS auditoria (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        uid TEXT NOT NULL UNIQUE,
+        usuario_id INTEGER,
+        accion TEXT NOT NULL,
+        objeto TEXT,
+        detalle TEXT,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_auditoria_fecha ON auditoria (fecha)")
+
+
+@migracion
+def precio_final_en_viajes(db):
+    # Filtros y orden por precio final (lo que ve el visitante) con índice.
+    # precios_vigentes sigue siendo el resultado del motor; un trigger copia
+    # su precio_final a viajes, donde puede indexarse junto al tipo
+    db.execute("ALTER TABLE viajes ADD COLUMN precio_final REAL")
+    # ix_viajes_tipo_precio queda: lo usa el motor (promociones por tipo)
+    db.execute("DROP INDEX IF EXISTS ix_viajes_precio")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_tipo_precio_final ON viajes (tipo, precio_final)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_viajes_precio_final ON viajes (precio_final)")
+
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS precios_vigentes_copiar AFTER INSERT ON precios_vigentes BEGIN
+        UPDATE viajes SET precio_final = new.precio_final WHERE id = new.viaje_id;
+    END""")
+    # Sin fila en precios_vigentes (p. ej. inserts directos) vale el precio base
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_precio_base_insert AFTER INSERT ON viajes
+    WHEN new.precio_final IS NULL BEGIN
+        UPDATE viajes SET precio_final = new.precio WHERE id = new.id;
+    END""")
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_precio_base_update AFTER UPDATE OF precio ON viajes
+    WHEN NOT EXISTS (SELECT 1 FROM precios_vigentes WHERE viaje_id = new.id) BEGIN
+        UPDATE viajes SET precio_final = new.precio WHERE id = new.id;
+    END""")
+
+    # Cambiar precio_final no debe reescribir el índice de búsqueda
+    db.execute("DROP TRIGGER IF EXISTS viajes_fts_update")
+    db.execute("""
+    CREATE TRIGGER IF NOT EXISTS viajes_fts_update
+    AFTER UPDATE OF titulo, descripcion, itinerario, alojamiento, transporte ON viajes BEGIN
+        INSERT INTO viajes_fts (viajes_fts, rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES ('delete', old.id, old.titulo, old.descripcion, old.itinerario, old.alojamiento, old.transporte);
+        INSERT INTO viajes_fts (rowid, titulo, descripcion, itinerario, alojamiento, transporte)
+        VALUES (new.id, new.titulo, new.descripcion, new.itinerario, new.alojamiento, new.transporte);
+    END""")
+
+    # precio_final ya viene en v.*
+    db.execute("DROP VIEW IF EXISTS viajes_con_precio")
+    db.execute("""
+    CREATE VIEW viajes_con_precio AS
+    SELECT v.*,
+           COALESCE(p.descuento, 0) AS descuento,
+           p.promocion_id
+    FROM viajes v
+    LEFT JOIN precios_vigentes p ON p.viaje_id = v.id
+    """)
+
+    db.execute("UPDATE viajes SET precio_final = precio")
+    recalcular_precios(db)
+    db.execute("UPDATE cache_version SET version = version + 1 WHERE nombre = 'viajes'")
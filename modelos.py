@@ -0,0 +1,151 @@
+from collections import namedtuple
+
+# --------------------------------------------------
+# MODELOS DEL CATÁLOGO
+# --------------------------------------------------
+# La galería y el itinerario se guardan normalizados en `viaje_imagenes`
+# y `viaje_itinerario`; se parsean una sola vez al escribir y las vistas
+# reciben listas listas para iterar.
+
+Foto = namedtuple("Foto", ["url", "alt"])
+DiaItinerario = namedtuple("DiaItinerario", ["dia", "descripcion"])
+
+
+class Viaje:
+    def __init__(self, fila, galeria=(), itinerario=()):
+        self._datos = dict(fila)
+        self.galeria = list(galeria)
+        self.itinerario = list(itinerario)
+
+    def __getattr__(self, nombre):
+        try:
+            return self.__dict__["_datos"][nombre]
+        except KeyError:
+            raise AttributeError(nombre)
+
+    def __getitem__(self, clave):
+        if clave in ("galeria", "itinerario"):
+            return getattr(self, clave)
+        return self._datos[clave]
+
+    def keys(self):
+        return self._datos.keys()
+
+    @property
+    def itinerario_texto(self):
+        return self._datos.get("itinerario") or ""
+
+    @property
+    def galeria_texto(self):
+        return ", ".join(foto.url for foto in self.galeria)
+
+
+def separar_galeria(texto):
+    # Formato heredado: URLs separadas por comas
+    if not texto:
+        return []
+    return [url.strip() for url in texto.split(",") if url.strip()]
+
+def parsear_itinerario(texto):
+    # Una línea por día; "Día 1: Llegada" se separa en título y descripción
+    dias = []
+    for linea in (texto or "").splitlines():
+        linea = linea.strip()
+        if not linea:
+            continue
+        if ":" in linea:
+            dia, descripcion = linea.split(":", 1)
+            dias.append((dia.strip(), descripcion.strip()))
+        else:
+            dias.append((f"Día {len(dias) + 1}", linea))
+    return dias
+
+# --------------------------------------------------
+# ESCRITURA
+# --------------------------------------------------
+def guardar_galeria(db, viaje_id, urls):
+    db.execute("DELETE FROM viaje_imagenes WHERE viaje_id = ?", (viaje_id,))
+    db.executemany(
+        "INSERT INTO viaje_imagenes (viaje_id, url, orden) VALUES (?, ?, ?)",
+        [(viaje_id, url, orden) for orden, url in enumerate(urls)]
+    )
+
+def guardar_itinerario(db, viaje_id, texto):
+    db.execute("DELETE FROM viaje_itinerario WHERE viaje_id = ?", (viaje_id,))
+    db.executemany(
+        "INSERT INTO viaje_itinerario (viaje_id, orden, dia, descripcion) VALUES (?, ?, ?, ?)",
+        [(viaje_id, orden, dia, descripcion)
+         for orden, (dia, descripcion) in enumerate(parsear_itinerario(texto))]
+    )
+
+def eliminar_detalle(db, viaje_id):
+    db.execute("DELETE FROM viaje_imagenes WHERE viaje_id = ?", (viaje_id,))
+    db.execute("DELETE FROM viaje_itinerario WHERE viaje_id = ?", (viaje_id,))
+
+# --------------------------------------------------
+# LECTURA
+# --------------------------------------------------
+def _armar(filas, imagenes, dias):
+    galerias = {}
+    for img in imagenes:
+        galerias.setdefault(img["viaje_id"], []).append(img["url"])
+    itinerarios = {}
+    for d in dias:
+        itinerarios.setdefault(d["viaje_id"], []).append(
+            DiaItinerario(d["dia"], d["descripcion"])
+        )
+
+    viajes = []
+    for fila in filas:
+        urls = galerias.get(fila["id"], [])
+        fotos = [Foto(url, f"{fila['titulo']} - foto {n}") for n, url in enumerate(urls, start=1)]
+        viajes.append(Viaje(fila, fotos, itinerarios.get(fila["id"], [])))
+    return viajes
+
+def cargar_viajes(db):
+    # Tres consultas para todo el catálogo, sin N+1
+    filas = db.execute("SELECT * FROM viajes_con_precio ORDER BY id").fetchall()
+    imagenes = db.execute(
+        "SELECT viaje_id, url FROM viaje_imagenes ORDER BY viaje_id, orden"
+    ).fetchall()
+    dias = db.execute(
+        "SELECT viaje_id, dia, descripcion FROM viaje_itinerario ORDER BY viaje_id, orden"
+    ).fetchall()
+    return _armar(filas, imagenes, dias)
+
+def cargar_viaje(db, viaje_id):
+    fila = db.execute("SELECT * FROM viajes_con_precio WHERE id = ?", (viaje_id,)).fetchone()
+    if not fila:
+        return None
+    imagenes = db.execute(
+        "SELECT viaje_id, url FROM viaje_imagenes WHERE viaje_id = ? ORDER BY orden",
+        (viaje_id,)
+    ).fetchall()
+    dias = db.execute(
+        "SELECT viaje_id, dia, descripcion FROM viaje_itinerario WHERE viaje_id = ? ORDER BY orden",
+        (viaje_id,)
+    ).fetchall()
+    return _armar([fila], imagenes, dias)[0]
+
+# --------------------------------------------------
+# PORTADA AGRUPADA POR TIPO
+# --------------------------------------------------
+SECCIONES_PORTADA = ("paquete", "mujeres", "gira")
+PORTADA_POR_SECCION = 8
+
+def construir_portada(viajes):
+    # Una pasada sobre el catálogo: destacados primero y luego por id,
+    # con un máximo de PORTADA_POR_SECCION viajes por sección
+    grupos = {tipo: [] for tipo in SECCIONES_PORTADA}
+    for viaje in viajes:
+        grupo = grupos.get(viaje["tipo"] or "paquete")
+        if grupo is not None:
+            grupo.append(viaje)
+    portada = {}
+    for tipo, grupo in grupos.items():
+        grupo.sort(key=lambda viaje: (-(viaje["destacado"] or 0), viaje["id"]))
+        portada[tipo] = {
+            "viajes": grupo[:PORTADA_POR_SECCION],
+            "hay_mas": len(grupo) > PORTADA_POR_SECCION,
+        }
+    return portada
@@ -0,0 +1,155 @@
+import json
+import base64
+import binascii
+
+from flask import request, url_for
+
+# --------------------------------------------------
+# PAGINACIÓN POR CLAVE (KEYSET)
+# --------------------------------------------------
+# En lugar de OFFSET se recuerda la última fila mostrada (valor de orden,
+# id) y la siguiente página empieza justo después, usando el índice.
+# Cada request lee como máximo `limite + 1` filas sin importar el tamaño
+# del catálogo.
+
+POR_PAGINA = 24
+MAX_POR_PAGINA = 100
+
+# Columnas por las que se puede ordenar y filtros admitidos por tabla.
+# `origen` es lo que se lee: los viajes traen su precio final (ver precios.py).
+# `precio` (orden, precio_min y precio_max) se aplica sobre `columna_precio`:
+# en los viajes el precio final, el que muestran las tarjetas y el carrito.
+# Tipos válidos en el cursor para cada columna de orden
+TIPOS_ORDEN = {
+    "id": (int,),
+    "precio": (int, float),
+    "descuento": (int, float),
+}
+
+TABLAS = {
+    "viajes": {
+        "origen": "viajes_con_precio",
+        "columna_precio": "precio_final",
+        "ordenes": {"id", "precio"},
+        "filtros": {"tipo", "precio_min", "precio_max"},
+    },
+    "promociones": {
+        "ordenes": {"id", "descuento"},
+        "filtros": {"tipo"},
+    },
+}
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+def _valor_valido(valor, tipos):
+    # bool es subclase de int en Python, pero no es un valor de orden
+    return isinstance(valor, tipos) and not isinstance(valor, bool)
+
+def decodificar_cursor(texto, orden="id"):
+    # [id] si se ordena por id, [valor, id] si no; None si falta o fue alterado
+    if not texto:
+        return None
+    try:
+        relleno = "=" * (-len(texto) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(texto + relleno))
+    except (ValueError, binascii.Error):
+        return None
+    esperados = [TIPOS_ORDEN["id"]] if orden == "id" else [TIPOS_ORDEN[orden], TIPOS_ORDEN["id"]]
+    if not isinstance(valores, list) or len(valores) != len(esperados):
+        return None
+    if not all(_valor_valido(valor, tipos) for valor, tipos in zip(valores, esperados)):
+        return None
+    return valores
+
+def _numero(texto):
+    try:
+        return float(texto) if texto not in (None, "") else None
+    except ValueError:
+        return None
+
+def leer_parametros(tabla, args, **fijos):
+    # Parámetros de la query string validados; `fijos` los impone la vista
+    config = TABLAS[tabla]
+    orden = args.get("orden", "id")
+    if orden not in config["ordenes"]:
+        orden = "id"
+    direccion = "desc" if args.get("dir") == "desc" else "asc"
+    try:
+        limite = min(max(int(args.get("limite", POR_PAGINA)), 1), MAX_POR_PAGINA)
+    except ValueError:
+        limite = POR_PAGINA
+
+    filtros = {}
+    if "tipo" in config["filtros"] and args.get("tipo"):
+        filtros["tipo"] = args.get("tipo")
+    for nombre in ("precio_min", "precio_max"):
+        if nombre in config["filtros"] and _numero(args.get(nombre)) is not None:
+            filtros[nombre] = _numero(args.get(nombre))
+    filtros.update(fijos)
+
+    # Un cursor alterado se ignora (primera página); la API responde 400
+    cursor = decodificar_cursor(args.get("cursor"), orden)
+    return {
+        "orden": orden,
+        "direccion": direccion,
+        "limite": limite,
+        "filtros": filtros,
+        "cursor": cursor,
+        "cursor_invalido": bool(args.get("cursor")) and cursor is None,
+    }
+
+def paginar(db, tabla, parametros, columnas="*"):
+    config = TABLAS.get(tabla, {})
+    precio = config.get("columna_precio", "precio")
+    orden = precio if parametros["orden"] == "precio" else parametros["orden"]
+    filtros = parametros["filtros"]
+    comparador, sentido = (">", "ASC") if parametros["direccion"] == "asc" else ("<", "DESC")
+
+    condiciones, valores = [], []
+    if "tipo" in filtros:
+        condiciones.append("tipo = ?")
+        valores.append(filtros["tipo"])
+    if "precio_min" in filtros:
+        condiciones.append(f"{precio} >= ?")
+        valores.append(filtros["precio_min"])
+    if "precio_max" in filtros:
+        condiciones.append(f"{precio} <= ?")
+        valores.append(filtros["precio_max"])
+
+    cursor = parametros["cursor"]
+    if orden == "id":
+        if cursor:
+            condiciones.append(f"id {comparador} ?")
+            valores.append(cursor[-1])
+        orden_sql = f"id {sentido}"
+    else:
+        # Desempate por id para que el orden sea total
+        if cursor:
+            condiciones.append(f"({orden}, id) {comparador} (?, ?)")
+            valores.extend(cursor)
+        orden_sql = f"{orden} {sentido}, id {sentido}"
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    origen = config.get("origen", tabla)
+    filas = db.execute(
+        f"SELECT {columnas} FROM {origen} {where} ORDER BY {orden_sql} LIMIT ?",
+        (*valores, parametros["limite"] + 1)
+    ).fetchall()
+
+    siguiente = None
+    if len(filas) > parametros["limite"]:
+        filas = filas[:parametros["limite"]]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(
+            [ultima["id"]] if orden == "id" else [ultima[orden], ultima["id"]]
+        )
+    return filas, siguiente
+
+def url_pagina(cursor):
+    # Misma vista y filtros, otra página
+    if not cursor:
+        return None
+    args = request.args.to_dict()
+    args["cursor"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
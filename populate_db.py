@@ -73,6 +73,9 @@ contactos = [
 
 cursor.executemany('INSERT OR IGNORE INTO contactos (nombre, email, mensaje) VALUES (?, ?, ?)', contactos)
 
+# Invalidar la caché del catálogo en los workers en ejecución
+cursor.execute("UPDATE cache_version SET version = version + 1 WHERE nombre IN ('viajes', 'promociones')")
+
 # Confirmar cambios
 conn.commit()
 
@@ -0,0 +1,202 @@
+import json
+import math
+import time
+import logging
+from datetime import date
+
+from database import get_db
+from cache import incrementar_version
+import prerender
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# MOTOR DE PRECIOS
+# --------------------------------------------------
+# Una promoción aplica a un viaje (`viaje_id`) o a todos los de un tipo
+# (`aplica_tipo`), con una ventana opcional [desde, hasta] en fechas ISO,
+# ambas inclusive. Si varias aplican gana el mayor descuento; no se suman.
+#
+# `precios_vigentes` guarda el precio final de cada viaje, calculado en una
+# sola sentencia sobre todo el catálogo (o sobre los viajes modificados).
+# Cada fila recuerda en `vigente_hasta` la próxima fecha en que una ventana
+# abre o cierra; revisar_vencimientos() recalcula esas filas al llegar el
+# día. Un trigger copia el precio final a `viajes.precio_final` (con índice,
+# para filtrar y ordenar); las lecturas usan la vista `viajes_con_precio`.
+
+REVISION_SEGUNDOS = 60
+TIPOS_VIAJE = ("paquete", "gira", "mujeres")
+
+# En `activas`, SQLite toma promocion_id de la fila que tiene el MAX(descuento)
+_RECALCULAR = """
+    WITH aplicables AS (
+        SELECT v.id AS viaje_id, promociones.id AS promocion_id, promociones.descuento, promociones.desde, promociones.hasta
+        FROM promociones JOIN viajes v ON v.id = promociones.viaje_id
+        WHERE promociones.descuento > 0 {filtro}
+        UNION ALL
+        SELECT v.id, promociones.id, promociones.descuento, promociones.desde, promociones.hasta
+        FROM promociones JOIN viajes v ON v.tipo = promociones.aplica_tipo
+        WHERE promociones.descuento > 0 {filtro}
+    ),
+    activas AS (
+        SELECT viaje_id, promocion_id, MAX(descuento) AS descuento
+        FROM aplicables
+        WHERE (desde IS NULL OR desde <= :hoy) AND (hasta IS NULL OR hasta >= :hoy)
+        GROUP BY viaje_id
+    ),
+    cambios AS (
+        SELECT viaje_id, MIN(CASE WHEN desde > :hoy THEN desde ELSE date(hasta, '+1 day') END) AS proximo
+        FROM aplicables
+        WHERE desde > :hoy OR hasta >= :hoy
+        GROUP BY viaje_id
+    )
+    INSERT INTO precios_vigentes (viaje_id, precio_base, descuento, precio_final, promocion_id, vigente_hasta)
+    SELECT v.id, v.precio, COALESCE(a.descuento, 0),
+           ROUND(v.precio * (100 - MIN(COALESCE(a.descuento, 0), 100)) / 100.0),
+           a.promocion_id, c.proximo
+    FROM viajes v
+    LEFT JOIN activas a ON a.viaje_id = v.id
+    LEFT JOIN cambios c ON c.viaje_id = v.id
+    WHERE 1 {filtro}
+"""
+
+_FILTRO_IDS = "AND v.id IN (SELECT value FROM json_each(:ids))"
+
+def hoy():
+    return date.today().isoformat()
+
+def _numero(valor, campo):
+    try:
+        numero = float(str(valor).strip().replace(",", "."))
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor inválido en '{campo}': {valor!r}")
+    if not math.isfinite(numero):
+        raise ValueError(f"Valor inválido en '{campo}': {valor!r}")
+    return numero
+
+# Un texto en precio o descuento llega al SQL del motor como TEXT, que
+# SQLite ordena por sobre cualquier número: el precio final quedaría en 0
+def validar_precio(valor):
+    precio = _numero(valor, "precio")
+    if precio < 0:
+        raise ValueError("El precio no puede ser negativo")
+    return precio
+
+def validar_descuento(valor):
+    descuento = _numero(valor, "descuento")
+    if not 0 <= descuento <= 100:
+        raise ValueError("El descuento debe estar entre 0 y 100")
+    return descuento
+
+def validar_aplicacion(viaje_id=None, aplica_tipo=None, desde=None, hasta=None):
+    # Campos de promociones que usa el motor, normalizados; ValueError si no valen
+    if viaje_id not in (None, ""):
+        try:
+            viaje_id = int(viaje_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"Id de paquete inválido: {viaje_id!r}")
+    aplica_tipo = aplica_tipo or None
+    if aplica_tipo is not None and aplica_tipo not in TIPOS_VIAJE:
+        raise ValueError(f"Tipo desconocido: {aplica_tipo!r}")
+    fechas = []
+    for fecha in (desde, hasta):
+        if fecha in (None, ""):
+            fechas.append(None)
+            continue
+        try:
+            fechas.append(date.fromisoformat(str(fecha).strip()).isoformat())
+        except ValueError:
+            raise ValueError(f"Fecha inválida: {fecha!r} (usar AAAA-MM-DD)")
+    if fechas[0] and fechas[1] and fechas[0] > fechas[1]:
+        raise ValueError("La fecha de inicio es posterior a la de término")
+    return {
+        "viaje_id": viaje_id or None,
+        "aplica_tipo": aplica_tipo,
+        "desde": fechas[0],
+        "hasta": fechas[1],
+    }
+
+def recalcular_precios(db, viaje_ids=None, dia=None):
+    # Todo el catálogo, o solo `viaje_ids`. Sin commit: va en la transacción
+    # de la escritura que lo provoca, como incrementar_version()
+    parametros = {"hoy": dia or hoy()}
+    if viaje_ids is None:
+        db.execute("DELETE FROM precios_vigentes")
+        db.execute(_RECALCULAR.format(filtro=""), parametros)
+        return
+    ids = [int(viaje_id) for viaje_id in viaje_ids]
+    if not ids:
+        return
+    parametros["ids"] = json.dumps(ids)
+    db.execute("DELETE FROM precios_vigentes WHERE viaje_id IN (SELECT value FROM json_each(:ids))", parametros)
+    db.execute(_RECALCULAR.format(filtro=_FILTRO_IDS), parametros)
+
+def revisar_vencimientos(db, dia=None):
+    # Recalcula los viajes cuya promoción empezó o terminó; devuelve sus ids
+    dia = dia or hoy()
+    ids = [fila[0] for fila in db.execute(
+        "SELECT viaje_id FROM precios_vigentes WHERE vigente_hasta <= ?", (dia,)
+    )]
+    if ids:
+        recalcular_precios(db, ids, dia)
+        incrementar_version(db, "viajes")
+        db.commit()
+        logger.info("Precios recalculados por vencimiento de promociones: %s viajes", len(ids))
+    return ids
+
+# --------------------------------------------------
+# TOTALES DEL CARRITO
+# --------------------------------------------------
+def total_carrito(db, usuario_id):
+    # Solo los totales, agregados dentro de SQLite: (cantidad, subtotal, total)
+    return tuple(db.execute("""
+        SELECT COUNT(*), COALESCE(SUM(v.precio), 0), COALESCE(SUM(COALESCE(pv.precio_final, v.precio)), 0)
+        FROM carrito c
+        JOIN viajes v ON v.id = c.viaje_id
+        LEFT JOIN precios_vigentes pv ON pv.viaje_id = v.id
+        WHERE c.usuario_id = ?
+    """, (usuario_id,)).fetchone())
+
+def totales_carrito(db, usuario_id):
+    # Una consulta: filas con su precio listo y los totales como ventana.
+    # Sin la vista: con OVER () SQLite la materializaría entera
+    filas = db.execute("""
+        SELECT c.id, c.viaje_id, v.titulo AS paquete, c.fecha_agregado,
+               v.precio AS precio_base,
+               COALESCE(pv.precio_final, v.precio) AS precio_final,
+               COALESCE(pv.descuento, 0) AS descuento,
+               SUM(v.precio) OVER () AS subtotal,
+               SUM(COALESCE(pv.precio_final, v.precio)) OVER () AS total
+        FROM carrito c
+        JOIN viajes v ON v.id = c.viaje_id
+        LEFT JOIN precios_vigentes pv ON pv.viaje_id = v.id
+        WHERE c.usuario_id = ?
+        ORDER BY c.fecha_agregado DESC
+    """, (usuario_id,)).fetchall()
+    subtotal = (filas[0]["subtotal"] or 0) if filas else 0
+    total = (filas[0]["total"] or 0) if filas else 0
+    return filas, {
+        "cantidad": len(filas),
+        "subtotal": subtotal,
+        "ahorro": subtotal - total,
+        "total": total,
+    }
+
+# --------------------------------------------------
+# REVISIÓN PERIÓDICA
+# --------------------------------------------------
+_ultima_revision = 0.0
+
+def _revisar_periodicamente():
+    # Como mucho una consulta por worker cada REVISION_SEGUNDOS
+    global _ultima_revision
+    ahora = time.monotonic()
+    if ahora - _ultima_revision < REVISION_SEGUNDOS:
+        return
+    _ultima_revision = ahora
+    ids = revisar_vencimientos(get_db())
+    if ids:
+        prerender.encargar_viajes(ids)
+
+def init_app(app):
+    app.before_request(_revisar_periodicamente)
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import gzip
+import time
+import shutil
+import tempfile
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.http import parse_accept_header, parse_cookie
+
+from database import get_db
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se generan hermanos .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# PRE-RENDERIZADO DEL CATÁLOGO PÚBLICO
+# --------------------------------------------------
+# `flask --app app prerender` escribe la versión anónima de las páginas
+# públicas (más hermanos .gz/.br) en PRERENDER_DIR/builds/<fecha> y recién
+# al terminar apunta el enlace PRERENDER_DIR/actual a ese directorio: el
+# cambio es atómico y nunca se sirve un build a medias.
+#
+# Con PRERENDER_DIR definido, guardar o eliminar un viaje re-renderiza solo
+# "/", "/paquetes" y "/paquete/<id>" en el build activo (cada archivo se
+# reemplaza con os.replace), en un hilo aparte para no demorar al admin. Una
+# promoción hace lo mismo con los viajes que alcanza; solo la importación
+# masiva rehace el build completo.
+#
+# Un proxy puede servir PRERENDER_DIR/actual sin pasar por Python (ver
+# README); con PRERENDER_SERVIR=1 lo hace ServirPrerenderizado dentro del
+# proceso, antes de entrar a Flask. Las peticiones con query string o con
+# cookie de sesión siempre van a Flask.
+
+PAGINAS_FIJAS = ("/", "/paquetes", "/giras", "/mujeres", "/contacto")
+# Páginas que muestran viajes y precios: se rehacen con cualquier cambio del catálogo
+PAGINAS_CATALOGO = ("/", "/paquetes")
+BUILDS_CONSERVADOS = 2
+PRERENDERIZABLES = re.compile(r"^/(paquetes|giras|mujeres|contacto|paquete/\d+)?$")
+# Marca del entorno WSGI para que el render no se sirva a sí mismo
+OMITIR = "wonderchile.prerender.omitir"
+
+def archivo_de(ruta):
+    # "/" -> index.html, "/paquete/5" -> paquete/5/index.html
+    ruta = ruta.strip("/")
+    return os.path.join(ruta, "index.html") if ruta else "index.html"
+
+def _escribir_atomico(destino, datos):
+    temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, destino)
+
+def _escribir(carpeta, ruta, html):
+    destino = os.path.join(carpeta, archivo_de(ruta))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    # Primero los comprimidos: el .html nuevo nunca queda con hermanos viejos
+    _escribir_atomico(destino + ".gz", gzip.compress(html, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _escribir_atomico(destino + ".br", brotli.compress(html, quality=11))
+    _escribir_atomico(destino, html)
+
+def _quitar(carpeta, ruta):
+    destino = os.path.join(carpeta, archivo_de(ruta))
+    for sufijo in ("", ".gz", ".br"):
+        try:
+            os.remove(destino + sufijo)
+        except FileNotFoundError:
+            pass
+
+def _renderizar(cliente, carpeta, rutas):
+    escritas = 0
+    for ruta in rutas:
+        respuesta = cliente.get(ruta, environ_overrides={OMITIR: True})
+        if respuesta.status_code == 200:
+            _escribir(carpeta, ruta, respuesta.get_data())
+            escritas += 1
+        elif respuesta.status_code == 404:
+            _quitar(carpeta, ruta)
+        else:
+            logger.warning("Pre-render de %s devolvió %s", ruta, respuesta.status_code)
+    return escritas
+
+def _rutas_viajes(app):
+    with app.app_context():
+        return [f"/paquete/{fila[0]}" for fila in get_db().execute("SELECT id FROM viajes ORDER BY id")]
+
+# --------------------------------------------------
+# BUILD COMPLETO E INCREMENTAL
+# --------------------------------------------------
+def construir(app, salida):
+    builds = os.path.join(salida, "builds")
+    os.makedirs(builds, exist_ok=True)
+    # Nombre ordenable por fecha y único aunque haya dos builds en el mismo segundo
+    carpeta = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=builds)
+    os.chmod(carpeta, 0o755)  # el proxy tiene que poder leerlo
+    # Cliente sin cookies: siempre la variante anónima
+    cliente = app.test_client(use_cookies=False)
+    escritas = _renderizar(cliente, carpeta, list(PAGINAS_FIJAS) + _rutas_viajes(app))
+    activar(salida, carpeta)
+
+    # Conservar el build anterior por si hay que volver atrás a mano
+    anteriores = sorted(os.listdir(builds))[:-BUILDS_CONSERVADOS]
+    for nombre in anteriores:
+        shutil.rmtree(os.path.join(builds, nombre), ignore_errors=True)
+    logger.info("Pre-render completo: %s páginas en %s", escritas, carpeta)
+    return escritas
+
+def activar(salida, carpeta):
+    # Cambio atómico del enlace `actual` (rename sobre el enlace existente)
+    enlace = os.path.join(salida, "actual")
+    temporal = f"{enlace}.{os.getpid()}.tmp"
+    if os.path.lexists(temporal):
+        os.remove(temporal)
+    os.symlink(os.path.relpath(carpeta, salida), temporal)
+    os.replace(temporal, enlace)
+
+def actualizar(app, salida, viaje_ids):
+    enlace = os.path.join(salida, "actual")
+    if not os.path.isdir(enlace):
+        logger.warning("Sin build activo en %s: ejecuta `flask --app app prerender`", salida)
+        return 0
+    carpeta = os.path.realpath(enlace)
+    rutas = list(PAGINAS_CATALOGO) + [f"/paquete/{int(viaje_id)}" for viaje_id in viaje_ids]
+    return _renderizar(app.test_client(use_cookies=False), carpeta, rutas)
+
+# --------------------------------------------------
+# TRABAJOS EN SEGUNDO PLANO
+# --------------------------------------------------
+class Encargos:
+    # Un hilo por proceso: los renders se hacen en orden y fuera del request
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ejecutor = None
+        self._pid = None
+
+    def _obtener_ejecutor(self):
+        with self._lock:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(1, thread_name_prefix="prerender")
+                self._pid = os.getpid()
+            return self._ejecutor
+
+    def encargar(self, funcion, *args):
+        futuro = self._obtener_ejecutor().submit(funcion, *args)
+        futuro.add_done_callback(_informar_error)
+        return futuro
+
+def _informar_error(futuro):
+    if futuro.exception() is not None:
+        logger.error("Falló el pre-render", exc_info=futuro.exception())
+
+encargos = Encargos()
+
+def encargar_viajes(viaje_ids):
+    # Llamar después del commit; no hace nada si PRERENDER_DIR no está definido
+    salida = current_app.config.get("PRERENDER_DIR")
+    if salida:
+        return encargos.encargar(actualizar, current_app._get_current_object(), salida, list(viaje_ids))
+
+def encargar_promociones(*promociones):
+    # Antes y después del cambio: "/", "/paquetes" y el detalle de los viajes
+    # que la promoción alcanza por `viaje_id` o por `aplica_tipo`
+    if not current_app.config.get("PRERENDER_DIR"):
+        return None
+    ids = [promocion["viaje_id"] for promocion in promociones if promocion and promocion["viaje_id"]]
+    tipos = [promocion["aplica_tipo"] for promocion in promociones if promocion and promocion["aplica_tipo"]]
+    viaje_ids = [fila[0] for fila in get_db().execute(
+        "SELECT id FROM viajes WHERE id IN (SELECT value FROM json_each(?)) "
+        "OR tipo IN (SELECT value FROM json_each(?))",
+        (json.dumps(ids), json.dumps(tipos))
+    )]
+    return encargar_viajes(viaje_ids)
+
+def encargar_todo():
+    # Solo la importación masiva: puede tocar cualquier página
+    salida = current_app.config.get("PRERENDER_DIR")
+    if salida:
+        return encargos.encargar(construir, current_app._get_current_object(), salida)
+
+# --------------------------------------------------
+# SERVIR SIN ENTRAR A FLASK
+# --------------------------------------------------
+class ServirPrerenderizado:
+    def __init__(self, wsgi_app, salida, cookie_sesion):
+        self.wsgi_app = wsgi_app
+        self.carpeta = os.path.join(salida, "actual")
+        self.cookie_sesion = cookie_sesion
+
+    def _archivo(self, environ):
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD") or environ.get("QUERY_STRING") or environ.get(OMITIR):
+            return None
+        ruta = environ.get("PATH_INFO") or "/"
+        if not PRERENDERIZABLES.match(ruta):
+            return None
+        if self.cookie_sesion in parse_cookie(environ.get("HTTP_COOKIE", "")):
+            return None
+        destino = os.path.join(self.carpeta, archivo_de(ruta))
+        return destino if os.path.isfile(destino) else None
+
+    def __call__(self, environ, start_response):
+        destino = self._archivo(environ)
+        if destino is None:
+            return self.wsgi_app(environ, start_response)
+
+        cabeceras = [
+            ("Content-Type", "text/html; charset=utf-8"),
+            ("Cache-Control", "public, no-cache"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        aceptadas = parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"))
+        for codificacion, sufijo in (("br", ".br"), ("gzip", ".gz")):
+            if aceptadas[codificacion] and os.path.isfile(destino + sufijo):
+                destino += sufijo
+                cabeceras.append(("Content-Encoding", codificacion))
+                break
+        try:
+            with open(destino, "rb") as f:
+                datos = f.read()
+                estado = os.fstat(f.fileno())
+        except FileNotFoundError:  # reemplazado justo ahora
+            return self.wsgi_app(environ, start_response)
+
+        etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+        cabeceras.append(("ETag", etag))
+        if etag in environ.get("HTTP_IF_NONE_MATCH", ""):
+            start_response("304 Not Modified", cabeceras)
+            return [b""]
+        cabeceras.append(("Content-Length", str(len(datos))))
+        start_response("200 OK", cabeceras)
+        return [b"" if environ["REQUEST_METHOD"] == "HEAD" else datos]
+
+def init_app(app):
+    salida = os.environ.get("PRERENDER_DIR")
+    if not salida:
+        return
+    app.config["PRERENDER_DIR"] = os.path.abspath(salida)
+    if os.environ.get("PRERENDER_SERVIR") == "1":
+        app.wsgi_app = ServirPrerenderizado(
+            app.wsgi_app, app.config["PRERENDER_DIR"], app.config["SESSION_COOKIE_NAME"]
+        )
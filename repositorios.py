@@ -0,0 +1,193 @@
+import json
+import sqlite3
+
+from flask import g
+
+from database import get_db
+from modelos import cargar_viaje, guardar_galeria, guardar_itinerario, eliminar_detalle
+from precios import recalcular_precios, total_carrito, totales_carrito
+
+# --------------------------------------------------
+# REPOSITORIOS
+# --------------------------------------------------
+# Todo el SQL de usuarios, viajes, carrito y promociones que usan las vistas.
+# Cada repositorio recibe la conexión y no hace commit: las escrituras del
+# request (referencias de imágenes, versión de la caché) van en la misma
+# transacción y la vista confirma al final, como con recalcular_precios().
+
+COLUMNAS_VIAJE = (
+    "titulo", "descripcion", "precio", "imagen", "grupo_minimo", "alojamiento",
+    "alimentacion", "transporte", "itinerario", "tipo", "destacado",
+)
+COLUMNAS_PROMOCION = (
+    "titulo", "descripcion", "descuento", "imagen", "tipo", "viaje_id", "aplica_tipo", "desde", "hasta",
+)
+
+
+class EmailDuplicado(Exception):
+    pass
+
+
+class Repositorio:
+    # Error del driver que indica una clave única repetida
+    DUPLICADO = sqlite3.IntegrityError
+
+    def __init__(self, db):
+        self.db = db
+
+    def _insertar(self, sql, parametros):
+        return self.db.execute(sql, parametros).lastrowid
+
+    def _recalcular_precios(self, viaje_ids=None):
+        recalcular_precios(self.db, viaje_ids)
+
+def _asignaciones(columnas):
+    return ", ".join(f"{columna} = ?" for columna in columnas)
+
+def _elegir(datos, permitidas):
+    # Solo columnas conocidas: los nombres van tal cual al SQL
+    return [columna for columna in permitidas if columna in datos]
+
+# --------------------------------------------------
+# USUARIOS
+# --------------------------------------------------
+class UsuarioRepo(Repositorio):
+    def por_email(self, email):
+        return self.db.execute("SELECT * FROM usuarios WHERE email = ?", (email,)).fetchone()
+
+    def por_id(self, usuario_id):
+        return self.db.execute(
+            "SELECT id, nombre, role FROM usuarios WHERE id = ?", (usuario_id,)
+        ).fetchone()
+
+    def crear(self, nombre, email, password_hash, role="user"):
+        try:
+            return self._insertar(
+                "INSERT INTO usuarios (nombre, email, password, role) VALUES (?, ?, ?, ?)",
+                (nombre, email, password_hash, role)
+            )
+        except self.DUPLICADO:
+            raise EmailDuplicado(email)
+
+    def cambiar_password(self, usuario_id, password_hash):
+        self.db.execute("UPDATE usuarios SET password = ? WHERE id = ?", (password_hash, usuario_id))
+
+# --------------------------------------------------
+# VIAJES
+# --------------------------------------------------
+class ViajeRepo(Repositorio):
+    def obtener(self, viaje_id):
+        # Viaje con galería, itinerario y precio vigente (ver modelos.py)
+        return cargar_viaje(self.db, viaje_id)
+
+    def crear(self, datos, galeria=()):
+        columnas = _elegir(datos, COLUMNAS_VIAJE)
+        viaje_id = self._insertar(
+            f"INSERT INTO viajes ({', '.join(columnas)}) VALUES ({', '.join('?' for _ in columnas)})",
+            [datos[columna] for columna in columnas]
+        )
+        guardar_galeria(self.db, viaje_id, galeria)
+        guardar_itinerario(self.db, viaje_id, datos.get("itinerario"))
+        self._recalcular_precios([viaje_id])
+        return viaje_id
+
+    def actualizar(self, viaje_id, datos, galeria):
+        columnas = _elegir(datos, COLUMNAS_VIAJE)
+        self.db.execute(
+            f"UPDATE viajes SET {_asignaciones(columnas)} WHERE id = ?",
+            [datos[columna] for columna in columnas] + [viaje_id]
+        )
+        guardar_galeria(self.db, viaje_id, galeria)
+        guardar_itinerario(self.db, viaje_id, datos.get("itinerario"))
+        self._recalcular_precios([viaje_id])
+
+    def eliminar(self, viaje_id):
+        self.db.execute("DELETE FROM viajes WHERE id = ?", (viaje_id,))
+        eliminar_detalle(self.db, viaje_id)
+        self._recalcular_precios([viaje_id])
+
+# --------------------------------------------------
+# PROMOCIONES
+# --------------------------------------------------
+# Cualquier cambio recalcula el precio de todo el catálogo: una promoción
+# por tipo alcanza a muchos viajes
+class PromocionRepo(Repositorio):
+    def obtener(self, promocion_id):
+        return self.db.execute("SELECT * FROM promociones WHERE id = ?", (promocion_id,)).fetchone()
+
+    def crear(self, datos):
+        columnas = _elegir(datos, COLUMNAS_PROMOCION)
+        promocion_id = self._insertar(
+            f"INSERT INTO promociones ({', '.join(columnas)}) VALUES ({', '.join('?' for _ in columnas)})",
+            [datos[columna] for columna in columnas]
+        )
+        self._recalcular_precios()
+        return promocion_id
+
+    def actualizar(self, promocion_id, datos):
+        columnas = _elegir(datos, COLUMNAS_PROMOCION)
+        self.db.execute(
+            f"UPDATE promociones SET {_asignaciones(columnas)} WHERE id = ?",
+            [datos[columna] for columna in columnas] + [promocion_id]
+        )
+        self._recalcular_precios()
+
+    def eliminar(self, promocion_id):
+        self.db.execute("DELETE FROM promociones WHERE id = ?", (promocion_id,))
+        self._recalcular_precios()
+
+# --------------------------------------------------
+# CARRITO
+# --------------------------------------------------
+class CarritoRepo(Repositorio):
+    def agregar(self, usuario_id, viaje_ids):
+        # El índice único evita duplicados sin consultar antes; devuelve los ids
+        # realmente insertados (los que ya estaban no vuelven por RETURNING).
+        # `WHERE true`: sin él SQLite toma el ON CONFLICT como parte del SELECT
+        filas = self.db.execute(
+            "INSERT INTO carrito (usuario_id, viaje_id) "
+            "SELECT ?, value FROM json_each(?) WHERE true "
+            "ON CONFLICT (usuario_id, viaje_id) DO NOTHING RETURNING viaje_id",
+            (usuario_id, json.dumps([int(viaje_id) for viaje_id in viaje_ids]))
+        ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def quitar(self, usuario_id, item_id):
+        # Solo ítems del propio usuario; devuelve el viaje quitado o None
+        filas = self.db.execute(
+            "DELETE FROM carrito WHERE id = ? AND usuario_id = ? RETURNING viaje_id", (item_id, usuario_id)
+        ).fetchall()
+        return filas[0][0] if filas else None
+
+    def totales(self, usuario_id):
+        # (cantidad, subtotal, total) sin traer las filas
+        return total_carrito(self.db, usuario_id)
+
+    def items(self, usuario_id):
+        # Filas con su precio y el dict de totales de la página /carrito
+        return totales_carrito(self.db, usuario_id)
+
+# --------------------------------------------------
+# ACCESO DESDE LAS VISTAS
+# --------------------------------------------------
+REPOSITORIOS = {
+    "usuarios": UsuarioRepo,
+    "viajes": ViajeRepo,
+    "promociones": PromocionRepo,
+    "carrito": CarritoRepo,
+}
+
+
+class Repositorios:
+    # Los cuatro repositorios sobre una misma conexión (una transacción)
+    def __init__(self, db):
+        self.db = db
+        for nombre, clase in REPOSITORIOS.items():
+            setattr(self, nombre, clase(db))
+
+def repos():
+    # Los del request actual, sobre la conexión de get_db()
+    db = get_db()
+    if "repos" not in g or g.repos.db is not db:
+        g.repos = Repositorios(db)
+    return g.repos
@@ -0,0 +1,318 @@
+import os
+import re
+import gzip
+import time
+import fcntl
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import DATABASE, BUSY_TIMEOUT_MS
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------------------
+# RESPALDOS EN CALIENTE
+# --------------------------------------------------
+# Copiar wonderchile.db con cp mientras los workers escriben puede dejar
+# una copia rota (el archivo principal y el -wal no se copian juntos).
+# respaldar() usa la API de backup de SQLite: copia PAGINAS_POR_PASO
+# páginas por paso y duerme PAUSA_MS entre pasos, así nunca ocupa el
+# disco de forma continua.
+#
+# La conexión de origen abre una transacción de lectura antes de empezar:
+# en WAL los demás siguen escribiendo y la copia es una foto consistente
+# de ese instante. Sin ella SQLite reinicia la copia con cada escritura de
+# otra conexión y, con tráfico constante, no terminaría nunca. Mientras
+# dura, el checkpoint no puede vaciar el -wal más allá de esa foto.
+#
+# Cada respaldo se verifica con PRAGMA integrity_check antes de
+# comprimirse a RESPALDOS_DIR/wonderchile-<fecha>.db.gz; solo se conservan
+# los últimos RESPALDOS_CONSERVADOS.
+
+RESPALDOS_DIR = os.environ.get("RESPALDOS_DIR", "respaldos")
+PAGINAS_POR_PASO = int(os.environ.get("RESPALDO_PAGINAS", "256"))
+PAUSA_MS = int(os.environ.get("RESPALDO_PAUSA_MS", "20"))
+CONSERVADOS = int(os.environ.get("RESPALDOS_CONSERVADOS", "7"))
+# 0 = sin respaldos automáticos (solo CLI y panel)
+INTERVALO_HORAS = float(os.environ.get("RESPALDO_INTERVALO_HORAS", "0"))
+REVISION_SEGUNDOS = 60
+
+_NOMBRE = re.compile(r"^wonderchile-\d{8}-\d{6}(-\w+)?\.db\.gz$")
+
+
+class RespaldoFallido(Exception):
+    pass
+
+
+class RespaldoEnCurso(Exception):
+    pass
+
+
+def _bloquear(directorio):
+    # Un respaldo a la vez entre todos los workers (y la CLI)
+    os.makedirs(directorio, exist_ok=True)
+    archivo = open(os.path.join(directorio, ".respaldo.lock"), "w")
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        archivo.close()
+        raise RespaldoEnCurso("Ya hay un respaldo en curso")
+    return archivo
+
+def _revisar_integridad(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = [fila[0] for fila in conn.execute("PRAGMA integrity_check")]
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.DatabaseError as error:  # ni siquiera es una base SQLite
+        raise RespaldoFallido(str(error))
+    finally:
+        conn.close()
+    if resultado != ["ok"]:
+        raise RespaldoFallido(f"integrity_check: {'; '.join(resultado[:5])}")
+    return version
+
+def _comprimir(origen, destino):
+    temporal = f"{destino}.tmp"
+    with open(origen, "rb") as entrada, open(temporal, "wb") as salida:
+        with gzip.GzipFile(filename=os.path.basename(destino)[:-3], mode="wb", fileobj=salida, compresslevel=6) as comprimido:
+            shutil.copyfileobj(entrada, comprimido, 1024 * 1024)
+        salida.flush()
+        os.fsync(salida.fileno())
+    os.replace(temporal, destino)
+
+def _descomprimir(archivo, carpeta):
+    fd, ruta = tempfile.mkstemp(suffix=".db", dir=carpeta)
+    try:
+        with os.fdopen(fd, "wb") as salida, gzip.open(archivo, "rb") as entrada:
+            shutil.copyfileobj(entrada, salida, 1024 * 1024)
+    except (OSError, EOFError) as error:  # gzip truncado o dañado
+        os.remove(ruta)
+        raise RespaldoFallido(f"{os.path.basename(archivo)}: {error}")
+    return ruta
+
+def _nombre_libre(directorio, sufijo):
+    base = time.strftime("wonderchile-%Y%m%d-%H%M%S") + (f"-{sufijo}" if sufijo else "")
+    nombre, numero = f"{base}.db.gz", 1
+    # Dos respaldos en el mismo segundo (p. ej. el previo a una restauración)
+    while os.path.exists(os.path.join(directorio, nombre)):
+        numero += 1
+        nombre = f"{base}-{numero}.db.gz"
+    return nombre
+
+# --------------------------------------------------
+# RESPALDAR, VERIFICAR, LISTAR
+# --------------------------------------------------
+def respaldar(origen=DATABASE, directorio=RESPALDOS_DIR, paginas=PAGINAS_POR_PASO, pausa_ms=PAUSA_MS,
+              sufijo=None, progreso=None, solo_si_vencido=False, podar_antiguos=True):
+    # Devuelve {archivo, bytes, paginas, segundos, user_version}, o None si
+    # solo_si_vencido y otro worker acaba de hacer uno
+    cerrojo = _bloquear(directorio)
+    if solo_si_vencido and not vencido(directorio):
+        cerrojo.close()
+        return None
+    inicio = time.perf_counter()
+    nombre = _nombre_libre(directorio, sufijo)
+    destino = os.path.join(directorio, nombre)
+    fd, copia = tempfile.mkstemp(suffix=".db", dir=directorio)
+    os.close(fd)
+    try:
+        fuente = sqlite3.connect(origen, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        copiado = sqlite3.connect(copia)
+        try:
+            fuente.execute("BEGIN")
+            fuente.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            total = [0]
+
+            def paso(estado, restantes, paginas_totales):
+                total[0] = paginas_totales
+                if progreso:
+                    progreso(paginas_totales - restantes, paginas_totales)
+                if restantes and pausa_ms:
+                    time.sleep(pausa_ms / 1000)
+
+            fuente.backup(copiado, pages=paginas, progress=paso)
+            fuente.execute("COMMIT")
+            # Un único archivo autosuficiente, sin -wal al lado
+            copiado.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            fuente.close()
+            copiado.close()
+
+        version = _revisar_integridad(copia)
+        _comprimir(copia, destino)
+    except Exception:
+        metricas.registrar_error_respaldo()
+        raise
+    finally:
+        os.remove(copia)
+        cerrojo.close()
+
+    segundos = time.perf_counter() - inicio
+    metricas.registrar_respaldo(segundos)
+    if podar_antiguos:
+        podar(directorio)
+    resultado = {
+        "archivo": destino,
+        "bytes": os.path.getsize(destino),
+        "paginas": total[0],
+        "segundos": round(segundos, 3),
+        "user_version": version,
+    }
+    logger.info("Respaldo %s: %s páginas en %.1f s", nombre, total[0], segundos)
+    return resultado
+
+def verificar(archivo):
+    # Descomprime a un temporal y corre integrity_check; devuelve user_version
+    ruta = _descomprimir(archivo, os.path.dirname(os.path.abspath(archivo)))
+    try:
+        return _revisar_integridad(ruta)
+    finally:
+        os.remove(ruta)
+
+def listar(directorio=RESPALDOS_DIR):
+    # Del más nuevo al más viejo
+    if not os.path.isdir(directorio):
+        return []
+    respaldos = []
+    for entrada in os.scandir(directorio):
+        if _NOMBRE.match(entrada.name):
+            estado = entrada.stat()
+            respaldos.append({
+                "archivo": entrada.name,
+                "bytes": estado.st_size,
+                "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(estado.st_mtime)),
+                "mtime": estado.st_mtime,
+            })
+    respaldos.sort(key=lambda respaldo: respaldo["mtime"], reverse=True)
+    return respaldos
+
+def podar(directorio=RESPALDOS_DIR, conservados=CONSERVADOS):
+    for respaldo in listar(directorio)[conservados:]:
+        os.remove(os.path.join(directorio, respaldo["archivo"]))
+        logger.info("Respaldo antiguo eliminado: %s", respaldo["archivo"])
+
+# --------------------------------------------------
+# RESTAURAR
+# --------------------------------------------------
+# El respaldo se descomprime y verifica antes de tocar nada. Con previo,
+# la base actual se respalda primero (sin podar: el archivo a restaurar
+# podría ser el más antiguo). Luego se copia con la misma API hacia la
+# base en uso, en un solo paso: los demás procesos ven la base anterior o
+# la restaurada, nunca una mezcla. Las versiones de cache_version quedan
+# por encima de las que tenían los workers, así ninguno sigue sirviendo
+# su copia del catálogo anterior.
+def restaurar(archivo, destino=DATABASE, previo=True):
+    # Devuelve (user_version del respaldo, resultado del respaldo previo o None)
+    copia = _descomprimir(archivo, os.path.dirname(os.path.abspath(destino)))
+    try:
+        version = _revisar_integridad(copia)
+        anterior = respaldar(origen=destino, sufijo="previo", podar_antiguos=False) if previo else None
+        fuente = sqlite3.connect(copia)
+        base = sqlite3.connect(destino, timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            antes = _versiones_cache(base)
+            fuente.backup(base)
+            despues = _versiones_cache(base)
+            if despues:
+                base.executemany(
+                    "INSERT INTO cache_version (nombre, version) VALUES (?, ?) "
+                    "ON CONFLICT(nombre) DO UPDATE SET version = excluded.version",
+                    [(nombre, max(antes.get(nombre, 0), despues.get(nombre, 0)) + 1)
+                     for nombre in set(antes) | set(despues)]
+                )
+                base.commit()
+        finally:
+            fuente.close()
+            base.close()
+    finally:
+        os.remove(copia)
+    return version, anterior
+
+def _versiones_cache(db):
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'cache_version'").fetchone():
+        return {}
+    return dict(db.execute("SELECT nombre, version FROM cache_version").fetchall())
+
+# --------------------------------------------------
+# EN SEGUNDO PLANO (panel y respaldos periódicos)
+# --------------------------------------------------
+class Respaldos:
+    # Un hilo por proceso, como prerender.Encargos
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ejecutor = None
+        self._pid = None
+        self._futuro = None
+        self.ultimo = None
+
+    def _obtener_ejecutor(self):
+        if self._ejecutor is None or self._pid != os.getpid():
+            self._ejecutor = ThreadPoolExecutor(1, thread_name_prefix="respaldo")
+            self._pid = os.getpid()
+            self._futuro = None
+        return self._ejecutor
+
+    def en_curso(self):
+        with self._lock:
+            return self._pid == os.getpid() and self._futuro is not None and not self._futuro.done()
+
+    def encargar(self, solo_si_vencido=False):
+        with self._lock:
+            ejecutor = self._obtener_ejecutor()
+            if self._futuro is not None and not self._futuro.done():
+                raise RespaldoEnCurso("Ya hay un respaldo en curso")
+            self._futuro = ejecutor.submit(self._respaldar, solo_si_vencido)
+            return self._futuro
+
+    def _respaldar(self, solo_si_vencido):
+        try:
+            resultado = respaldar(solo_si_vencido=solo_si_vencido)
+        except RespaldoEnCurso:
+            # Otro worker lo está haciendo
+            return None
+        except Exception as error:
+            logger.exception("Falló el respaldo")
+            self.ultimo = {"error": str(error), "fecha": time.strftime("%Y-%m-%d %H:%M:%S")}
+            return None
+        if resultado:
+            self.ultimo = resultado
+        return resultado
+
+    def estadisticas(self):
+        return {
+            "en_curso": self.en_curso(),
+            "ultimo": self.ultimo,
+            "respaldos": [
+                {clave: valor for clave, valor in respaldo.items() if clave != "mtime"}
+                for respaldo in listar()
+            ],
+        }
+
+respaldos = Respaldos()
+
+def vencido(directorio=RESPALDOS_DIR):
+    # ¿El respaldo más nuevo tiene más de INTERVALO_HORAS?
+    existentes = listar(directorio)
+    return not existentes or time.time() - existentes[0]["mtime"] >= INTERVALO_HORAS * 3600
+
+_ultima_revision = 0.0
+
+def _revisar_periodicamente():
+    # Como mucho un vistazo al directorio por worker cada REVISION_SEGUNDOS
+    global _ultima_revision
+    ahora = time.monotonic()
+    if ahora - _ultima_revision < REVISION_SEGUNDOS:
+        return
+    _ultima_revision = ahora
+    if vencido() and not respaldos.en_curso():
+        respaldos.encargar(solo_si_vencido=True)
+
+def init_app(app):
+    if INTERVALO_HORAS > 0:
+        app.before_request(_revisar_periodicamente)
@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --------------------------------------------------
+# HASH DE CONTRASEÑAS EN UN POOL ACOTADO
+# --------------------------------------------------
+# scrypt/pbkdf2 ocupan decenas de ms de CPU. Se ejecutan en un pool pequeño
+# de hilos (hashlib libera el GIL) con un máximo de trabajos en vuelo: si
+# está lleno se rechaza al instante con ServidorOcupado (HTTP 429) en vez
+# de dejar que una ráfaga de logins acapare los workers del catálogo.
+
+HASH_METODO = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "2"))
+HASH_MAX_EN_VUELO = int(os.environ.get("HASH_MAX_EN_VUELO", "8"))
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "5"))
+
+
+class ServidorOcupado(Exception):
+    pass
+
+
+class PoolHash:
+    def __init__(self, workers=HASH_WORKERS, max_en_vuelo=HASH_MAX_EN_VUELO):
+        self.workers = workers
+        self._cupos = threading.BoundedSemaphore(max_en_vuelo)
+        self._lock = threading.Lock()
+        self._ejecutor = None
+        self._pid = None
+        self.rechazados = 0
+
+    def _obtener_ejecutor(self):
+        with self._lock:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(self.workers, thread_name_prefix="hash")
+                self._pid = os.getpid()
+            return self._ejecutor
+
+    def ejecutar(self, funcion, *args):
+        if not self._cupos.acquire(blocking=False):
+            self.rechazados += 1
+            raise ServidorOcupado()
+        try:
+            futuro = self._obtener_ejecutor().submit(funcion, *args)
+        except BaseException:
+            self._cupos.release()
+            raise
+        # El cupo se libera cuando el hash termina, aunque el request ya no espere
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        try:
+            return futuro.result(timeout=HASH_TIMEOUT)
+        except TimeoutError:
+            self.rechazados += 1
+            raise ServidorOcupado()
+
+pool_hash = PoolHash()
+
+def hashear_password(password):
+    return pool_hash.ejecutar(generate_password_hash, password, HASH_METODO)
+
+def verificar_password(hash_guardado, password):
+    return pool_hash.ejecutar(check_password_hash, hash_guardado, password)
+
+_hash_ficticio = None
+
+def _hash_de_referencia():
+    # Un hash con HASH_METODO, calculado una vez por proceso
+    global _hash_ficticio
+    if _hash_ficticio is None:
+        _hash_ficticio = generate_password_hash("x", HASH_METODO)
+    return _hash_ficticio
+
+def necesita_rehash(hash_guardado):
+    # Formato de werkzeug: "metodo:parametros$sal$hash". Se compara con el
+    # prefijo que werkzeug escribe de verdad: "scrypt" queda como
+    # "scrypt:32768:8:1" y "pbkdf2:sha256" como "pbkdf2:sha256:600000"
+    return hash_guardado.split("$", 1)[0] != _hash_de_referencia().split("$", 1)[0]
+
+def verificar_sin_usuario(password):
+    # Mismo costo que un login real para no revelar qué emails existen
+    verificar_password(_hash_de_referencia(), password)
+    return False
+
+# --------------------------------------------------
+# LÍMITE DE INTENTOS (TOKEN BUCKET EN MEMORIA)
+# --------------------------------------------------
+class CubetaTokens:
+    def __init__(self, capacidad, por_segundo, max_claves=10000):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.max_claves = max_claves
+        self._cubetas = {}
+        self._lock = threading.Lock()
+
+    def consumir(self, clave):
+        # True si quedaba un token; False si hay que esperar
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._cubetas.get(clave, (self.capacidad, ahora))
+            tokens = min(self.capacidad, tokens + (ahora - ultimo) * self.por_segundo)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._cubetas[clave] = (tokens, ahora)
+            if len(self._cubetas) > self.max_claves:
+                self._purgar(ahora)
+            return permitido
+
+    def espera(self, clave):
+        # Segundos hasta el próximo token (para Retry-After)
+        tokens, _ = self._cubetas.get(clave, (self.capacidad, 0))
+        return max(1, int((1 - tokens) / self.por_segundo) + 1)
+
+    def _purgar(self, ahora):
+        # Las cubetas llenas equivalen a no tener entrada
+        llenas = [
+            clave for clave, (tokens, ultimo) in self._cubetas.items()
+            if tokens + (ahora - ultimo) * self.por_segundo >= self.capacidad
+        ]
+        for clave in llenas:
+            del self._cubetas[clave]
+
+
+# 20 intentos seguidos por IP, luego 1 cada 3 s; 5 por email, luego 1 por minuto
+intentos_por_ip = CubetaTokens(capacidad=int(os.environ.get("LOGIN_INTENTOS_IP", "20")), por_segundo=1 / 3)
+intentos_por_email = CubetaTokens(capacidad=int(os.environ.get("LOGIN_INTENTOS_EMAIL", "5")), por_segundo=1 / 60)
+# Formulario de contacto, aparte del login: consultar no gasta intentos de login
+# ni un login fallido bloquea el contacto. 5 seguidos por IP, luego 1 por minuto
+envios_contacto = CubetaTokens(capacidad=int(os.environ.get("CONTACTO_ENVIOS_IP", "5")), por_segundo=1 / 60)
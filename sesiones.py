@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import random
+import secrets
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, session, redirect, url_for, current_app
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from database import get_db
+from cache import leer_version, incrementar_version
+from repositorios import Repositorios
+
+# --------------------------------------------------
+# SESIONES EN EL SERVIDOR
+# --------------------------------------------------
+# La cookie solo lleva un id opaco; los datos viven en la tabla `sesiones`
+# con una caché LRU por worker delante. Revocar una sesión (o todas las de
+# un usuario) incrementa la versión 'sesiones' en `cache_version`, y cada
+# worker vacía su caché en el siguiente request: el efecto es inmediato.
+
+SESION_DURACION = int(os.environ.get("SESSION_DURACION", str(30 * 24 * 3600)))
+SESION_CACHE_MAX = 4096
+SESION_CACHE_TTL = 300
+
+
+class CacheLRU:
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = None
+        self._entradas = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def sincronizar(self, version):
+        if version != self._version:
+            with self._lock:
+                self._entradas.clear()
+                self._version = version
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] < time.monotonic():
+                del self._entradas[clave]
+                entrada = None
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[0]
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def quitar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+class AlmacenSQLite:
+    def __init__(self):
+        self.cache = CacheLRU(SESION_CACHE_MAX, SESION_CACHE_TTL)
+
+    def cargar(self, sid):
+        db = get_db()
+        self.cache.sincronizar(leer_version(db, "sesiones"))
+        datos = self.cache.obtener(sid)
+        if datos is not None:
+            return datos
+        fila = db.execute(
+            "SELECT datos FROM sesiones WHERE sid = ? AND expira > ?",
+            (sid, int(time.time()))
+        ).fetchone()
+        if fila is None:
+            return None
+        datos = json.loads(fila["datos"])
+        self.cache.guardar(sid, datos)
+        return datos
+
+    def guardar(self, sid, datos):
+        db = get_db()
+        db.execute(
+            "INSERT OR REPLACE INTO sesiones (sid, user_id, datos, expira) VALUES (?, ?, ?, ?)",
+            (sid, datos.get("user_id"), json.dumps(datos), int(time.time()) + SESION_DURACION)
+        )
+        # De vez en cuando limpiar las vencidas
+        if random.random() < 0.01:
+            db.execute("DELETE FROM sesiones WHERE expira < ?", (int(time.time()),))
+        db.commit()
+        self.cache.guardar(sid, dict(datos))
+
+    def borrar(self, sid):
+        db = get_db()
+        db.execute("DELETE FROM sesiones WHERE sid = ?", (sid,))
+        db.commit()
+        self.cache.quitar(sid)
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    def __init__(self, datos=None, sid=None):
+        def al_modificar(self):
+            self.modified = True
+        super().__init__(datos, al_modificar)
+        self.sid = sid
+        self.sid_anterior = None
+        self.modified = False
+
+    def rotar(self):
+        # Nuevo id al iniciar sesión (evita fijación de sesión)
+        self.sid_anterior = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class InterfazSesiones(SessionInterface):
+    def __init__(self, almacen):
+        self.almacen = almacen
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            datos = self.almacen.cargar(sid)
+            if datos is not None:
+                return SesionServidor(datos, sid)
+        return SesionServidor()
+
+    def save_session(self, app, sesion, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if sesion.sid_anterior:
+            self.almacen.borrar(sesion.sid_anterior)
+        if not sesion:
+            if sesion.modified and (sesion.sid or sesion.sid_anterior):
+                if sesion.sid:
+                    self.almacen.borrar(sesion.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta)
+            return
+        if not sesion.modified:
+            return
+
+        if not sesion.sid:
+            sesion.sid = secrets.token_urlsafe(32)
+        self.almacen.guardar(sesion.sid, dict(sesion))
+        response.set_cookie(
+            nombre, sesion.sid,
+            expires=self.get_expiration_time(app, sesion),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=ruta,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+# --------------------------------------------------
+# USUARIO ACTUAL Y REVOCACIÓN
+# --------------------------------------------------
+usuarios_cache = CacheLRU(SESION_CACHE_MAX, SESION_CACHE_TTL)
+
+def usuario_actual():
+    # Registro compacto (id, nombre, role), resuelto una vez por request
+    if "usuario" in g:
+        return g.usuario
+    usuario = None
+    user_id = session.get("user_id")
+    if user_id:
+        usuario = cargar_usuario(get_db(), user_id)
+        if usuario is None:
+            # El usuario fue eliminado: la sesión deja de valer
+            session.clear()
+    g.usuario = usuario
+    return usuario
+
+def cargar_usuario(db, user_id):
+    usuarios_cache.sincronizar(leer_version(db, "usuarios"))
+    usuario = usuarios_cache.obtener(user_id)
+    if usuario is None:
+        fila = Repositorios(db).usuarios.por_id(user_id)
+        if fila:
+            usuario = dict(fila)
+            usuarios_cache.guardar(user_id, usuario)
+    return usuario
+
+def usuario_por_sid(db, sid):
+    # Fuera de un request de Flask (modo ASGI): resolver el usuario desde la cookie
+    interfaz = current_app.session_interface
+    if not sid or not isinstance(interfaz, InterfazSesiones):
+        return None
+    datos = interfaz.almacen.cargar(sid)
+    if not datos or not datos.get("user_id"):
+        return None
+    return cargar_usuario(db, datos["user_id"])
+
+def iniciar_sesion(usuario):
+    session.clear()
+    if isinstance(session, SesionServidor):
+        session.rotar()
+    session["user_id"] = usuario["id"]
+    g.pop("usuario", None)
+
+def revocar_sesiones(db, user_id):
+    # Cierra todas las sesiones del usuario y descarta su registro cacheado
+    db.execute("DELETE FROM sesiones WHERE user_id = ?", (user_id,))
+    incrementar_version(db, "sesiones")
+    incrementar_version(db, "usuarios")
+
+def requiere_login(vista):
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if not usuario_actual():
+            return redirect(url_for("web.login"))
+        return vista(*args, **kwargs)
+    return envoltura
+
+def requiere_admin(vista):
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        usuario = usuario_actual()
+        if not usuario or usuario["role"] != "admin":
+            return redirect(url_for("web.login"))
+        return vista(*args, **kwargs)
+    return envoltura
+
+def estadisticas():
+    interfaz = current_app.session_interface
+    return {
+        "sesiones": interfaz.almacen.cache.estadisticas() if isinstance(interfaz, InterfazSesiones) else None,
+        "usuarios": usuarios_cache.estadisticas(),
+    }
+
+def init_app(app):
+    # SESSION_BACKEND=cookie vuelve a la cookie firmada de Flask
+    if os.environ.get("SESSION_BACKEND", "sqlite") == "sqlite":
+        app.session_interface = InterfazSesiones(AlmacenSQLite())
@@ -1,33 +1,30 @@
-// Función para agregar al carrito
+// Función para agregar al carrito (una sola petición: sesión + inserción)
+// `paquete` es el id del viaje, una lista de ids, o el título en las tarjetas fijas
 function agregarAlCarrito(paquete) {
-    // Verificar si el usuario está logueado haciendo una petición al servidor
-    fetch('/verificar_sesion')
+    let cuerpo;
+    if (Array.isArray(paquete)) {
+        cuerpo = { viaje_ids: paquete };
+    } else if (typeof paquete === 'number') {
+        cuerpo = { viaje_id: paquete };
+    } else {
+        cuerpo = { paquete: paquete };
+    }
+
+    fetch('/agregar_carrito', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(cuerpo)
+    })
     .then(response => response.json())
     .then(data => {
-        if (!data.logged_in) {
+        if (data.login_required) {
             alert('Debes iniciar sesión para agregar productos al carrito');
             window.location.href = '/login';
-            return;
-        }
-
-        // Enviar solicitud al servidor para agregar al carrito
-        return fetch('/agregar_carrito', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ paquete: paquete })
-        });
-    })
-    .then(response => {
-        if (response) {
-            return response.json();
-        }
-    })
-    .then(data => {
-        if (data && data.success) {
-            alert('¡Producto agregado al carrito!');
-        } else if (data) {
+        } else if (data.success) {
+            alert('¡Producto agregado al carrito! (' + data.cantidad_carrito + ' en tu carrito)');
+        } else {
             alert('Error al agregar al carrito: ' + data.message);
         }
     })
@@ -106,41 +103,7 @@ function agregarAlCarritoConTerminos(paquete) {
         return;
     }
 
-    // Verificar si el usuario está logueado haciendo una petición al servidor
-    fetch('/verificar_sesion')
-    .then(response => response.json())
-    .then(data => {
-        if (!data.logged_in) {
-            alert('Debes iniciar sesión para agregar productos al carrito');
-            window.location.href = '/login';
-            return;
-        }
-
-        // Enviar solicitud al servidor para agregar al carrito
-        return fetch('/agregar_carrito', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ paquete: paquete })
-        });
-    })
-    .then(response => {
-        if (response) {
-            return response.json();
-        }
-    })
-    .then(data => {
-        if (data && data.success) {
-            alert('¡Producto agregado al carrito!');
-        } else if (data) {
-            alert('Error al agregar al carrito: ' + data.message);
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        alert('Error al procesar la solicitud');
-    });
+    agregarAlCarrito(paquete);
 }
 
 // Cargar fotos de Instagram cuando la página se carga